@@ -5,17 +5,57 @@ Written by DuIvy and provided to you by GPLv3 license.
 """
 
 import os
+import shutil
 import sys
 import time
-from typing import Any, List
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
 
 base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
+from FileParser.xvgParser import XVG
 from utils import log
 
 
+## the output width in pixels of each plot engine, see the default styles
+ENGINE_RESOLUTIONS = {"matplotlib": 1920, "plotly": 1920, "gnuplot": 1400}
+
+
+def load_xvg_worker(xvgfile: str, kwargs: Dict) -> Tuple:
+    """parse one xvg file in worker process, and put its data into shared memory
+
+    Args:
+        xvgfile (str): the xvg file name
+        kwargs (Dict): other parameters for XVG
+
+    Returns:
+        Tuple: (None, meta, shared memory name, shape, dtype) if succeeded, (error message,) if failed
+    """
+    try:
+        xvg = XVG(xvgfile, **kwargs)
+        meta, arrays = xvg.dump_cache()
+        data = arrays["data"]
+        shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        ## the main process takes over the shared memory and unlinks it. The
+        ## tracker registers POSIX shared memory by the name with leading "/"
+        if os.name == "posix":
+            resource_tracker.unregister(f"/{shm.name}", "shared_memory")
+        shared = np.ndarray(data.shape, data.dtype, buffer=shm.buf, order="F")
+        shared[:] = data
+        del shared
+        shm.close()
+    except SystemExit:
+        return (f"failed to parse {xvgfile}, check the error message above",)
+    except Exception as ex:
+        return (f"failed to parse {xvgfile}: {ex}",)
+    return None, meta, shm.name, data.shape, data.dtype.str
+
+
 class Command(log):
     """Command class was desiged as parent class for all commands"""
 
@@ -138,3 +178,216 @@ class Command(log):
             )
             output = new_output
         return output
+
+    def dump_columns(
+        self,
+        heads: List[str],
+        columns: List[List[float]],
+        outfile: str,
+        precision: int = 8,
+        rows: int = 100000,
+    ) -> None:
+        """dump data columns into csv file block by block, each block of rows is
+        formatted by one string operation. Columns could be in different lengths,
+        the cells beyond the end of shorter columns are left empty. If outfile
+        ends with `.npz`, columns are saved as `column_0`, `column_1`... arrays
+        with `heads` into a numpy npz file instead.
+
+        Args:
+            heads (List[str]): the head of each column
+            columns (List[List[float]]): data columns
+            outfile (str): the output file name
+            precision (int, optional): the precision of values in csv. Defaults to 8.
+            rows (int, optional): the number of rows formatted in each block. Defaults to 100000.
+        """
+        columns = [np.asarray(column, dtype=np.float64) for column in columns]
+        if outfile.endswith(".npz"):
+            arrays = {f"column_{i}": column for i, column in enumerate(columns)}
+            np.savez(outfile, heads=np.array(heads, dtype=str), **arrays)
+            self.info(f"data has been dumped to {outfile} successfully")
+            return
+
+        lengths = [len(column) for column in columns]
+        cell = f"%.{precision}f"
+        ## the columns available to rows only change at the ends of columns
+        bounds = sorted(set([0] + lengths))
+        with open(outfile, "w") as fo:
+            fo.write(",".join(heads) + "\n")
+            for seg_begin, seg_end in zip(bounds[:-1], bounds[1:]):
+                avails = [i for i, length in enumerate(lengths) if length >= seg_end]
+                row_format = (
+                    ",".join(cell if length >= seg_end else "" for length in lengths)
+                    + "\n"
+                )
+                for start in range(seg_begin, seg_end, rows):
+                    stop = min(start + rows, seg_end)
+                    block = np.column_stack([columns[i][start:stop] for i in avails])
+                    fo.write((row_format * (stop - start)) % tuple(block.ravel().tolist()))
+        self.info(f"data has been dumped to {outfile} successfully")
+
+    def load_xvgs(
+        self, xvgfiles: List[str], columns: List[List[int]] = None, **kwargs
+    ) -> List[XVG]:
+        """parse xvg files on a process pool with `--jobs` workers, the data of
+        each file is passed back through shared memory. Results are in the order
+        of xvgfiles, and all files failed to parse would be reported together.
+
+        Args:
+            xvgfiles (List[str]): the xvg file names
+            columns (List[List[int]], optional): the selected columns of each file. Defaults to None.
+            kwargs: other parameters for XVG
+
+        Returns:
+            List[XVG]: XVG objects of each file
+        """
+        if columns == None:
+            columns = [None for _ in xvgfiles]
+        jobs = min(self.parm.__dict__.get("jobs", None) or 1, len(xvgfiles))
+        if jobs <= 1 or not kwargs.get("load_data", True):
+            return [XVG(f, columns=c, **kwargs) for f, c in zip(xvgfiles, columns)]
+
+        self.info(f"parsing {len(xvgfiles)} xvg files with {jobs} processes")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(load_xvg_worker, f, dict(kwargs, columns=c))
+                for f, c in zip(xvgfiles, columns)
+            ]
+            results = []
+            for xvgfile, future in zip(xvgfiles, futures):
+                try:
+                    results.append(future.result())
+                except Exception as ex:
+                    results.append((f"failed to parse {xvgfile}: {ex}",))
+
+        xvgs: List[XVG] = []
+        errors: List[str] = []
+        for xvgfile, result in zip(xvgfiles, results):
+            if result[0] != None:
+                errors.append(result[0])
+                continue
+            _, meta, name, shape, dtype = result
+            shm = shared_memory.SharedMemory(name=name)
+            shared = np.ndarray(shape, dtype, buffer=shm.buf, order="F")
+            data = np.array(shared, order="F")
+            del shared
+            shm.close()
+            shm.unlink()
+            xvg = XVG(xvgfile, is_file=False, new_file=True, dtype=np.dtype(dtype))
+            xvg.load_cache(meta, {"data": data})
+            xvgs.append(xvg)
+        if len(errors) != 0:
+            self.error("\n".join(errors))
+        return xvgs
+
+    def downsample_minmax(self, ydata: np.ndarray, points: int) -> Tuple[np.ndarray]:
+        """select the indexs of minimum and maximum of ydata in each bucket of
+        equal size, so all extrema are kept when the buckets are not wider than
+        a pixel
+
+        Args:
+            ydata (np.ndarray): y values
+            points (int): the max number of selected points
+
+        Returns:
+            indexs (np.ndarray): the indexs of selected points
+            starts (np.ndarray): the start indexs of buckets
+        """
+        size = int(np.ceil(len(ydata) / (points // 2)))
+        buckets = int(np.ceil(len(ydata) / size))
+        padded = np.full(buckets * size, np.nan)
+        padded[: len(ydata)] = ydata
+        padded = padded.reshape(buckets, size)
+        ## NaN in moving averages, all NaN bucket gives its first index
+        mins = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+        maxs = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+        starts = np.arange(buckets) * size
+        indexs = np.sort(np.concatenate([starts + mins, starts + maxs]))
+        indexs = np.unique(np.minimum(indexs, len(ydata) - 1))
+        return indexs, starts
+
+    def downsample_lttb(
+        self, xdata: np.ndarray, ydata: np.ndarray, points: int
+    ) -> Tuple[np.ndarray]:
+        """select the indexs of points by Largest-Triangle-Three-Buckets algorithm
+        (Steinarsson, 2013). The first and last points are always kept, and one
+        point of each bucket between them forming the largest triangle with the
+        point selected in previous bucket and the average of next bucket.
+
+        Args:
+            xdata (np.ndarray): x values
+            ydata (np.ndarray): y values
+            points (int): the max number of selected points
+
+        Returns:
+            indexs (np.ndarray): the indexs of selected points
+            starts (np.ndarray): the start indexs of buckets
+        """
+        count = len(ydata)
+        starts = np.linspace(1, count - 1, points - 1).astype(np.int64)
+        starts = np.unique(np.concatenate([[0], starts, [count - 1]]))
+        ## NaN in moving averages would not be selected unless all NaN
+        yvalues = np.where(np.isnan(ydata), np.nanmean(ydata), ydata)
+        sums = np.add.reduceat(yvalues, starts)
+        avgs_y = sums / np.diff(np.append(starts, count))
+        avgs_x = np.add.reduceat(xdata, starts) / np.diff(np.append(starts, count))
+        indexs = np.zeros(len(starts), dtype=np.int64)
+        indexs[-1] = count - 1
+        for b in range(1, len(starts) - 1):
+            a = indexs[b - 1]
+            bucket = slice(starts[b], starts[b + 1])
+            areas = np.abs(
+                (xdata[a] - avgs_x[b + 1]) * (yvalues[bucket] - yvalues[a])
+                - (xdata[a] - xdata[bucket]) * (avgs_y[b + 1] - yvalues[a])
+            )
+            indexs[b] = starts[b] + np.argmax(areas)
+        return indexs, starts
+
+    def downsample(self, kwargs: Dict) -> Dict:
+        """downsample the lines for visualizers by `--downsample` method to
+        `--max_points` points, which defaults to twice of the output width in
+        pixels of plot engine. The moving average bands (highs and lows) are
+        decimated at the same points, with the envelope of each bucket.
+
+        Args:
+            kwargs (Dict): the parameters for line visualizers
+
+        Returns:
+            Dict: parameters with downsampled data_list, xdata_list, highs and lows
+        """
+        points = self.parm.__dict__.get("max_points", None)
+        if points == None:
+            if self.parm.engine == "plotext":
+                width = shutil.get_terminal_size().columns * 2  # braille markers
+            else:
+                width = ENGINE_RESOLUTIONS.get(self.parm.engine, 1920)
+            points = width * 2
+        if points == 0:
+            return kwargs
+        points = max(points, 4)
+        method = self.parm.__dict__.get("downsample", None) or "minmax"
+
+        kwargs = dict(kwargs)
+        keys = ["xdata_list", "data_list", "highs", "lows"]
+        lines = {key: list(kwargs[key]) for key in keys}
+        downsampled = False
+        for i in range(len(lines["data_list"])):
+            ydata = np.asarray(lines["data_list"][i], dtype=np.float64)
+            if len(ydata) <= points:
+                continue
+            xdata = np.asarray(lines["xdata_list"][i], dtype=np.float64)
+            if method == "lttb":
+                indexs, starts = self.downsample_lttb(xdata, ydata, points)
+            else:
+                indexs, starts = self.downsample_minmax(ydata, points)
+            lines["xdata_list"][i] = xdata[indexs].tolist()
+            lines["data_list"][i] = ydata[indexs].tolist()
+            buckets = np.searchsorted(starts, indexs, side="right") - 1
+            for key, ufunc in [("highs", np.fmax), ("lows", np.fmin)]:
+                if len(lines[key]) > i:
+                    band = np.asarray(lines[key][i], dtype=np.float64)
+                    lines[key][i] = ufunc.reduceat(band, starts)[buckets].tolist()
+            downsampled = True
+        if downsampled:
+            self.info(f"downsampled lines to at most {points} points by {method}")
+        kwargs.update(lines)
+        return kwargs
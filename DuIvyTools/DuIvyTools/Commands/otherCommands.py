@@ -21,7 +21,7 @@ from FileParser.groParser import GRO
 from FileParser.ndxParser import NDX
 from FileParser.xpmParser import XPM
 from FileParser.xvgParser import XVG
-from utils import Parameters
+from utils import Parameters, strip_compression_suffix
 
 
 class mdp_gen(Command):
@@ -208,12 +208,12 @@ class find_center(Command):
             indexfile, grofile = "", ""
             if ".gro" in "".join(self.parm.input):
                 for file in self.parm.input:
-                    if file.endswith(".gro") and grofile == "":
+                    if strip_compression_suffix(file).endswith(".gro") and grofile == "":
                         grofile = file
                         self.info(f"{file} has been used as gro file")
             if ".ndx" in "".join(self.parm.input):
                 for file in self.parm.input:
-                    if file.endswith(".ndx") and indexfile == "":
+                    if strip_compression_suffix(file).endswith(".ndx") and indexfile == "":
                         indexfile = file
                         self.info(f"{file} has been used as index file")
         if grofile == "":
@@ -294,10 +294,15 @@ class dccm_ascii(Command):
                 specify the output xpm file name
         --z_precision (optional)
                 specify the value precision to save in xpm file
+        --nlevels (optional)
+                quantize values of DCCM into the number of levels, like the -nlevels of gmx
+        --level_method (optional)
+                the spacing of levels: linear, symmetric, quantile. Default to linear
 
     :Usage:
         dit dccm_ascii -f covar.dat -o dccm.xpm
         dit dccm_ascii -f covar.dat -o dccm.xpm --z_precision 3
+        dit dccm_ascii -f covar.dat -o dccm.xpm --nlevels 100 --level_method symmetric
     """
 
     def __init__(self, parm: Parameters) -> None:
@@ -356,7 +361,10 @@ class dccm_ascii(Command):
         xpm.yaxis = [i + 1 for i in range(resnum)]
         xpm.yaxis.reverse()
         xpm.value_matrix.reverse()
-        xpm.refresh_by_value_matrix()
+        xpm.refresh_by_value_matrix(
+            nlevels=self.parm.__dict__.get("nlevels", None),
+            level_method=self.parm.__dict__.get("level_method", "linear"),
+        )
         self.parm.output = self.check_output_exist(self.parm.output)
         xpm.save(self.parm.output)
 
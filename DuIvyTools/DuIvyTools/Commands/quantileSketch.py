@@ -0,0 +1,187 @@
+"""
+quantileSketch module is part of DuIvyTools for approximating quantiles and distributions of huge data in one streaming pass.
+
+The sketch is a KLL-style stack of compactors: items of level h weigh 2^h, and a level
+holding more items than its capacity is sorted and half of its items (every other one,
+from a random offset) are promoted to the next level. The memory footprint is bounded
+by about 3 * size items, and the rank error is about 2/size.
+
+Written by DuIvy and provided to you by GPLv3 license.
+"""
+
+import os
+import sys
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
+if base not in sys.path:
+    sys.path.insert(0, base)
+
+from utils import log
+
+
+class QuantileSketch(log):
+    """QuantileSketch class summarizes a stream of values by a KLL-style quantile
+    sketch, with the exact count, mean, std, min and max of values. Box statistics
+    and violin density profiles could be derived from it without raw values."""
+
+    def __init__(self, size: int = 200, seed: Union[int, None] = 0) -> None:
+        if size < 8:
+            self.error("the size of quantile sketch should not be less than 8")
+        self.size: int = size
+        self.levels: List[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self.rng = np.random.default_rng(seed)
+        self.count: int = 0
+        self.min: float = np.inf
+        self.max: float = -np.inf
+        ## shifted sums for numerical stable variance
+        self.shift: Union[float, None] = None
+        self.sum: float = 0.0
+        self.sumsq: float = 0.0
+
+    def capacity(self, level: int) -> int:
+        """the capacity of compactor of level, decays by 2/3 from top to bottom"""
+        depth = len(self.levels) - 1 - level
+        return max(int(np.ceil(self.size * (2.0 / 3.0) ** depth)), 2)
+
+    def update(self, values: np.ndarray) -> None:
+        """add a block of values into sketch, NaN values are ignored
+
+        Args:
+            values (np.ndarray): values to add
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        if self.shift == None:
+            self.shift = float(values[0])
+        shifted = values - self.shift
+        self.count += len(values)
+        self.sum += float(np.sum(shifted))
+        self.sumsq += float(np.dot(shifted, shifted))
+        self.min = min(self.min, float(np.min(values)))
+        self.max = max(self.max, float(np.max(values)))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.compress()
+
+    def compress(self) -> None:
+        """compact the levels exceeding their capacities from bottom to top"""
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                ## keep one item at this level if odd, to preserve total weight
+                keep = len(items) % 2
+                offset = self.rng.integers(2)
+                promoted = items[keep + offset :: 2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = items[:keep]
+            level += 1
+
+    def items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """return the sorted items of sketch and their weights"""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2.0**level) for level, items in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    @property
+    def mean(self) -> float:
+        return self.shift + self.sum / self.count
+
+    @property
+    def std(self) -> float:
+        """the sample standard deviation (ddof=1)"""
+        if self.count < 2:
+            return 0.0
+        var = (self.sumsq - self.sum * self.sum / self.count) / (self.count - 1)
+        return float(np.sqrt(max(var, 0.0)))
+
+    def quantile(self, q: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """approximate quantiles, in the linear interpolation manner of np.quantile
+
+        Args:
+            q (Union[float, np.ndarray]): quantiles in range [0, 1]
+
+        Returns:
+            Union[float, np.ndarray]: values of quantiles
+        """
+        if self.count == 0:
+            self.error("unable to calculate quantiles of empty sketch")
+        values, weights = self.items()
+        ## the center rank of each weighted item
+        ranks = np.cumsum(weights) - (weights + 1) / 2
+        ranks = np.concatenate([[0], ranks, [self.count - 1]])
+        values = np.concatenate([[self.min], values, [self.max]])
+        return np.interp(np.asarray(q) * (self.count - 1), ranks, values)
+
+    def box_stats(self, whis: float = 1.5) -> Dict:
+        """calculate box statistics in the format of matplotlib.cbook.boxplot_stats
+
+        Args:
+            whis (float, optional): the whisker length in IQR. Defaults to 1.5.
+
+        Returns:
+            Dict: mean, med, q1, q3, iqr, cilo, cihi, whislo, whishi, and fliers
+        """
+        q1, med, q3 = self.quantile(np.array([0.25, 0.5, 0.75]))
+        iqr = q3 - q1
+        values, _ = self.items()
+        values = np.concatenate([[self.min], values, [self.max]])
+        lo, hi = q1 - whis * iqr, q3 + whis * iqr
+        whislo = np.min(values[values >= lo], initial=q1)
+        whishi = np.max(values[values <= hi], initial=q3)
+        notch = 1.57 * iqr / np.sqrt(self.count)
+        return {
+            "mean": self.mean,
+            "med": med,
+            "q1": q1,
+            "q3": q3,
+            "iqr": iqr,
+            "cilo": med - notch,
+            "cihi": med + notch,
+            "whislo": whislo,
+            "whishi": whishi,
+            "fliers": np.unique(values[(values < whislo) | (values > whishi)]),
+        }
+
+    def violin_stats(self, points: int = 100) -> Dict:
+        """calculate the gaussian kernel density profile of values over [min, max]
+        in the format of matplotlib.cbook.violin_stats. Items of sketch are used as
+        weighted kernels, the bandwidth is selected by Scott's rule with the exact
+        count and std of values.
+
+        Args:
+            points (int, optional): the number of points to evaluate density. Defaults to 100.
+
+        Returns:
+            Dict: coords, vals, mean, median, min, max
+        """
+        coords = np.linspace(self.min, self.max, points)
+        values, weights = self.items()
+        bw = self.std * self.count ** (-1 / 5)
+        if bw > 0:
+            vals = np.zeros(points)
+            ## evaluate kernels by blocks to bound the temporary matrix
+            for s in range(0, len(values), 4096):
+                dist = (coords[:, None] - values[None, s : s + 4096]) / bw
+                vals += np.exp(-0.5 * dist * dist) @ weights[s : s + 4096]
+            vals /= self.count * bw * np.sqrt(2 * np.pi)
+        else:
+            vals = np.zeros(points)
+        return {
+            "coords": coords,
+            "vals": vals,
+            "mean": self.mean,
+            "median": self.quantile(0.5),
+            "min": self.min,
+            "max": self.max,
+        }
@@ -6,15 +6,17 @@ Written by DuIvy and provided to you by GPLv3 license.
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union
 
-from scipy.interpolate import RectBivariateSpline, interp2d
+import numpy as np
+from scipy.interpolate import RectBivariateSpline, RegularGridInterpolator
 
 base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from Commands.Commands import Command
+from Commands.Commands import ENGINE_RESOLUTIONS, Command
 from FileParser.xpmParser import XPM
 from utils import Parameters
 from Visualizer.Visualizer_gnuplot import *
@@ -31,7 +33,7 @@ class xpm_show(Command):
     Mode 3d mainly plot a 3d figure for `Continuous` xpm. Mode contour plot a contour figure for `Continuous` xpm. Also, you can set colormaps by `-cmap`.
     You can perform INTERPOLATION to data by specifing `-ip`.
     For imshow of matplotlib, the interpolation method was using the interpolation method of imshow function of matplobli, and there are lots of interpolation methods could be selected. If you do not know the names of interpolation methods, simply specify `-ip hhh`, then the error message will show you all names of interpolation methods for you to choose.
-    For any other engines or modes, DIT use `scipy.interpolate.interp2d` to do the interpolation, so the methods for you to choose is `linear`, `cubic`, and `quintic`. Also, `-ip hhh` trick works. For this interpolation methods, you need to define a `--interpolation_fold` (default to 10).
+    For any other engines or modes, DIT use `scipy.interpolate.RegularGridInterpolator` (for `nearest` and `linear`) and `scipy.interpolate.RectBivariateSpline` (for `cubic` and `quintic`) to do the interpolation, so the methods for you to choose is `nearest`, `linear`, `cubic`, and `quintic`. Also, `-ip hhh` trick works. For this interpolation methods, you need to define a `--interpolation_fold` (default to 10). The interpolated grid is capped at the output resolution in pixels of plot engine, and evaluated tile by tile on `--jobs` threads.
     DIT support performing xpm cutting by `-xmin`, `-xmax`, `-ymin`, and `-ymax`, like only show 100*100 pixels from a 132*10000 DSSP xpm by setting `-xmin 100 -xmax 200 -ymin 200 -ymax 300`.
 
     :Parameters:
@@ -77,6 +79,8 @@ class xpm_show(Command):
                 specify the interpolation method
         -ipf, --interpolation_fold (optional)
                 specify the multiple of interpolation
+        -j, --jobs (optional)
+                specify the number of threads to do interpolation
         --alpha (optional)
                 specify the alpha of figure
         --x_precision (optional)
@@ -119,13 +123,15 @@ class xpm_show(Command):
         method: str,
         ip_fold: int,
     ) -> Union[List[float], List[List[float]]]:
-        """perform the interpolation of matrix data
+        """perform the interpolation of matrix data. The interpolated grid is capped
+        at the output resolution of plot engine, and evaluated by tiles of rows on
+        a thread pool of `--jobs` workers to bound the temporary memory.
 
         Args:
             xaxis (List[float]): the X data
             yaxis (List[float]): the Y data
             matrix (List[List[float]]): the matrix values
-            method (str): method for interpolation
+            method (str): method for interpolation: nearest, linear, cubic, quintic
             ip_fold (int): the multiple of interpolation
 
         Returns:
@@ -133,12 +139,54 @@ class xpm_show(Command):
             y_new (List[float]): the Y data after interpolation
             matrix_new (List[List[float]]): the matrix values after interpolation
         """
-        # interp2d : linear, cubic, quintic
-        ip_func = interp2d(xaxis, yaxis, matrix, kind=method)
-        # ip_func = RectBivariateSpline(xaxis, yaxis, matrix)#, kx=3, ky=3)
-        x_new = np.linspace(np.min(xaxis), np.max(xaxis), ip_fold * len(xaxis))
-        y_new = np.linspace(np.min(yaxis), np.max(yaxis), ip_fold * len(yaxis))
-        matrix_new = ip_func(x_new, y_new)
+        ## the spline degrees of methods, None for RegularGridInterpolator
+        degrees = {"nearest": None, "linear": None, "cubic": 3, "quintic": 5}
+        if method not in degrees:
+            self.error(
+                f"unknown interpolation method {method}, choose from {list(degrees.keys())}"
+            )
+        xaxis = np.asarray(xaxis, dtype=np.float64)
+        yaxis = np.asarray(yaxis, dtype=np.float64)
+        matrix = np.asarray(matrix, dtype=np.float64)
+        ## both methods need ascending axes
+        if xaxis[0] > xaxis[-1]:
+            xaxis, matrix = xaxis[::-1], matrix[:, ::-1]
+        if yaxis[0] > yaxis[-1]:
+            yaxis, matrix = yaxis[::-1], matrix[::-1, :]
+        degree = degrees[method]
+        if degree == None:
+            ip_func = RegularGridInterpolator((yaxis, xaxis), matrix, method=method)
+        else:
+            if min(len(xaxis), len(yaxis)) <= degree:
+                self.error(
+                    f"at least {degree + 1} points in each axis are needed for {method} interpolation"
+                )
+            ip_func = RectBivariateSpline(yaxis, xaxis, matrix, kx=degree, ky=degree)
+
+        ## more points than pixels of figure would not be visible
+        resolution = ENGINE_RESOLUTIONS.get(self.parm.engine, 1920)
+        x_num = max(min(ip_fold * len(xaxis), resolution), len(xaxis))
+        y_num = max(min(ip_fold * len(yaxis), resolution), len(yaxis))
+        if (x_num, y_num) != (ip_fold * len(xaxis), ip_fold * len(yaxis)):
+            self.warn(
+                f"the interpolated grid is capped to {x_num} x {y_num} by the resolution of {self.parm.engine}"
+            )
+        x_new = np.linspace(np.min(xaxis), np.max(xaxis), x_num)
+        y_new = np.linspace(np.min(yaxis), np.max(yaxis), y_num)
+        matrix_new = np.empty((y_num, x_num), dtype=np.float64)
+
+        def evaluate(start: int) -> None:
+            ys = y_new[start : start + rows]
+            if degree == None:
+                yy, xx = np.meshgrid(ys, x_new, indexing="ij")
+                matrix_new[start : start + len(ys)] = ip_func((yy, xx))
+            else:
+                matrix_new[start : start + len(ys)] = ip_func(ys, x_new)
+
+        rows = max(1, 2**18 // x_num)
+        jobs = max(self.parm.__dict__.get("jobs", None) or 1, 1)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(evaluate, range(0, y_num, rows)))
         return x_new, y_new, matrix_new
 
     def hex2rgb(self, value):
@@ -224,12 +272,7 @@ class xpm_show(Command):
 
             xaxis = [x * self.parm.xshrink for x in xpm.xaxis]
             yaxis = [y * self.parm.yshrink for y in xpm.yaxis]
-            value_matrix = []
-            for y, _ in enumerate(yaxis):
-                v_lis = []
-                for x, _ in enumerate(xaxis):
-                    v_lis.append(xpm.value_matrix[y][x] * self.parm.zshrink)
-                value_matrix.append(v_lis)
+            value_matrix = (np.asarray(xpm.value_matrix) * self.parm.zshrink).tolist()
 
             ## top -> bottom ===>>> bottom to top
             yaxis.reverse()
@@ -407,9 +450,10 @@ class xpm2csv(Command):
             y_title = self.sel_parm(self.parm.ylabel, y_title)
             z_title = self.sel_parm(self.parm.zlabel, z_title)
             fo.write(f"{x_title},{y_title},{z_title}\n")
+            value_matrix = np.asarray(xpm.value_matrix).tolist()
             for y, y_value in enumerate(xpm.yaxis):
                 for x, x_value in enumerate(xpm.xaxis):
-                    z_value = xpm.value_matrix[y][x]
+                    z_value = value_matrix[y][x]
                     x_value *= self.parm.xshrink
                     y_value *= self.parm.yshrink
                     z_value *= self.parm.zshrink
@@ -495,10 +539,11 @@ class xpm2dat(Command):
                 "#### "
                 + f"{z_title} (figure dots) data were shown below, from top to bottom, from left to right:\n"
             )
+            value_matrix = np.asarray(xpm.value_matrix).tolist()
             for y, _ in enumerate(xpm.yaxis):
                 line_list: List[str] = []
                 for x, _ in enumerate(xpm.xaxis):
-                    z_value = xpm.value_matrix[y][x]
+                    z_value = value_matrix[y][x]
                     line_list.append(f"{z_value*self.parm.zshrink:.6f}")
                 fo.write(",".join(line_list) + "\n")
         self.info(
@@ -528,9 +573,14 @@ class xpm_diff(Command):
                 specify the shrink fold number of Y values
         -zs, --zshrink (optional)
                 specify the shrink fold number of Z values
+        --nlevels (optional)
+                quantize values of output into the number of levels, like the -nlevels of gmx
+        --level_method (optional)
+                the spacing of levels: linear, symmetric, quantile. Default to linear
 
     :Usage:
         dit xpm_diff -f DCCM0.xpm DCCM1.xpm -o DCCM0-1.xpm
+        dit xpm_diff -f DCCM0.xpm DCCM1.xpm -o DCCM0-1.xpm --nlevels 100 --level_method symmetric
     """
 
     def __init__(self, parm: Parameters) -> None:
@@ -560,9 +610,13 @@ class xpm_diff(Command):
         xpm.title = self.sel_parm(self.parm.title, f"{xpm0.xpmfile} - {xpm1.xpmfile}")
         xpm.xaxis = [x * self.parm.xshrink for x in xpm.xaxis]
         xpm.yaxis = [y * self.parm.yshrink for y in xpm.yaxis]
-        for y, _ in enumerate(xpm.yaxis):
-            for x, _ in enumerate(xpm.xaxis):
-                xpm.value_matrix[y][x] *= self.parm.zshrink
+        xpm.value_matrix = np.asarray(xpm.value_matrix) * self.parm.zshrink
+        nlevels = self.parm.__dict__.get("nlevels", None)
+        if nlevels != None:
+            xpm.refresh_by_value_matrix(
+                nlevels=nlevels,
+                level_method=self.parm.__dict__.get("level_method", "linear"),
+            )
         xpm.save(self.parm.output)
 
 
@@ -588,6 +642,10 @@ class xpm_merge(Command):
                 specify the shrink fold number of Y values
         -zs, --zshrink (optional)
                 specify the shrink fold number of Z values
+        --nlevels (optional)
+                quantize values of output into the number of levels, like the -nlevels of gmx
+        --level_method (optional)
+                the spacing of levels: linear, symmetric, quantile. Default to linear
 
     :Usage:
         dit xpm_merge -f DCCM0.xpm DCCM1.xpm -o DCCM0-1.xpm
@@ -629,23 +687,24 @@ class xpm_merge(Command):
         out = XPM(self.parm.output, is_file=False, new_file=True)
         for key, value in xpm0.__dict__.items():
             out.__dict__[key] = value
+        heights, widths = np.meshgrid(
+            np.arange(xpm0.height) / xpm0.height,
+            np.arange(xpm0.width) / xpm0.width,
+            indexing="ij",
+        )
+        left_top = heights + widths < 1
         if out.type == "Continuous":
-            for h in range(xpm0.height):
-                for w in range(xpm0.width):
-                    if h / xpm0.height + w / xpm0.width < 1:
-                        value = xpm0.value_matrix[h][w]  # left top
-                    else:
-                        value = xpm1.value_matrix[h][w]  # right bottom
-                    out.value_matrix[h][w] = value
-            out.refresh_by_value_matrix()
+            out.value_matrix = np.where(
+                left_top, xpm0.value_matrix, xpm1.value_matrix
+            ).tolist()
+            out.refresh_by_value_matrix(
+                nlevels=self.parm.__dict__.get("nlevels", None),
+                level_method=self.parm.__dict__.get("level_method", "linear"),
+            )
         else:
-            for h in range(xpm0.height):
-                for w in range(xpm0.width):
-                    if h / xpm0.height + w / xpm0.width < 1:
-                        value = xpm0.notes[xpm0.value_matrix[h][w]]  # left top
-                    else:
-                        value = xpm1.notes[xpm1.value_matrix[h][w]]  # right bottom
-                    out.value_matrix[h][w] = value
+            notes0 = np.array(xpm0.notes, dtype=object)[xpm0.value_matrix]
+            notes1 = np.array(xpm1.notes, dtype=object)[xpm1.value_matrix]
+            out.value_matrix = np.where(left_top, notes0, notes1).tolist()
             out.refresh_by_value_matrix(is_Continuous=False)
 
         out.title = self.sel_parm(
@@ -656,7 +715,96 @@ class xpm_merge(Command):
         out.legend = self.sel_parm(self.parm.zlabel, out.legend)
         out.xaxis = [x * self.parm.xshrink for x in out.xaxis]
         out.yaxis = [y * self.parm.yshrink for y in out.yaxis]
-        for y, _ in enumerate(out.yaxis):
-            for x, _ in enumerate(out.xaxis):
-                out.value_matrix[y][x] *= self.parm.zshrink
+        out.value_matrix = np.asarray(out.value_matrix) * self.parm.zshrink
+        out.save(self.parm.output)
+
+
+class xpm_calc(Command):
+    """
+    Calculate the sum, mean, std, or difference of sets of Continuous xpms pixel by pixel, like averaging the DCCMs or contact maps of many replicas.
+    Xpm files are parsed and accumulated one by one, so that huge sets of xpms could be processed with the memory of only one xpm. Mode `diff` calculates the mean of xpms specified by `-f` minus the mean of xpms specified by `-al`.
+    The absolute values less than `--mask_threshold` could be masked to 0 for hiding weak signals.
+
+    :Parameters:
+        -f, --input
+                specify the xpm files for input
+        -al, --additional_list (optional)
+                specify the second set of xpm files for `diff` mode
+        -m, --mode (optional)
+                specify the calculation: sum, mean, std, diff. Default to mean
+        -o, --output (optional)
+                specify the xpm file name for output, default to 'dit_xpm_calc.xpm'
+        -t, --title (optional)
+                specify the title of XPM of output
+        -x, --xlabel (optional)
+                specify the xlabel of XPM of output
+        -y, --ylabel (optional)
+                specify the ylabel of XPM of output
+        -z, --zlabel (optional)
+                specify the zlabel of XPM of output
+        -xs, --xshrink (optional)
+                specify the shrink fold number of X values
+        -ys, --yshrink (optional)
+                specify the shrink fold number of Y values
+        -zs, --zshrink (optional)
+                specify the shrink fold number of Z values
+        --mask_threshold (optional)
+                mask the values whose absolute values are less than the threshold to 0
+        --nlevels (optional)
+                quantize values of output into the number of levels, like the -nlevels of gmx
+        --level_method (optional)
+                the spacing of levels: linear, symmetric, quantile. Default to linear
+
+    :Usage:
+        dit xpm_calc -f DCCM_r1.xpm DCCM_r2.xpm DCCM_r3.xpm -o DCCM_mean.xpm
+        dit xpm_calc -f DCCM_r1.xpm DCCM_r2.xpm DCCM_r3.xpm -m std -o DCCM_std.xpm
+        dit xpm_calc -f apo_r1.xpm apo_r2.xpm -al holo_r1.xpm holo_r2.xpm -m diff --mask_threshold 0.3
+    """
+
+    def __init__(self, parm: Parameters) -> None:
+        self.parm = parm
+
+    def __call__(self):
+        # self.info("in xpm_calc")
+        # print(self.parm.__dict__)
+
+        if not self.parm.input:
+            self.error("you must specify xpm files for calculation")
+        mode = self.sel_parm(self.parm.mode, "mean")
+        if mode not in ["sum", "mean", "std", "diff"]:
+            self.error(f"xpm_calc only supports modes sum, mean, std, and diff, not {mode}")
+        if mode == "diff" and not self.parm.additional_list:
+            self.error("you must specify the second set of xpm files by -al for diff mode")
+        if not self.parm.output:
+            self.parm.output = "dit_xpm_calc.xpm"
+        self.parm.output = self.check_output_exist(self.parm.output)
+
+        ## generators parse xpms one by one to bound the memory
+        if mode == "diff":
+            out = XPM.calc_stats(XPM(f) for f in self.parm.input) - XPM.calc_stats(
+                XPM(f) for f in self.parm.additional_list
+            )
+            title = f"mean of {len(self.parm.input)} xpms - mean of {len(self.parm.additional_list)} xpms"
+        else:
+            out = XPM.calc_stats((XPM(f) for f in self.parm.input), mode)
+            title = f"{mode} of {len(self.parm.input)} xpms"
+        if self.parm.zshrink != 1:
+            out = out * self.parm.zshrink
+        mask_threshold = self.parm.__dict__.get("mask_threshold", None)
+        if mask_threshold != None:
+            out = out.mask(mask_threshold)
+        nlevels = self.parm.__dict__.get("nlevels", None)
+        if nlevels != None:
+            out.refresh_by_value_matrix(
+                nlevels=nlevels,
+                level_method=self.parm.__dict__.get("level_method", "linear"),
+            )
+
+        out.xpmfile = self.parm.output
+        out.title = self.sel_parm(self.parm.title, title)
+        out.xlabel = self.sel_parm(self.parm.xlabel, out.xlabel)
+        out.ylabel = self.sel_parm(self.parm.ylabel, out.ylabel)
+        out.legend = self.sel_parm(self.parm.zlabel, out.legend)
+        out.xaxis = [x * self.parm.xshrink for x in out.xaxis]
+        out.yaxis = [y * self.parm.yshrink for y in out.yaxis]
         out.save(self.parm.output)
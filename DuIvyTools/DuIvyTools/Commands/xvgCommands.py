@@ -6,18 +6,22 @@ Written by DuIvy and provided to you by GPLv3 license.
 
 import os
 import sys
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+from typing import Callable, Iterator, List, Tuple
 
 import numpy as np
-from scipy.stats import gaussian_kde
+from scipy.signal import fftconvolve
 
 base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
 from Commands.Commands import Command
+from Commands.quantileSketch import QuantileSketch
+from FileParser.xpmParser import XPM
 from FileParser.xvgParser import XVG
-from utils import Parameters
+from utils import Parameters, open_file
 from Visualizer.Visualizer_gnuplot import *
 from Visualizer.Visualizer_matplotlib import *
 from Visualizer.Visualizer_plotext import *
@@ -69,12 +73,27 @@ class xvg_show(Command):
                 specify the precision of X ticklabels
         --y_precision (optional)
                 specify the precision of Y ticklabels
+        -smv, --showMV (optional)
+                show the moving averages and confidence intervals
+        -ws, --windowsize (optional)
+                set the windowsize of calculating moving averages, default to 50
+        -cf, --confidence (optional)
+                set the confidence of calculating confidence intervals, default to 0.95
+        --mv_center (optional)
+                use centered windows to calculate moving averages
+        --mv_method (optional)
+                the method of moving averages: mean (default) with normal confidence intervals, or median with quantile intervals
+        --max_points (optional)
+                the max number of points of each line to draw, default to twice of the output width in pixels of plot engine, 0 for no downsampling
+        --downsample (optional)
+                the downsampling method of lines: minmax (default) keeps the minimum and maximum in each pixel, lttb for Largest-Triangle-Three-Buckets
 
     :Usage:
         dit xvg_show -f RMSD.xvg
         dit xvg_show -f RMSD.xvg -ns -o rmsd.png
         dit xvg_show -f RMSD.xvg -x Time(ns) -xs 0.001 --legend_location
         dit xvg_show -f gyrate.xvg -b 1000 -e 2001 --x_precision 2 --y_precision 2
+        dit xvg_show -f energy.xvg --max_points 5000 --downsample lttb
     """
 
     def __init__(self, parm: Parameters) -> None:
@@ -90,14 +109,28 @@ class xvg_show(Command):
         for xvgfile in self.parm.input:
             xvg = XVG(xvgfile)
             self.file = xvg
-            xdata, data_list = [], []
-            for c in range(len(xvg.data_heads[1:])):  # to avoid str list
-                data_list.append(
-                    [
-                        y * self.parm.yshrink
-                        for y in xvg.data_columns[c + 1][begin:end:dt]
-                    ]
+            xdata, data_list, highs_list, lows_list = [], [], [], []
+            column_indexs = list(range(1, len(xvg.data_heads)))  # to avoid str list
+            if self.parm.showMV:
+                mvaves, mvhighs, mvlows = xvg.calc_rolling(
+                    column_indexs,
+                    self.parm.windowsize,
+                    self.parm.confidence,
+                    self.parm.mv_center,
+                    self.parm.mv_method,
                 )
+            for c in range(len(column_indexs)):
+                if self.parm.showMV:
+                    data = mvaves[:, c]
+                    highs_list.append(
+                        [y * self.parm.yshrink for y in mvhighs[begin:end:dt, c]]
+                    )
+                    lows_list.append(
+                        [y * self.parm.yshrink for y in mvlows[begin:end:dt, c]]
+                    )
+                else:
+                    data = xvg.data_columns[c + 1]
+                data_list.append([y * self.parm.yshrink for y in data[begin:end:dt]])
                 xdata.append(
                     [x * self.parm.xshrink for x in xvg.data_columns[0][begin:end:dt]]
                 )
@@ -116,22 +149,22 @@ class xvg_show(Command):
                 "title": self.get_parm("title"),
                 "x_precision": self.parm.x_precision,
                 "y_precision": self.parm.y_precision,
-                "highs": list(),
-                "lows": list(),
+                "highs": highs_list,
+                "lows": lows_list,
                 "alpha": self.sel_parm(self.parm.alpha, 0.4),
                 "legend_location": self.sel_parm(self.parm.legend_location, "inside"),
             }
             if self.parm.engine == "matplotlib":
-                line = LineMatplotlib(**kwargs)
+                line = LineMatplotlib(**self.downsample(kwargs))
                 line.final(self.parm.output, self.parm.noshow)
             elif self.parm.engine == "plotly":
-                line = LinePlotly(**kwargs)
+                line = LinePlotly(**self.downsample(kwargs))
                 line.final(self.parm.output, self.parm.noshow)
             elif self.parm.engine == "plotext":
-                line = LinePlotext(**kwargs)
+                line = LinePlotext(**self.downsample(kwargs))
                 line.final(self.parm.output, self.parm.noshow)
             elif self.parm.engine == "gnuplot":
-                line = LineGnuplot(**kwargs)
+                line = LineGnuplot(**self.downsample(kwargs))
                 line.final(self.parm.output, self.parm.noshow)
             else:
                 self.error("wrong selection of plot engine")
@@ -174,6 +207,14 @@ class xvg_compare(Command):
                 set the windowsize of calculating moving averages, default to 50
         -cf, --confidence (optional)
                 set the confidence of calculating confidence intervals, default to 0.95
+        --mv_center (optional)
+                use centered windows to calculate moving averages
+        --mv_method (optional)
+                the method of moving averages: mean (default) with normal confidence intervals, or median with quantile intervals
+        --max_points (optional)
+                the max number of points of each line to draw, default to twice of the output width in pixels of plot engine, 0 for no downsampling
+        --downsample (optional)
+                the downsampling method of lines: minmax (default) keeps the minimum and maximum in each pixel, lttb for Largest-Triangle-Three-Buckets
         -xs, --xshrink (optional)
                 specify the shrink fold number of X values
         -ys, --yshrink (optional)
@@ -195,7 +236,9 @@ class xvg_compare(Command):
         --y_precision (optional)
                 specify the precision of Y ticklabels
         --csv (optional)
-                specify the csv file name for dumping xvg data
+                specify the csv file name for dumping xvg data, or a file name ends with .npz for numpy binary format
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
 
     :Usage:
         dit xvg_compare -f RMSD.xvg Gyrate.xvg -c 1 1 -l RMSD(nm) Gyrate(nm)
@@ -236,17 +279,23 @@ class xvg_compare(Command):
 
         ## draw data relative to its original xdata
         begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
-        xvgs = [XVG(xvg) for xvg in self.parm.input]
+        xvgs = self.load_xvgs(self.parm.input, [[0] + c for c in self.parm.columns])
         self.file = xvgs[0]
         legends, xdata, data_list, highs_list, lows_list = [], [], [], [], []
         for id, column_indexs in enumerate(self.parm.columns):
             xvg = xvgs[id]
-            for column_index in column_indexs:
-                xvg.check_column_index(column_index)
+            xvg.check_column_index(column_indexs)
+            if self.parm.showMV:
+                mvaves, mvhighs, mvlows = xvg.calc_rolling(
+                    column_indexs,
+                    self.parm.windowsize,
+                    self.parm.confidence,
+                    self.parm.mv_center,
+                    self.parm.mv_method,
+                )
+            for i, column_index in enumerate(column_indexs):
                 if self.parm.showMV:
-                    aves, highs, lows = xvg.calc_mvave(
-                        self.parm.windowsize, self.parm.confidence, column_index
-                    )
+                    aves, highs, lows = mvaves[:, i], mvhighs[:, i], mvlows[:, i]
                     highs_list.append(
                         [y * self.parm.yshrink for y in highs[begin:end:dt]]
                     )
@@ -283,86 +332,42 @@ class xvg_compare(Command):
             "legend_location": self.sel_parm(self.parm.legend_location, "inside"),
         }
         if self.parm.engine == "matplotlib":
-            line = LineMatplotlib(**kwargs)
+            line = LineMatplotlib(**self.downsample(kwargs))
             line.final(self.parm.output, self.parm.noshow)
         elif self.parm.engine == "plotly":
-            line = LinePlotly(**kwargs)
+            line = LinePlotly(**self.downsample(kwargs))
             line.final(self.parm.output, self.parm.noshow)
         elif self.parm.engine == "plotext":
-            line = LinePlotext(**kwargs)
+            line = LinePlotext(**self.downsample(kwargs))
             line.final(self.parm.output, self.parm.noshow)
         elif self.parm.engine == "gnuplot":
-            line = LineGnuplot(**kwargs)
+            line = LineGnuplot(**self.downsample(kwargs))
             line.final(self.parm.output, self.parm.noshow)
         else:
             self.error("wrong selection of plot engine")
 
         if self.parm.csv:
             self.parm.csv = self.check_output_exist(self.parm.csv)
-            if len(self.parm.input) == 1:
-                self.dump2csv_1_input(kwargs)
-            else:
-                self.dump2csv(kwargs)
-
-    def dump2csv_1_input(self, kwargs):
-        """dump data into csv with only ONE input xvg"""
-        ## merge xvg2csv and xvg_mvave functions here
-        if self.parm.showMV:
-            with open(self.parm.csv, "w") as fo:
-                fo.write(f"""{kwargs["xlabel"].strip("$")}""")
-                for leg in kwargs["legends"]:
-                    leg = leg.strip("$")
-                    fo.write(f""",mvave_{leg},high_{leg},low_{leg}""")
-                fo.write("\n")
-                for r in range(len(kwargs["xdata_list"][0])):
-                    fo.write(f"""{kwargs["xdata_list"][0][r]:.8f}""")
-                    for c in range(len(kwargs["data_list"])):
-                        fo.write(
-                            f""",{kwargs["data_list"][c][r]:.8f},{kwargs["highs"][c][r]:.8f},{kwargs["lows"][c][r]:.8f}"""
-                        )
-                    fo.write("\n")
-        else:
-            with open(self.parm.csv, "w") as fo:
-                fo.write(f"""{kwargs["xlabel"].strip("$")}""")
-                for leg in kwargs["legends"]:
-                    fo.write(f""",{leg.strip("$")}""")
-                fo.write("\n")
-                for r in range(len(kwargs["xdata_list"][0])):
-                    fo.write(f"""{kwargs["xdata_list"][0][r]:.8f}""")
-                    for c in range(len(kwargs["data_list"])):
-                        fo.write(f""",{kwargs["data_list"][c][r]:.8f}""")
-                    fo.write("\n")
-        self.info(f"data has been dumped to {self.parm.csv} successfully")
+            self.dump2csv(kwargs)
 
     def dump2csv(self, kwargs):
-        """dump data into csv with MORE THAN ONE input xvgs"""
+        """dump data into csv (or npz). For ONE input xvg, the X data is shared
+        by all columns, otherwise X data of each column would be kept"""
         ## merge xvg2csv and xvg_mvave functions here
-        if self.parm.showMV:
-            with open(self.parm.csv, "w") as fo:
-                for leg in kwargs["legends"]:
-                    fo.write(f"""{kwargs["xlabel"].strip("$")},""")
-                    leg = leg.strip("$")
-                    fo.write(f"""mvave_{leg},high_{leg},low_{leg},""")
-                fo.write("\n")
-                for r in range(len(kwargs["data_list"][0])):
-                    for c in range(len(kwargs["data_list"])):
-                        fo.write(f"""{kwargs["xdata_list"][c][r]:.8f},""")
-                        fo.write(
-                            f"""{kwargs["data_list"][c][r]:.8f},{kwargs["highs"][c][r]:.8f},{kwargs["lows"][c][r]:.8f},"""
-                        )
-                    fo.write("\n")
-        else:
-            with open(self.parm.csv, "w") as fo:
-                for leg in kwargs["legends"]:
-                    fo.write(f"""{kwargs["xlabel"].strip("$")},""")
-                    fo.write(f"""{leg.strip("$")},""")
-                fo.write("\n")
-                for r in range(len(kwargs["data_list"][0])):
-                    for c in range(len(kwargs["data_list"])):
-                        fo.write(f"""{kwargs["xdata_list"][0][r]:.8f},""")
-                        fo.write(f"""{kwargs["data_list"][c][r]:.8f},""")
-                    fo.write("\n")
-        self.info(f"data has been dumped to {self.parm.csv} successfully")
+        xlabel = kwargs["xlabel"].strip("$")
+        heads, columns = [], []
+        for c, leg in enumerate(kwargs["legends"]):
+            leg = leg.strip("$")
+            if len(self.parm.input) != 1 or c == 0:
+                heads.append(xlabel)
+                columns.append(kwargs["xdata_list"][c])
+            if self.parm.showMV:
+                heads += [f"mvave_{leg}", f"high_{leg}", f"low_{leg}"]
+                columns += [kwargs["data_list"][c], kwargs["highs"][c], kwargs["lows"][c]]
+            else:
+                heads.append(leg)
+                columns.append(kwargs["data_list"][c])
+        self.dump_columns(heads, columns, self.parm.csv)
 
 
 class xvg_ave(Command):
@@ -380,9 +385,17 @@ class xvg_ave(Command):
                 specify the end index of data to calculate
         -dt, --dt (optional)
                 specify the index step of data to calculate
+        --chunk_rows (optional)
+                read xvg files chunk by chunk with N rows per chunk to calculate in constant memory
+        -m, --mode (optional)
+                estimate the std.err of averages for correlated data: `block` for block averaging (Flyvbjerg-Petersen) and `autocorr` for integrated autocorrelation time. Default to the std of data
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
 
     :Usage:
         dit xvg_ave -f RMSD.xvg -b 1000 -e 2001 -o RMSD_ave.dat
+        dit xvg_ave -f RMSD.xvg --chunk_rows 100000
+        dit xvg_ave -f RMSD.xvg -b 1000 -m block
     """
 
     def __init__(self, parm: Parameters) -> None:
@@ -394,18 +407,38 @@ class xvg_ave(Command):
 
         outstr: str = ""
         begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
-        for xvgfile in self.parm.input:
-            xvg = XVG(xvgfile)
+        chunk_rows = self.parm.chunk_rows
+        mode = self.parm.mode
+        if mode not in [None, "block", "autocorr"]:
+            self.warn(f"mode {mode} is not available for xvg_ave, ignore it")
+            mode = None
+        if chunk_rows != None and mode != None:
+            self.warn(
+                f"chunk_rows is not available for {mode} mode, load all data into memory"
+            )
+            chunk_rows = None
+        stderr_head = "Std.Err" if mode == None else f"Std.Err({mode})"
+        xvgs = self.load_xvgs(self.parm.input, load_data=chunk_rows == None)
+        for xvg in xvgs:
             self.file = xvg
             legends, aves, stderrs = [], [], []
-            for c in range(len(xvg.data_heads)):
-                legend, ave, stderr = xvg.calc_ave(begin, end, dt, c)
-                legends.append(legend)
-                aves.append(ave)
-                stderrs.append(stderr)
+            if chunk_rows != None:
+                legends, aves, stderrs = xvg.calc_ave_by_chunks(
+                    begin, end, dt, chunk_rows
+                )
+            elif mode == "block":
+                legends, aves, stderrs = xvg.calc_ave_by_blocking(begin, end, dt)
+            elif mode == "autocorr":
+                legends, aves, stderrs = xvg.calc_ave_by_autocorr(begin, end, dt)
+            else:
+                for c in range(len(xvg.data_heads)):
+                    legend, ave, stderr = xvg.calc_ave(begin, end, dt, c)
+                    legends.append(legend)
+                    aves.append(ave)
+                    stderrs.append(stderr)
             outstr += f"\n>>>>>>>>>>>>>> {xvg.xvgfile:^40} <<<<<<<<<<<<<<\n"
             outstr += "-" * 70 + "\n"
-            outstr += "|" + " " * 28 + "|      Average      |      Std.Err      |\n"
+            outstr += "|" + " " * 28 + f"|      Average      |{stderr_head:^19}|\n"
             outstr += "-" * 70 + "\n"
             for l, a, s in zip(legends, aves, stderrs):
                 outstr += f"|{l:^28}|{a:^19.6f}|{s:^19.6f}|\n"
@@ -418,6 +451,27 @@ class xvg_ave(Command):
             self.info(f"all average data have been saved to {outfile}")
 
 
+def energy_compute_worker(cmd: Command, xvgfiles: List[str], output: str) -> Tuple:
+    """compute the binding energy of one prolig/pro/lig triplet in worker process
+
+    Args:
+        cmd (Command): the xvg_energy_compute command
+        xvgfiles (List[str]): prolig.xvg, pro.xvg and lig.xvg
+        output (str): the output xvg file name
+
+    Returns:
+        Tuple: (None, time, total energy) if succeeded, (error message,) if failed
+    """
+    try:
+        cmd.parm.jobs = 1  # triplets are already computed in parallel
+        time, total = cmd.compute_triplet(xvgfiles, output)
+    except SystemExit:
+        return (f"failed to compute {xvgfiles}, check the error message above",)
+    except Exception as ex:
+        return (f"failed to compute {xvgfiles}: {ex}",)
+    return None, time, total
+
+
 class xvg_energy_compute(Command):
     """
     compute the interaction energy between protein and ligand by:
@@ -428,15 +482,32 @@ class xvg_energy_compute(Command):
             prolig.xvg, pro.xvg, lig.xvg.
         The xvg file used here should contain and ONLY contain five columns:
             Time, LJ(SR), Disper.corr., Coulomb(SR), Coul.recip.
+        Several triplets of files could be specified in one run, like per-residue
+        decomposition. Then the results of the i-th triplet are saved into
+        `{output}_{i}.xvg`, and the total energies of all triplets are combined
+        into a triplet x time matrix `{output}.xpm`.
 
     :Parameters:
         -f, --input
-                specify the energy xvg files: prolig.xvg, pro.xvg, lig.xvg
+                specify the energy xvg files: prolig.xvg, pro.xvg, lig.xvg, (prolig.xvg, pro.xvg, lig.xvg, ...)
         -o, --output (optional)
                 specify the output xvg file name, default to 'dit_energy_compute.xvg'
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files (one triplet) or computing triplets, default to 1
+        -t, --title (optional)
+                specify the title of total energy matrix, default to 'Total Energy'
+        -y, --ylabel (optional)
+                specify the ylabel of total energy matrix, default to 'Triplet'
+        -zp, --z_precision (optional)
+                specify the precision of total energy matrix, default to 1
+        --nlevels (optional)
+                quantize values of total energy matrix into the number of levels, like the -nlevels of gmx
+        --level_method (optional)
+                the spacing of levels: linear, symmetric, quantile. Default to linear
 
     :Usage:
         dit xvg_energy_compute -f prolig.xvg pro.xvg lig.xvg
+        dit xvg_energy_compute -f r1_prolig.xvg r1_pro.xvg r1_lig.xvg r2_prolig.xvg r2_pro.xvg r2_lig.xvg -j 4 -o res.xvg
     """
 
     def __init__(self, parm: Parameters) -> None:
@@ -447,18 +518,86 @@ class xvg_energy_compute(Command):
         # print(self.parm.__dict__)
 
         ## check parameters
-        if len(self.parm.input) != 3:
+        if len(self.parm.input) == 0 or len(self.parm.input) % 3 != 0:
             self.error(
                 "wrong number of input xvg files, must be prolig.xvg, pro.xvg and lig.xvg by order"
             )
-        prolig_xvg = self.parm.input[0]
-        pro_xvg = self.parm.input[1]
-        lig_xvg = self.parm.input[2]
+        triplets = [self.parm.input[i : i + 3] for i in range(0, len(self.parm.input), 3)]
         if not self.parm.output:
             self.parm.output = "dit_energy_compute.xvg"
-        self.parm.output = self.check_output_exist(self.parm.output)
+        if len(triplets) == 1:
+            self.compute_triplet(triplets[0], self.check_output_exist(self.parm.output))
+            return
+
+        root, suffix = os.path.splitext(self.parm.output)
+        outputs = [
+            self.check_output_exist(f"{root}_{i+1}{suffix}")
+            for i in range(len(triplets))
+        ]
+        jobs = min(self.parm.__dict__.get("jobs", None) or 1, len(triplets))
+        if jobs <= 1:
+            results = [
+                (None, *self.compute_triplet(triplet, output))
+                for triplet, output in zip(triplets, outputs)
+            ]
+        else:
+            self.info(f"computing {len(triplets)} triplets with {jobs} processes")
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    executor.submit(energy_compute_worker, self, triplet, output)
+                    for triplet, output in zip(triplets, outputs)
+                ]
+                results = []
+                for triplet, future in zip(triplets, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as ex:
+                        results.append((f"failed to compute {triplet}: {ex}",))
+        errors = [result[0] for result in results if result[0] != None]
+        if len(errors) != 0:
+            self.error("\n".join(errors))
+
+        ## total energy matrix of triplets x time
+        time = results[0][1]
+        for triplet, result in zip(triplets, results):
+            if len(result[1]) != len(time) or not np.array_equal(result[1], time):
+                self.error(
+                    f"the Time axis of {triplet[0]} differs from {triplets[0][0]}, unable to combine total energies into matrix"
+                )
+        zp = self.sel_parm(self.parm.z_precision, 1)
+        totals = np.round(np.vstack([result[2] for result in results]), zp)
+        xpm = XPM(f"{root}.xpm", is_file=False, new_file=True)
+        xpm.title = self.sel_parm(self.parm.title, "Total Energy")
+        xpm.legend = "(kJ/mol)"
+        xpm.type = "Continuous"
+        xpm.xlabel = self.sel_parm(self.parm.xlabel, "Time (ps)")
+        xpm.ylabel = self.sel_parm(self.parm.ylabel, "Triplet")
+        xpm.width = len(time)
+        xpm.height = len(triplets)
+        xpm.xaxis = time.tolist()
+        xpm.yaxis = [i + 1 for i in range(len(triplets))]
+        xpm.yaxis.reverse()
+        xpm.value_matrix = totals[::-1].tolist()  # top to bottom
+        xpm.refresh_by_value_matrix(
+            nlevels=self.parm.__dict__.get("nlevels", None),
+            level_method=self.parm.__dict__.get("level_method", "linear"),
+        )
+        xpm.save(self.check_output_exist(f"{root}.xpm"))
 
-        prolig, pro, lig = XVG(prolig_xvg), XVG(pro_xvg), XVG(lig_xvg)
+    def compute_triplet(self, xvgfiles: List[str], output: str) -> Tuple[np.ndarray]:
+        """compute the binding energy of one prolig/pro/lig triplet and save it
+        into xvg file
+
+        Args:
+            xvgfiles (List[str]): prolig.xvg, pro.xvg and lig.xvg
+            output (str): the output xvg file name
+
+        Returns:
+            time (np.ndarray): the time column
+            total (np.ndarray): the total binding energy
+        """
+        prolig_xvg, pro_xvg, lig_xvg = xvgfiles
+        prolig, pro, lig = self.load_xvgs([prolig_xvg, pro_xvg, lig_xvg])
         if not (prolig.data_heads == pro.data_heads == lig.data_heads) or (
             len(prolig.data_heads) != 5
         ):
@@ -479,13 +618,28 @@ class xvg_energy_compute(Command):
                 + "    Time, LJ(SR), Disper.corr., Coulomb(SR), Coul.recip. "
             )
         if not (prolig.row_num == pro.row_num == lig.row_num):
-            self.error("{}, {}, {} should contain same number of rows.")
-        if not (prolig.data_columns[0] == pro.data_columns[0] == lig.data_columns[0]):
+            self.error(
+                f"{prolig_xvg}, {pro_xvg}, {lig_xvg} should contain same number of rows."
+            )
+        time = np.asarray(prolig.data_columns[0])
+        if not (
+            np.array_equal(time, pro.data_columns[0])
+            and np.array_equal(time, lig.data_columns[0])
+        ):
             self.error("the Time axis may not be the same, check the interval of time.")
 
         ## compute the bingding energy
-        ## time
-        out_data = [prolig.data_columns[0]] + [[] for _ in range(9)]
+        ## LJ(SR), Disper.corr., Coulomb(SR), Coul.recip.
+        terms = [
+            np.asarray(prolig.data_columns[c], dtype=np.float64)
+            - pro.data_columns[c]
+            - lig.data_columns[c]
+            for c in range(1, 5)
+        ]
+        lj, coul = terms[0] + terms[1], terms[2] + terms[3]
+        short, long = terms[0] + terms[2], terms[1] + terms[3]
+        total = lj + coul
+        out_data = [time] + terms + [lj, coul, short, long, total]
         out_heads = (
             [prolig.data_heads[0]]
             + [head for head in prolig.legends]
@@ -497,56 +651,15 @@ class xvg_energy_compute(Command):
                 "Total Energy",
             ]
         )
-        ## LJ(SR)
-        out_data[1] = [
-            prolig.data_columns[1][row]
-            - pro.data_columns[1][row]
-            - lig.data_columns[1][row]
-            for row in range(prolig.row_num)
-        ]
-        ## Disper.corr.
-        out_data[2] = [
-            prolig.data_columns[2][row]
-            - pro.data_columns[2][row]
-            - lig.data_columns[2][row]
-            for row in range(prolig.row_num)
-        ]
-        ## Coulomb(SR)
-        out_data[3] = [
-            prolig.data_columns[3][row]
-            - pro.data_columns[3][row]
-            - lig.data_columns[3][row]
-            for row in range(prolig.row_num)
-        ]
-        ## Coul.recip.
-        out_data[4] = [
-            prolig.data_columns[4][row]
-            - pro.data_columns[4][row]
-            - lig.data_columns[4][row]
-            for row in range(prolig.row_num)
-        ]
-        for row in range(prolig.row_num):
-            ## LJ(all)
-            out_data[5].append(out_data[1][row] + out_data[2][row])
-            ## Coulomb(all)
-            out_data[6].append(out_data[3][row] + out_data[4][row])
-            ## Short-Range(all)
-            out_data[7].append(out_data[1][row] + out_data[3][row])
-            ## Long-Range(all)
-            out_data[8].append(out_data[2][row] + out_data[4][row])
-            ## Total Energy
-            out_data[9].append(out_data[5][row] + out_data[6][row])
 
         ## write energy computation results
-        xvg = XVG(self.parm.output, is_file=False, new_file=True)
+        xvg = XVG(output, is_file=False, new_file=True)
         xvg.title = prolig.title
         xvg.comments += "# this file was created by XVG.energy_compute through: \n"
         xvg.comments += (
             "#    binding = prolig energy - protein energy - ligand energy\n"
         )
-        xvg.comments += (
-            f"#    {self.parm.output} = {prolig_xvg} - {pro_xvg} - {lig_xvg}\n"
-        )
+        xvg.comments += f"#    {output} = {prolig_xvg} - {pro_xvg} - {lig_xvg}\n"
         xvg.xlabel = out_heads[0]
         xvg.ylabel = "(kJ/mol)"
         xvg.legends = out_heads[1:]
@@ -554,10 +667,11 @@ class xvg_energy_compute(Command):
         xvg.column_num = 10
         xvg.row_num = prolig.row_num
         xvg.data_heads = out_heads
-        xvg.save(self.parm.output)
+        xvg.save(output)
         self.info(
             f"energy computation through {prolig_xvg}, {pro_xvg} and {lig_xvg} sucessfully"
         )
+        return time, total
 
 
 class xvg_combine(Command):
@@ -587,9 +701,21 @@ class xvg_combine(Command):
                 specify the index step of data
         -ys, --yshrink (optional)
                 specify the shrink fold number of all selected data columns
+        --chunk_rows (optional)
+                combine xvg files chunk by chunk with N rows per chunk in constant memory
+        --align (optional)
+                specify how to align rows of xvg files: `index` (default) pairs rows by index, `time` joins rows with the same time (the first column of each file) within `--tolerance`, `interp` interpolates data linearly onto the time of the first file or a regular grid set by `--resample`. Rows not covered by all files are dropped in `time` and `interp` mode, and files are streamed chunk by chunk
+        --tolerance (optional)
+                specify the max time difference of rows to be joined in `time` align mode, default to 0 for exact match
+        --resample (optional)
+                specify the time step of the regular grid to resample data in `interp` align mode
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
 
     :Usage:
         dit xvg_combine -f RMSD.xvg Gyrate.xvg -c 0,1 1 -l RMSD Gyrate -x Time(ps)
+        dit xvg_combine -f RMSD.xvg Gyrate.xvg -c 0,1 1 --align time --tolerance 0.5
+        dit xvg_combine -f RMSD.xvg Gyrate.xvg -c 0,1 1 --align interp --resample 100
     """
 
     def __init__(self, parm: Parameters) -> None:
@@ -620,7 +746,10 @@ class xvg_combine(Command):
         out_xvg = XVG(self.parm.output, is_file=False, new_file=True)
         title_list: str = []
         out_xvg.comments += "# this file was created by combination of:\n"
-        xvgs = [XVG(xvg) for xvg in self.parm.input]
+        by_chunks = self.parm.chunk_rows != None or self.parm.align != "index"
+        xvgs = self.load_xvgs(
+            self.parm.input, self.parm.columns, load_data=not by_chunks
+        )
         for id, column_indexs in enumerate(self.parm.columns):
             xvg = xvgs[id]
             if xvg.title not in title_list:
@@ -629,8 +758,12 @@ class xvg_combine(Command):
             for column_index in column_indexs:
                 xvg.check_column_index(column_index)
                 out_xvg.data_heads.append(xvg.data_heads[column_index])
+                if by_chunks:
+                    continue
                 data = xvg.data_columns[column_index][begin:end:dt]
-                out_xvg.data_columns.append([d * self.parm.yshrink for d in data])
+                out_xvg.data_columns.append(
+                    np.asarray(data, dtype=np.float64) * self.parm.yshrink
+                )
         if self.parm.title:
             out_xvg.title = self.parm.title
         else:
@@ -641,9 +774,162 @@ class xvg_combine(Command):
             out_xvg.ylabel = self.parm.ylabel
         if self.parm.legends:
             out_xvg.legends = self.parm.legends
-        out_xvg.save(self.parm.output)
+        if by_chunks:
+            self.combine_by_chunks(out_xvg, xvgs)
+        else:
+            out_xvg.save(self.parm.output)
         self.info("xvg files combined successfully")
 
+    def combine_by_chunks(self, out_xvg: XVG, xvgs: List[XVG]) -> None:
+        """combine the selected columns of xvg files chunk by chunk, and dump
+        the rows into output xvg file without loading the whole data
+
+        Args:
+            out_xvg (XVG): the output XVG object with header settings
+            xvgs (List[XVG]): the input XVG objects
+        """
+        if len(out_xvg.legends) == 0:
+            out_xvg.legends = out_xvg.data_heads[1:]
+        if not out_xvg.xlabel:
+            out_xvg.xlabel = out_xvg.data_heads[0]
+        if self.parm.align == "index":
+            blocks = self.iter_blocks_by_index(xvgs)
+        else:
+            blocks = self.iter_blocks_by_time(xvgs)
+        row_num: int = 0
+        with open_file(self.parm.output, "w") as fo:
+            fo.write(out_xvg.dump_header())
+            for block in blocks:
+                block = block * self.parm.yshrink
+                out_xvg.dump_rows(fo, block.T, block.shape[0])
+                row_num += block.shape[0]
+        if row_num == 0:
+            self.error("unable to dump with empty data_columns")
+        self.info(f"dump xvg to {self.parm.output} successfully")
+
+    def iter_blocks_by_index(self, xvgs: List[XVG]) -> Iterator[np.ndarray]:
+        """yield blocks of selected columns of xvg files, rows are paired by index
+
+        Args:
+            xvgs (List[XVG]): the input XVG objects
+
+        Yields:
+            Iterator[np.ndarray]: combined data blocks
+        """
+        begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
+        rows = self.parm.chunk_rows or 100000
+        chunk_iters = [
+            xvg.iter_chunks(rows, column_indexs, begin, end, dt)
+            for xvg, column_indexs in zip(xvgs, self.parm.columns)
+        ]
+        for blocks in zip_longest(*chunk_iters):
+            if any(block is None for block in blocks) or (
+                len(set(block.shape[0] for block in blocks)) != 1
+            ):
+                self.error("the number of rows of selected xvg files are not equal")
+            yield np.hstack(blocks)
+
+    def iter_blocks_by_time(self, xvgs: List[XVG]) -> Iterator[np.ndarray]:
+        """yield blocks of selected columns of xvg files, rows are aligned by the
+        time (first column) of each file. All files are streamed together like a
+        merge join, only rows around the current block are kept in buffers.
+
+        Args:
+            xvgs (List[XVG]): the input XVG objects
+
+        Yields:
+            Iterator[np.ndarray]: combined data blocks
+        """
+        begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
+        rows = self.parm.chunk_rows or 100000
+        align, step = self.parm.align, self.parm.resample
+        tolerance = self.parm.tolerance or 0.0
+        if step != None and align != "interp":
+            self.warn("resample is only available for interp align mode, ignore it")
+            step = None
+        chunk_iters = [
+            xvg.iter_chunks(rows, [0] + column_indexs, begin, end, dt)
+            for xvg, column_indexs in zip(xvgs, self.parm.columns)
+        ]
+        buffers = [np.empty((0, len(c) + 1)) for c in self.parm.columns]
+        exhausted = [False for _ in xvgs]
+
+        def fill(id: int, until: float) -> None:
+            """read blocks into buffer until its last time is larger than until"""
+            while not exhausted[id] and (
+                len(buffers[id]) == 0 or buffers[id][-1, 0] <= until
+            ):
+                block = next(chunk_iters[id], None)
+                if block is None:
+                    exhausted[id] = True
+                    break
+                times = np.concatenate([buffers[id][-1:, 0], block[:, 0]])
+                if np.any(np.diff(times) <= 0):
+                    self.error(
+                        f"the time of {xvgs[id].xvgfile} should be strictly increasing to align rows by time"
+                    )
+                buffers[id] = np.vstack([buffers[id], block])
+
+        def match(id: int, times: np.ndarray) -> Tuple[np.ndarray]:
+            """get values of buffer at times, and the mask of matched times"""
+            buffer = buffers[id]
+            if len(buffer) == 0:
+                return np.zeros((len(times), buffer.shape[1] - 1)), np.zeros(
+                    len(times), dtype=bool
+                )
+            if align == "interp":
+                values = np.column_stack(
+                    [np.interp(times, buffer[:, 0], v) for v in buffer[:, 1:].T]
+                )
+                mask = (times >= buffer[0, 0]) & (times <= buffer[-1, 0])
+            else:
+                rights = np.minimum(np.searchsorted(buffer[:, 0], times), len(buffer) - 1)
+                lefts = np.maximum(rights - 1, 0)
+                distances = np.abs(buffer[rights, 0] - times)
+                nearests = np.where(
+                    distances < np.abs(buffer[lefts, 0] - times), rights, lefts
+                )
+                values = buffer[nearests, 1:]
+                mask = np.abs(buffer[nearests, 0] - times) <= tolerance
+            ## keep one row before the remaining times for next block
+            keep = max(np.searchsorted(buffer[:, 0], times[-1] - tolerance) - 1, 0)
+            buffers[id] = buffer[keep:]
+            return values, mask
+
+        if step == None:
+            ## the time of the first file is the reference
+            for block in chunk_iters[0]:
+                if block.shape[0] == 0:
+                    continue
+                times = block[:, 0]
+                values_list, mask = [block[:, 1:]], np.ones(len(times), dtype=bool)
+                for id in range(1, len(xvgs)):
+                    fill(id, times[-1] + tolerance)
+                    values, matched = match(id, times)
+                    values_list.append(values)
+                    mask &= matched
+                yield np.hstack(values_list)[mask]
+            return
+
+        ## resample all files onto a regular grid
+        for id in range(len(xvgs)):
+            fill(id, -np.inf)
+            if len(buffers[id]) == 0:
+                self.error(f"no data selected from {xvgs[id].xvgfile}")
+        start, offset = max(buffer[0, 0] for buffer in buffers), 0
+        while True:
+            times = start + step * np.arange(offset, offset + rows)
+            offset += rows
+            values_list, mask = [], np.ones(len(times), dtype=bool)
+            for id in range(len(xvgs)):
+                fill(id, times[-1])
+                values, matched = match(id, times)
+                values_list.append(values)
+                mask &= matched
+            yield np.hstack(values_list)[mask]
+            if not np.all(mask):
+                break
+
 
 class xvg_show_distribution(xvg_compare):
     """
@@ -683,7 +969,7 @@ class xvg_show_distribution(xvg_compare):
         -ymax, --ymax (optional)
                 specify the ymax value of figure canvas
         --csv (optional)
-                specify the output csv file name for saving distribution data
+                specify the output csv file name for saving distribution data, or a file name ends with .npz for numpy binary format
         --alpha (optional)
                 specify the opacity of distribution, default to 0.4
         --x_precision (optional)
@@ -694,13 +980,22 @@ class xvg_show_distribution(xvg_compare):
                 specify the location of legends, inside or outside
         -al, --additional_list (optional)
                 specify the bin number of calculating distribution, default to 100. You should set a int number, like `-al 200`
+        --bin_method (optional)
+                specify the binning method: `fixed` for bins of equal width (default), `quantile` for bins of equal counts, `fd` for bin width by Freedman-Diaconis rule. All selected data share the same bins
         -m, --mode (optional)
                 set the mode to be `pdf` to present Kernel Density Estimation of selected data. set to `cdf` for Cumulative Kernel Density Estimation
+        --kde_points (optional)
+                specify the max number of grid points for `pdf` and `cdf` mode, default to 1024
+        --chunk_rows (optional)
+                read xvg files chunk by chunk with N rows per chunk to calculate distribution in constant memory, not available for `pdf` and `cdf` mode. Files are read twice (range and counts) for `fixed` bins, and three times for `quantile` and `fd` bins, compressed files are decompressed in each pass
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
 
     :Usage:
         dit xvg_show_distribution -f RMSD.xvg Gyrate.xvg -c 1 1
         dit xvg_show_distribution -f RMSD.xvg -c 1 -al 50 -csv test.csv
         dit xvg_show_distribution -f RMSD.xvg -c 1 -eg plotly
+        dit xvg_show_distribution -f RMSD.xvg Gyrate.xvg -c 1 1 --bin_method fd
         dit xvg_show_distribution -f RMSD.xvg Gyrate.xvg -c 1 1 -m pdf
         dit xvg_show_distribution -f RMSD.xvg Gyrate.xvg -c 1 1 -m cdf -eg plotly
     """
@@ -725,30 +1020,55 @@ class xvg_show_distribution(xvg_compare):
         if bin <= 0:
             self.error("bin for distribution calculation can not be <= 0")
         begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
-        xvgs = [XVG(xvg) for xvg in self.parm.input]
+        by_chunks = self.parm.chunk_rows != None
+        if by_chunks and self.parm.mode in ["pdf", "cdf"]:
+            self.warn(
+                f"chunk_rows is not available for {self.parm.mode} mode, load all data into memory"
+            )
+            by_chunks = False
+        xvgs = self.load_xvgs(
+            self.parm.input, self.parm.columns, load_data=not by_chunks
+        )
         self.file = xvgs[0]
-        legends, xdata_list, data_list, lows_list = [], [], [], []
+        legends = []
         for id, column_indexs in enumerate(self.parm.columns):
             xvg = xvgs[id]
             for column_index in column_indexs:
                 xvg.check_column_index(column_index)
-                data = xvg.data_columns[column_index][begin:end:dt]
-                if len(data) == 0:
-                    self.error("wrong selection of begin, end, or dt, no data selected")
+                legend = xvg.data_heads[column_index]
+                legends.append(f"{legend} - {xvg.xvgfile}")
+        if by_chunks:
+            xdata_list, data_list = self.calc_distributions_by_chunks(
+                xvgs, begin, end, dt, bin
+            )
+            ylabel = "Frequency(%)"
+        else:
+            datas = []
+            for id, column_indexs in enumerate(self.parm.columns):
+                for column_index in column_indexs:
+                    data = np.asarray(
+                        xvgs[id].data_columns[column_index][begin:end:dt],
+                        dtype=np.float64,
+                    )
+                    if len(data) == 0:
+                        self.error(
+                            "wrong selection of begin, end, or dt, no data selected"
+                        )
+                    datas.append(data)
+            if self.parm.mode in ["pdf", "cdf"]:
+                xdata_list, data_list = [], []
+                for data in datas:
+                    xdata, ydata = self.calc_density(data, self.parm.mode)
+                    xdata_list.append(xdata)
+                    data_list.append(ydata)
                 if self.parm.mode == "pdf":
-                    xdata, ydata = self.calc_density(data, "pdf")
                     ylabel = "kernel density estimation"
-                elif self.parm.mode == "cdf":
-                    xdata, ydata = self.calc_density(data, "cdf")
-                    ylabel = "cumulative kernel density estimation"
                 else:
-                    xdata, ydata = self.calc_distribution(data, bin)
-                    ylabel = "Frequency(%)"
-                data_list.append(ydata)
-                xdata_list.append(xdata)
-                lows_list.append([0 for _ in ydata])
-                legend = xvg.data_heads[column_index]
-                legends.append(f"{legend} - {xvg.xvgfile}")
+                    ylabel = "cumulative kernel density estimation"
+            else:
+                xdata_list, data_list = self.calc_distributions(datas, bin)
+                ylabel = "Frequency(%)"
+        lows_list = [[0 for _ in ydata] for ydata in data_list]
         self.remove_latex()
         legends = self.remove_latex_msgs(legends)
 
@@ -790,72 +1110,244 @@ class xvg_show_distribution(xvg_compare):
             self.dump2csv(kwargs)
 
     def dump2csv(self, kwargs):
-        """save distribution data into csv file"""
-        with open(self.parm.csv, "w") as fo:
-            for leg in kwargs["legends"]:
-                fo.write(
-                    f"""{kwargs["xlabel"]}_of_{leg.strip("$")},{kwargs["ylabel"]}_of_{leg.strip("$")},"""
-                )
-            fo.write("\n")
-            for r in range(len(kwargs["data_list"][0])):
-                line: str = ""
-                for c in range(len(kwargs["data_list"])):
-                    x = kwargs["xdata_list"][c][r]
-                    y = kwargs["data_list"][c][r]
-                    line += f"""{x:.8f},{y:.8f},"""
-                fo.write(line.strip(",") + "\n")
-        self.info(f"data has been dumped to {self.parm.csv} successfully")
-
-    def calc_distribution(
-        self, data: List[float], bin: int
-    ) -> Tuple[List[float], List[float]]:
-        """calculate the distribution of data
+        """save distribution data into csv (or npz) file"""
+        heads, columns = [], []
+        for c, leg in enumerate(kwargs["legends"]):
+            leg = leg.strip("$")
+            heads += [f"""{kwargs["xlabel"]}_of_{leg}""", f"""{kwargs["ylabel"]}_of_{leg}"""]
+            columns += [kwargs["xdata_list"][c], kwargs["data_list"][c]]
+        self.dump_columns(heads, columns, self.parm.csv)
+
+    def calc_bin_edges(
+        self, min: float, max: float, count: int, bin: int, quantile: Callable
+    ) -> Tuple[np.ndarray, bool]:
+        """calculate the bin edges shared by all selected data by the binning
+        method of `--bin_method`
 
         Args:
-            data (List[float]): data
+            min (float): the minimum of all selected data
+            max (float): the maximum of all selected data
+            count (int): the number of all selected data
             bin (int): bin number
+            quantile (Callable): function to calculate quantiles of all selected data
 
         Returns:
-            xdata (List[float]): xdata
-            data (List[float]): distribution data
+            edges (np.ndarray): bin edges, in length of bin number + 1
+            uniform (bool): whether all bins have the same width
         """
-        min, max = np.min(data), np.max(data)
-        bin_window = (max - min) / bin
-        if bin_window != 0:
-            frequency = [0 for _ in range(bin)]
-            for value in data:
-                index = int((value - min) / bin_window)
-                if index == bin:
-                    index = bin - 1
-                frequency[index] += 1
-            if sum(frequency) != len(data):
-                self.error("wrong in calculating distribution")
-            frequency = [f * 100.0 / len(data) for f in frequency]
-            x_value = [min + bin_window * b for b in range(bin)]
+        method = self.parm.bin_method
+        if method == "quantile":
+            edges = np.unique(quantile(np.linspace(0, 1, bin + 1)))
+            edges[0], edges[-1] = min, max
+            if len(edges) - 1 != bin:
+                self.info(f"set bin of distribution to {len(edges) - 1} for unique quantiles")
+            return edges, False
+        if method == "fd":
+            q1, q3 = quantile([0.25, 0.75])
+            bin_window = 2 * (q3 - q1) / count ** (1 / 3)
+            if bin_window > 0:
+                bin = int(np.ceil((max - min) / bin_window))
+                self.info(f"set bin of distribution to {bin} by Freedman-Diaconis rule")
+            else:
+                self.warn(
+                    f"interquartile range of data is 0, unable to apply Freedman-Diaconis rule, use {bin} bins"
+                )
+        return np.linspace(min, max, bin + 1), True
+
+    def count_bins(
+        self,
+        values: np.ndarray,
+        groups: np.ndarray,
+        groups_num: int,
+        edges: np.ndarray,
+        uniform: bool,
+    ) -> np.ndarray:
+        """count values of all groups into bins by one bincount pass. Like
+        np.histogram, values out of the edges (and NaN) are not counted
+
+        Args:
+            values (np.ndarray): the data values
+            groups (np.ndarray): group index of values, broadcastable to values
+            groups_num (int): the number of groups
+            edges (np.ndarray): bin edges
+            uniform (bool): whether all bins have the same width
+
+        Returns:
+            np.ndarray: counts in shape of (groups_num, bin)
+        """
+        bin = len(edges) - 1
+        values = np.asarray(values)
+        inside = (values >= edges[0]) & (values <= edges[-1])
+        groups = np.broadcast_to(groups, values.shape)[inside]
+        values = values[inside]
+        if uniform:
+            bin_window = (edges[-1] - edges[0]) / bin
+            indexs = ((values - edges[0]) / bin_window).astype(np.int64)
         else:
-            frequency = [1]
-            x_value = [min]
-        return x_value, frequency
+            indexs = np.searchsorted(edges, values, side="right") - 1
+        ## the last edge is included in the last bin
+        np.clip(indexs, 0, bin - 1, out=indexs)
+        indexs += groups * bin
+        counts = np.bincount(indexs, minlength=groups_num * bin)
+        return counts.reshape(groups_num, bin)
+
+    def counts2frequency(
+        self, counts: np.ndarray, edges: np.ndarray
+    ) -> Tuple[List[List[float]], List[List[float]]]:
+        """convert bin counts of groups into percentage frequency"""
+        totals = np.sum(counts, axis=1, keepdims=True)
+        frequency = counts * 100.0 / np.maximum(totals, 1)
+        return [edges[:-1].tolist() for _ in frequency], frequency.tolist()
+
+    def calc_distributions(
+        self, datas: List[np.ndarray], bin: int
+    ) -> Tuple[List[List[float]], List[List[float]]]:
+        """calculate the distributions of several groups of data over shared
+        bin edges
+
+        Args:
+            datas (List[np.ndarray]): groups of data
+            bin (int): bin number
+
+        Returns:
+            xdata_list (List[List[float]]): xdata of each group
+            data_list (List[List[float]]): distribution data of each group
+        """
+        values = np.concatenate(datas)
+        groups = np.repeat(np.arange(len(datas)), [len(data) for data in datas])
+        finite = np.isfinite(values)
+        if not np.all(finite):
+            self.warn(
+                f"{np.sum(~finite)} NaN or infinite values are dropped from distributions"
+            )
+            values, groups = values[finite], groups[finite]
+            if len(values) == 0:
+                self.error("no finite values to calculate distributions")
+        min, max = np.min(values), np.max(values)
+        if min == max:
+            return [[min] for _ in datas], [[1] for _ in datas]
+        quantile = lambda q: np.quantile(values, q)
+        edges, uniform = self.calc_bin_edges(min, max, len(values), bin, quantile)
+        counts = self.count_bins(values, groups, len(datas), edges, uniform)
+        return self.counts2frequency(counts, edges)
+
+    def calc_distributions_by_chunks(
+        self, xvgs: List[XVG], begin: int, end: int, dt: int, bin: int
+    ) -> Tuple[List[List[float]], List[List[float]]]:
+        """calculate the distributions of selected columns of xvg files chunk by
+        chunk over shared bin edges. The range of data is obtained by the first
+        pass over files, quantiles (if needed) are interpolated from a fine
+        histogram by the second pass, and counts are accumulated by the last pass.
+        So files are read 2 times for `fixed` bins and 3 times for `quantile` and
+        `fd` bins, the exact counts over edges unknown in advance need the last pass.
+
+        Args:
+            xvgs (List[XVG]): the xvg objects
+            begin (int): the begin index
+            end (int): the end index
+            dt (int): the index step
+            bin (int): bin number
+
+        Returns:
+            xdata_list (List[List[float]]): xdata of each selected column
+            data_list (List[List[float]]): distribution data of each selected column
+        """
+        rows = self.parm.chunk_rows
+        groups_num = sum(len(column_indexs) for column_indexs in self.parm.columns)
+
+        def iter_blocks():
+            offset = 0
+            for xvg, column_indexs in zip(xvgs, self.parm.columns):
+                for block in xvg.iter_chunks(rows, column_indexs, begin, end, dt):
+                    yield block, offset + np.arange(len(column_indexs))
+                offset += len(column_indexs)
+
+        ## the number of selected rows, and finite values of all selected columns
+        rows_num, count, dropped, min, max = 0, 0, 0, np.inf, -np.inf
+        for block, _ in iter_blocks():
+            if block.shape[0] == 0:
+                continue
+            rows_num += block.shape[0]
+            finite = block[np.isfinite(block)]
+            count += finite.size
+            dropped += block.size - finite.size
+            if finite.size != 0:
+                min = np.minimum(min, np.min(finite))
+                max = np.maximum(max, np.max(finite))
+        if rows_num == 0:
+            self.error("wrong selection of begin, end, or dt, no data selected")
+        if dropped != 0:
+            self.warn(f"{dropped} NaN or infinite values are dropped from distributions")
+        if count == 0:
+            self.error("no finite values to calculate distributions")
+        if min == max:
+            return [[min] for _ in range(groups_num)], [[1] for _ in range(groups_num)]
+
+        def quantile(q):
+            fine_edges = np.linspace(min, max, (1 << 16) + 1)
+            fine_counts = np.zeros(1 << 16, dtype=np.int64)
+            for block, _ in iter_blocks():
+                fine_counts += self.count_bins(block, 0, 1, fine_edges, True)[0]
+            cdf = np.cumsum(fine_counts) / np.sum(fine_counts)
+            return np.interp(q, np.concatenate([[0], cdf]), fine_edges)
+
+        edges, uniform = self.calc_bin_edges(min, max, count, bin, quantile)
+        counts = np.zeros((groups_num, len(edges) - 1), dtype=np.int64)
+        for block, groups in iter_blocks():
+            counts += self.count_bins(block, groups, groups_num, edges, uniform)
+        return self.counts2frequency(counts, edges)
 
     def calc_density(
         self, data: List[float], key: str = "pdf"
     ) -> Tuple[List[float], List[float]]:
-        """calculate the density distribution of data by scify.gaussian_kde
+        """calculate the density distribution of data by binned gaussian kernel
+        density estimation. Data are linearly binned onto a grid of at most
+        `--kde_points` points (padded by 4 bandwidths on both sides) and
+        convolved with the gaussian kernel by FFT, the bandwidth is selected by
+        Scott's rule as scipy.stats.gaussian_kde does. The cumulative density is
+        integrated by the cumulative sum of density.
 
         Args:
             data (List[float]): data
+            key (str): `pdf` for density, `cdf` for cumulative density
 
         Returns:
             xdata (List[float]): xdata
             data (List[float]): distribution data
         """
-        kernel = gaussian_kde(data)
-        xdata = np.linspace(np.min(data), np.max(data), len(data) * 1)
+        data = np.asarray(data, dtype=np.float64)
+        count = len(data)
+        min, max = np.min(data), np.max(data)
+        std = np.std(data, ddof=1) if count > 1 else 0
+        if not std > 0:
+            self.error("unable to estimate the density of data without variance")
+        bandwidth = std * count ** (-1 / 5)
+        points = int(np.minimum(count, self.parm.kde_points))
+        step = (max - min) / (points - 1)
+        pad = int(np.clip(np.ceil(4 * bandwidth / step), 1, 4 * points))
+        grid_num = points + 2 * pad
+
+        ## linear binning onto grid
+        positions = data - min
+        positions /= step
+        indexs = np.minimum(positions.astype(np.int64), points - 2)
+        positions -= indexs  # fractions to the right grid point
+        uppers = np.bincount(indexs, positions, minlength=points)
+        weights = np.zeros(grid_num)
+        weights[pad : pad + points] = np.bincount(indexs, minlength=points) - uppers
+        weights[pad + 1 : pad + points + 1] += uppers
+
+        offsets = np.arange(-pad, pad + 1) * step / bandwidth
+        kernel = np.exp(-0.5 * offsets**2) / (np.sqrt(2 * np.pi) * bandwidth)
+        density = fftconvolve(weights, kernel, mode="same") / count
+        density = np.maximum(density, 0)  # remove negative round-off of FFT
+        xdata = min + step * np.arange(points)
         if key == "pdf":
-            ydata = kernel.pdf(xdata)
+            ydata = density[pad : pad + points]
         elif key == "cdf":
-            cdf = np.vectorize(lambda i: kernel.integrate_box_1d(-np.inf, i))
-            ydata = cdf(xdata)
+            cumulative = np.cumsum((density[1:] + density[:-1]) * step / 2)
+            cumulative = np.concatenate([[0], cumulative])
+            ydata = cumulative[pad : pad + points]
         return xdata, ydata
 
 
@@ -924,17 +1416,133 @@ class xvg_show_scatter(Command):
                 specify the location of colorbar: bottom, top, left, right
         --legend_location (optional)
                 specify the location of legends, inside or outside
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
+        -m, --mode (optional)
+                specify 'density' to rasterize scatters into a 2D grid image. Without Z column, the grid shows the counts of points in each cell, otherwise the averaged Z values
+        --max_points (optional)
+                automatically switch to density mode if the number of points larger than it, default to 100000, 0 for never switching
+        -al, --additional_list (optional)
+                specify the number of bins of X and Y for density mode, default to 200. Could be one or two int values
 
     :Usage:
         dit xvg_show_scatter -f Gyrate.xvg -c 1,2
         dit xvg_show_scatter -f Gyrate.xvg -c 1,2 -eg plotly
         dit xvg_show_scatter -f Gyrate.xvg -c 1,2,0 -cmap jet -z Time(ns) -zs 0.001
         dit xvg_show_scatter -f Gyrate.xvg -c 1,2,0 --z_precision 0 --colorbar_location bottom
+        dit xvg_show_scatter -f pca.xvg -c 1,2 -m density -al 300 250 -cmap jet
     """
 
     def __init__(self, parm: Parameters) -> None:
         self.parm = parm
 
+    def calc_density_grid(
+        self, xdata: np.ndarray, ydata: np.ndarray, zdata: np.ndarray, bins: List[int]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """bin scatters into a 2D grid, count points or average Z values in each cell
+
+        Args:
+            xdata (np.ndarray): X values of scatters
+            ydata (np.ndarray): Y values of scatters
+            zdata (np.ndarray): Z values of scatters, None for counting points
+            bins (List[int]): the number of bins along X and Y
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: the centers of X bins, the centers of Y bins, and the grid from bottom to top (NaN for empty cells)
+        """
+        xbin, ybin = bins
+        xmin = self.sel_parm(self.parm.xmin, np.min(xdata))
+        xmax = self.sel_parm(self.parm.xmax, np.max(xdata))
+        ymin = self.sel_parm(self.parm.ymin, np.min(ydata))
+        ymax = self.sel_parm(self.parm.ymax, np.max(ydata))
+        if xmax <= xmin or ymax <= ymin:
+            self.error(
+                f"unable to bin scatters in range x [{xmin}, {xmax}], y [{ymin}, {ymax}]"
+            )
+        xstep, ystep = (xmax - xmin) / xbin, (ymax - ymin) / ybin
+        xindexs = np.floor((xdata - xmin) / xstep).astype(np.int64)
+        yindexs = np.floor((ydata - ymin) / ystep).astype(np.int64)
+        ## the right edges belong to the last bins
+        xindexs[xdata == xmax] = xbin - 1
+        yindexs[ydata == ymax] = ybin - 1
+        mask = (xindexs >= 0) & (xindexs < xbin) & (yindexs >= 0) & (yindexs < ybin)
+        cells = yindexs[mask] * xbin + xindexs[mask]
+        counts = np.bincount(cells, minlength=xbin * ybin).astype(np.float64)
+        if zdata is None:
+            grid = counts
+        else:
+            sums = np.bincount(cells, weights=zdata[mask], minlength=xbin * ybin)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                grid = sums / counts
+        grid[counts == 0] = np.nan
+        xcenters = xmin + (np.arange(xbin) + 0.5) * xstep
+        ycenters = ymin + (np.arange(ybin) + 0.5) * ystep
+        return xcenters, ycenters, grid.reshape(ybin, xbin)
+
+    def draw_density(self, kwargs: dict) -> None:
+        """rasterize scatters of kwargs into a 2D grid and draw it as image"""
+
+        bins = [200, 200]
+        if self.parm.additional_list != None:
+            try:
+                bins = [int(b) for b in self.parm.additional_list[:2]]
+            except ValueError:
+                self.error("the number of bins specified by -al should be int")
+            if len(bins) == 1:
+                bins = bins * 2
+            if min(bins) < 2:
+                self.error("the number of bins for density mode should >= 2")
+        if len(kwargs["data_list"]) > 1:
+            self.warn(
+                "scatters of all files were pooled into one density image, legends were ignored"
+            )
+        xdata = np.concatenate(kwargs["xdata_list"])
+        ydata = np.concatenate(kwargs["data_list"])
+        zdata = None
+        if all(c is not None for c in kwargs["color_list"]):
+            zdata = np.concatenate(kwargs["color_list"])
+        elif any(c is not None for c in kwargs["color_list"]):
+            self.warn("not all files have Z column, density mode would count points")
+        self.info(
+            f"rasterizing {len(xdata)} scatters into {bins[0]}*{bins[1]} grid by density mode"
+        )
+        xcenters, ycenters, grid = self.calc_density_grid(xdata, ydata, zdata, bins)
+
+        zlabel = kwargs["zlabel"] if zdata is not None else "Count"
+        kwargs = {
+            "data_list": grid,
+            "xdata_list": xcenters,
+            "ydata_list": ycenters,
+            "legends": [],
+            "color_list": [],
+            "zmin": kwargs["zmin"],
+            "zmax": kwargs["zmax"],
+            "xlabel": kwargs["xlabel"],
+            "ylabel": kwargs["ylabel"],
+            "zlabel": self.sel_parm(self.parm.zlabel, zlabel),
+            "title": kwargs["title"],
+            "x_precision": self.sel_parm(self.parm.x_precision, 2),
+            "y_precision": self.sel_parm(self.parm.y_precision, 2),
+            "z_precision": kwargs["z_precision"],
+            "alpha": kwargs["alpha"],
+            "legend_location": kwargs["legend_location"],
+            "colorbar_location": kwargs["colorbar_location"],
+            "fig_type": "Continuous",
+            "cmap": kwargs["cmap"],
+        }
+        if self.parm.engine == "matplotlib":
+            kwargs["interpolation"] = None
+            fig = ImshowMatplotlib(**kwargs)
+            fig.final(self.parm.output, self.parm.noshow)
+        elif self.parm.engine == "plotly":
+            fig = PcolormeshPlotly(**kwargs)
+            fig.final(self.parm.output, self.parm.noshow)
+        elif self.parm.engine == "gnuplot":
+            fig = ImshowGnuplot("imshow", **kwargs)
+            fig.final(self.parm.output, self.parm.noshow)
+        else:
+            self.error("wrong selection of plot engine")
+
     def __call__(self):
         # self.info("in xvg_show_scatter")
         # print(self.parm.__dict__)
@@ -961,7 +1569,7 @@ class xvg_show_scatter(Command):
 
         # deal with data
         begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
-        xvgs = [XVG(xvg) for xvg in self.parm.input]
+        xvgs = self.load_xvgs(self.parm.input, self.parm.columns)
         self.file = xvgs[0]
         legends, xdata_list, data_list, color_list = [], [], [], []
         color_head, xlabel, ylabel = None, None, None
@@ -969,25 +1577,26 @@ class xvg_show_scatter(Command):
             xvg = xvgs[id]
             xvg.check_column_index(column_indexs)
             xdata_list.append(
-                [
-                    x * self.parm.xshrink
-                    for x in xvg.data_columns[column_indexs[0]][begin:end:dt]
-                ]
+                np.asarray(
+                    xvg.data_columns[column_indexs[0]][begin:end:dt], dtype=np.float64
+                )
+                * self.parm.xshrink
             )
             xlabel = xvg.data_heads[column_indexs[0]]
             data_list.append(
-                [
-                    y * self.parm.yshrink
-                    for y in xvg.data_columns[column_indexs[1]][begin:end:dt]
-                ]
+                np.asarray(
+                    xvg.data_columns[column_indexs[1]][begin:end:dt], dtype=np.float64
+                )
+                * self.parm.yshrink
             )
             ylabel = xvg.data_heads[column_indexs[1]]
             if len(column_indexs) == 3:
                 color_list.append(
-                    [
-                        z * self.parm.zshrink
-                        for z in xvg.data_columns[column_indexs[2]][begin:end:dt]
-                    ]
+                    np.asarray(
+                        xvg.data_columns[column_indexs[2]][begin:end:dt],
+                        dtype=np.float64,
+                    )
+                    * self.parm.zshrink
                 )
                 color_head = xvg.data_heads[column_indexs[2]]
             else:
@@ -1023,6 +1632,27 @@ class xvg_show_scatter(Command):
             "colorbar_location": self.parm.colorbar_location,
             "legend_location": self.sel_parm(self.parm.legend_location, "inside"),
         }
+
+        density = self.parm.mode == "density"
+        points_num = sum(len(xdata) for xdata in xdata_list)
+        max_points = self.sel_parm(self.parm.max_points, 100000)
+        if not density and max_points > 0 and points_num > max_points:
+            self.info(
+                f"{points_num} scatters exceed max_points {max_points}, switch to density mode"
+            )
+            density = True
+        if density and self.parm.engine == "plotext":
+            self.warn("plotext engine do not support density mode, draw scatters instead")
+            density = False
+        if density:
+            self.draw_density(kwargs)
+            return
+
+        kwargs["xdata_list"] = [xdata.tolist() for xdata in xdata_list]
+        kwargs["data_list"] = [ydata.tolist() for ydata in data_list]
+        kwargs["color_list"] = [
+            c if c is None else c.tolist() for c in color_list
+        ]
         if self.parm.engine == "matplotlib":
             line = ScatterMatplotlib(**kwargs)
             line.final(self.parm.output, self.parm.noshow)
@@ -1088,6 +1718,8 @@ class xvg_show_stack(Command):
                 set the opacity of confidence intervals, default to 1.0
         --legend_location (optional)
                 specify the location of legends, inside or outside
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
 
     :Usage:
         dit xvg_show_stack -f dssp_sc.xvg -c 2-7
@@ -1122,7 +1754,7 @@ class xvg_show_stack(Command):
 
         # deal with data
         begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
-        xvgs = [XVG(xvg) for xvg in self.parm.input]
+        xvgs = self.load_xvgs(self.parm.input, [[0] + c for c in self.parm.columns])
         for id, column_indexs in enumerate(self.parm.columns):
             self.file = xvgs[id]
             column_indexs.reverse()  # First in, show at bottom
@@ -1262,17 +1894,52 @@ class xvg_box_compare(xvg_compare):
                 specify the precision of Z ticklabels
         --colorbar_location (optional)
                 specify the colorbar_location: bottom, up, left, right
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
+        --sketch_size (optional)
+                specify the size of quantile sketch to calculate box and violin statistics in one streaming pass, which keeps memory bounded for huge data. The rank error of quantiles is about 2/sketch_size. Scatters are not available in this way
+        --chunk_rows (optional)
+                specify the number of rows read in each chunk with --sketch_size, default to 100000
 
     :Usage:
         dit xvg_box_compare -f RMSD.xvg -c 1 -cmap jet --alpha 1.0
         dit xvg_box_compare -f RMSD.xvg gyrate.xvg -c 1 1,2,3,4 -m withoutScatter -l RMSD Gyrate Gx Gy Gz
         dit xvg_box_compare -f RMSD.xvg -c 1 -cmap plasma -eg plotly -z Time(ns) --z_precision 0 -zs 0.001
         dit xvg_box_compare -f RMSD.xvg gyrate.xvg -eg gnuplot -c 1 1,2,3,4 -l RMSD Gyrate Gx Gy Gz
+        dit xvg_box_compare -f rep_*.xvg -c 1 --sketch_size 500
     """
 
     def __init__(self, parm: Parameters) -> None:
         self.parm = parm
 
+    def calc_sketches(
+        self, xvgs: List[XVG], begin: int, end: int, dt: int
+    ) -> List[QuantileSketch]:
+        """summarize selected columns of xvg files into quantile sketches, each
+        file is read chunk by chunk in one pass
+
+        Args:
+            xvgs (List[XVG]): the xvg objects
+            begin (int): the begin index
+            end (int): the end index
+            dt (int): the index step
+
+        Returns:
+            List[QuantileSketch]: quantile sketch of each selected column
+        """
+        rows = self.parm.chunk_rows or 100000
+        sketches: List[QuantileSketch] = []
+        for xvg, column_indexs in zip(xvgs, self.parm.columns):
+            file_sketches = [QuantileSketch(self.parm.sketch_size) for _ in column_indexs]
+            for block in xvg.iter_chunks(rows, column_indexs, begin, end, dt):
+                for i, sketch in enumerate(file_sketches):
+                    sketch.update(block[:, i] * self.parm.yshrink)
+            for sketch in file_sketches:
+                if sketch.count == 0:
+                    self.error("wrong selection of begin, end, or dt, no data selected")
+            sketches += file_sketches
+        return sketches
+
     def __call__(self):
         # self.info("in xvg_box")
         # print(self.parm.__dict__)
@@ -1280,13 +1947,28 @@ class xvg_box_compare(xvg_compare):
         self.check_parm()
         ## draw data relative to its original xdata
         begin, end, dt = self.parm.begin, self.parm.end, self.parm.dt
-        xvgs = [XVG(xvg) for xvg in self.parm.input]
+        mode = self.parm.mode
+        sketch_size = self.parm.__dict__.get("sketch_size", None)
+        if sketch_size != None:
+            if mode != "withoutScatter":
+                self.warn(
+                    "scatters need all data and are not available with sketch_size, only violin plot will be shown"
+                )
+                mode = "withoutScatter"
+            xvgs = self.load_xvgs(self.parm.input, load_data=False)
+        else:
+            xvgs = self.load_xvgs(self.parm.input, [[0] + c for c in self.parm.columns])
         self.file = xvgs[0]
         legends, color_list, data_list = [], [], []
         for id, column_indexs in enumerate(self.parm.columns):
             xvg = xvgs[id]
             for column_index in column_indexs:
                 xvg.check_column_index(column_index)
+                zlabel = xvg.data_heads[0]
+                legend = xvg.data_heads[column_index]
+                legends.append(f"{legend} - {xvg.xvgfile}")
+                if sketch_size != None:
+                    continue
                 data_list.append(
                     [
                         y * self.parm.yshrink
@@ -1296,16 +1978,33 @@ class xvg_box_compare(xvg_compare):
                 color_list.append(
                     [x * self.parm.zshrink for x in xvg.data_columns[0][begin:end:dt]]
                 )  # zshrink for third data
-                zlabel = xvg.data_heads[0]
-                legend = xvg.data_heads[column_index]
-                legends.append(f"{legend} - {xvg.xvgfile}")
         self.remove_latex()
         legends = self.remove_latex_msgs(legends)
-        if self.parm.mode != "withoutScatter":
+        if mode != "withoutScatter":
             self.info(
                 "the scatter dots will be colored by the first column data of corresponding file"
             )
 
+        box_stats, violin_stats = None, None
+        if sketch_size != None:
+            sketches = self.calc_sketches(xvgs, begin, end, dt)
+            self.info(
+                f"summarized {sum(s.count for s in sketches)} values of {len(sketches)} columns by quantile sketches"
+            )
+            box_stats = [sketch.box_stats() for sketch in sketches]
+            violin_stats = [sketch.violin_stats() for sketch in sketches]
+            ## representative quantiles for engines drawing from data
+            data_list = [
+                sketch.quantile(np.linspace(0, 1, sketch_size)) for sketch in sketches
+            ]
+            ## per-point placeholders in the shape of color_list of the scatter
+            ## path (the quantile of each point), scatters are not drawn in sketch mode
+            color_list = [np.linspace(0, 1, sketch_size).tolist() for _ in sketches]
+            if self.parm.engine == "gnuplot":
+                self.info(
+                    f"gnuplot draws violins from {sketch_size} representative quantiles of each column"
+                )
+
         kwargs = {
             "data_list": data_list,
             "color_list": color_list,
@@ -1324,9 +2023,11 @@ class xvg_box_compare(xvg_compare):
             "y_precision": self.parm.y_precision,
             "z_precision": self.parm.z_precision,
             "alpha": self.sel_parm(self.parm.alpha, 0.4),
-            "mode": self.parm.mode,
+            "mode": mode,
             "cmap": self.sel_parm(self.parm.colormap, None),
             "colorbar_location": self.parm.colorbar_location,
+            "box_stats": box_stats,
+            "violin_stats": violin_stats,
         }
         if self.parm.engine == "matplotlib":
             line = BoxMatplotlib(**kwargs)
@@ -1391,6 +2092,8 @@ class xvg_ave_bar(Command):
                 specify the precision of Y ticklabels
         --legend_location (optional)
                 specify the location of legends, inside or outside
+        -j, --jobs (optional)
+                specify the number of processes for parsing input files, default to 1
 
     :Usage:
         dit xvg_ave_bar -f 0_0.xvg,0_1.xvg,0_2.xvg 1_0.xvg,1_1.xvg,1_2.xvg -c 1,2 -l MD_0 MD_1 -al data_1 data_2 -csv ave_bar.csv
@@ -1433,11 +2136,16 @@ class xvg_ave_bar(Command):
         all_out = "\n" + ">" * 26 + "  detailed data  " + "<" * 26 + "\n"
         all_out += "XVGFILE                 , LEGEND                  ,   AVERAGE   ,   STD.ERR\n"
         xtitles, legends = ["" for _ in self.parm.columns], []
+        all_xvgfiles = [xvgfile for xvgfiles in self.parm.input for xvgfile in xvgfiles]
+        all_xvgs = self.load_xvgs(
+            all_xvgfiles, [self.parm.columns for _ in all_xvgfiles]
+        )
+        xvg_iter = iter(all_xvgs)
         for xvgfiles in self.parm.input:
             legends.append(xvgfiles[0])
             column_averages_matrix = [[] for _ in self.parm.columns]
             for xvgfile in xvgfiles:
-                xvg = XVG(xvgfile)
+                xvg = next(xvg_iter)
                 xvg.check_column_index(self.parm.columns)
                 for i, c in enumerate(self.parm.columns):
                     head, ave, std = xvg.calc_ave(begin, end, dt, c)
@@ -1599,89 +2307,67 @@ class xvg_rama(Command):
         ## reference : pyrama
         rama_preferences = {
             "General": {
-                "file": os.path.join(
-                    "../", "data", "ramachandran", "pref_general.data"
-                ),
+                "file": os.path.join("../", "data", "ramachandran", "pref_general"),
                 "cmap": ["#FFFFFF", "#B3E8FF", "#7FD9FF"],
                 "bounds": [0, 0.0005, 0.02, 1],
             },
             "GLY": {
-                "file": os.path.join(
-                    "../", "data", "ramachandran", "pref_glycine.data"
-                ),
+                "file": os.path.join("../", "data", "ramachandran", "pref_glycine"),
                 "cmap": ["#FFFFFF", "#FFE8C5", "#FFCC7F"],
                 "bounds": [0, 0.002, 0.02, 1],
             },
             "PRO": {
-                "file": os.path.join(
-                    "../", "data", "ramachandran", "pref_proline.data"
-                ),
+                "file": os.path.join("../", "data", "ramachandran", "pref_proline"),
                 "cmap": ["#FFFFFF", "#D0FFC5", "#7FFF8C"],
                 "bounds": [0, 0.002, 0.02, 1],
             },
             "Pre-PRO": {
-                "file": os.path.join(
-                    "../", "data", "ramachandran", "pref_preproline.data"
-                ),
+                "file": os.path.join("../", "data", "ramachandran", "pref_preproline"),
                 "cmap": ["#FFFFFF", "#B3E8FF", "#7FD9FF"],
                 "bounds": [0, 0.002, 0.02, 1],
             },
         }
 
         rama_pref_values = {}
+        data_file_path = os.path.realpath(
+            os.path.join(os.getcwd(), os.path.dirname(__file__))
+        )
         for key, val in rama_preferences.items():
-            data_file_path = os.path.realpath(
-                os.path.join(os.getcwd(), os.path.dirname(__file__))
-            )
-            rama_pref_values[key] = [[0 for _ in range(361)] for _ in range(361)]
-            with open(os.path.join(data_file_path, val["file"]), "r") as fn:
-                for line in fn:
-                    if line.startswith("#"):
-                        continue
-                    else:
-                        phi = int(float(line.split()[0]))
-                        psi = int(float(line.split()[1]))
-                        ## plt.imshow show transpose of img
-                        rama_pref_values[key][psi + 180][phi + 180] = float(
-                            line.split()[2]
-                        )
-                        rama_pref_values[key][psi + 179][phi + 180] = float(
-                            line.split()[2]
-                        )
-                        rama_pref_values[key][psi + 180][phi + 179] = float(
-                            line.split()[2]
-                        )
-                        rama_pref_values[key][psi + 179][phi + 179] = float(
-                            line.split()[2]
-                        )
-
+            grid = self.load_rama_pref(os.path.join(data_file_path, val["file"]))
+            ## each 2 degree bin covers 2x2 cells, plt.imshow show transpose of img
+            rama_pref_values[key] = np.zeros((361, 361))
+            rama_pref_values[key][:360, :360] = np.repeat(np.repeat(grid, 2, 0), 2, 1)
+
+        ## classify dihedrals by residue types of rows
+        phis = np.asarray(xvg.data_columns[0], dtype=np.float64)
+        psis = np.asarray(xvg.data_columns[1], dtype=np.float64)
+        residues = np.asarray(xvg.data_columns[2], dtype=str)
+        is_pro = np.char.find(residues, "PRO") >= 0
+        is_gly = np.char.find(residues, "GLY") >= 0
+        is_pre_pro = np.append(is_pro[1:], False)
+        AA_types = np.where(
+            is_pre_pro,
+            "Pre-PRO",
+            np.where(is_pro, "PRO", np.where(is_gly, "GLY", "General")),
+        )
+        phi_indexs = np.trunc(phis).astype(np.int64) + 180
+        psi_indexs = np.trunc(psis).astype(np.int64) + 180
         normals, outliers = {}, {}
         for key in rama_preferences.keys():
-            normals[key] = {"phi": [], "psi": [], "res": []}
-            outliers[key] = {"phi": [], "psi": [], "res": []}
-        for row in range(xvg.row_num):
-            if row < xvg.row_num - 1 and "PRO" in xvg.data_columns[2][row + 1]:
-                AA_type = "Pre-PRO"
-            elif "PRO" in xvg.data_columns[2][row]:
-                AA_type = "PRO"
-            elif "GLY" in xvg.data_columns[2][row]:
-                AA_type = "GLY"
-            else:
-                AA_type = "General"
-            phi = xvg.data_columns[0][row]
-            psi = xvg.data_columns[1][row]
-            res = xvg.data_columns[2][row]
-            if (
-                rama_pref_values[AA_type][int(psi) + 180][int(phi) + 180]
-                < rama_preferences[AA_type]["bounds"][1]
-            ):
-                outliers[AA_type]["phi"].append(phi)
-                outliers[AA_type]["psi"].append(psi)
-                outliers[AA_type]["res"].append(f"row index {row} : {res}")
-            else:
-                normals[AA_type]["phi"].append(phi)
-                normals[AA_type]["psi"].append(psi)
-                normals[AA_type]["res"].append(f"row index {row} : {res}")
+            rows = np.flatnonzero(AA_types == key)
+            prefs = rama_pref_values[key][psi_indexs[rows], phi_indexs[rows]]
+            is_outlier = prefs < rama_preferences[key]["bounds"][1]
+            for results, sel in [(outliers, is_outlier), (normals, ~is_outlier)]:
+                sel_rows = rows[sel]
+                results[key] = {
+                    "phi": phis[sel_rows].tolist(),
+                    "psi": psis[sel_rows].tolist(),
+                    "res": [],
+                }
+                if self.parm.engine == "plotly":  # hovertext
+                    results[key]["res"] = [
+                        f"row index {row} : {residues[row]}" for row in sel_rows
+                    ]
 
         ## print some infos
         print(
@@ -1724,3 +2410,23 @@ class xvg_rama(Command):
             self.error(
                 "Ramachandran plot only supported by matplotlib and plotly engine"
             )
+
+    def load_rama_pref(self, pref_file: str) -> np.ndarray:
+        """load the Ramachandran preference grid of 2 degree bins from the packed
+        binary array `pref_file.npy` by memory mapping. The text table
+        `pref_file.data` is parsed if the binary array is unavailable.
+
+        Args:
+            pref_file (str): the preference file path without suffix
+
+        Returns:
+            np.ndarray: preference values in shape (psi bins, phi bins) of (180, 180)
+        """
+        if os.path.exists(pref_file + ".npy"):
+            return np.load(pref_file + ".npy", mmap_mode="r")
+        table = np.loadtxt(pref_file + ".data", comments="#")
+        grid = np.zeros((180, 180))
+        phi_bins = ((table[:, 0] + 179) // 2).astype(np.int64)
+        psi_bins = ((table[:, 1] + 179) // 2).astype(np.int64)
+        grid[psi_bins, phi_bins] = table[:, 2]
+        return grid
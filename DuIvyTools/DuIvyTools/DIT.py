@@ -40,6 +40,7 @@ class DIT(log):
             "xpm2dat",
             "xpm_diff",
             "xpm_merge",
+            "xpm_calc",
             "mdp_gen",
             "show_style",
             "find_center",
@@ -68,6 +69,7 @@ XPM:
     xpm2dat               : convert xpm data into dat file in form (N*N)
     xpm_diff              : calculate the difference of xpms
     xpm_merge             : merge two xpm by half and half
+    xpm_calc              : calculate sum, mean, std or diff of sets of xpms
 Others:
     mdp_gen               : generate mdp file templates
     show_style            : show figure control style files
@@ -129,6 +131,10 @@ Have a good day !
                 f"{parm.cmd} is not available. DIT supports commands as below: \n"
                 + self.cmds_infos
             )
+        if parm.cache_dir != None:
+            os.environ["DIT_CACHE_DIR"] = parm.cache_dir
+        if parm.cache_size != None:
+            os.environ["DIT_CACHE_SIZE"] = str(parm.cache_size)
         cmd = self.classes.get(parm.cmd, None)
         cmd = cmd(parm)
         cmd()
@@ -11,7 +11,7 @@ base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from utils import log
+from utils import log, open_file, strip_compression_suffix
 
 
 class Atom(object):
@@ -57,11 +57,11 @@ class GRO(log):
         if not new_file and grofile:
             if not os.path.exists(grofile):
                 self.error(f"No {grofile} detected ! check it !")
-            if grofile[-4:] != ".gro":
+            if strip_compression_suffix(grofile)[-4:] != ".gro":
                 self.error(
                     f"you must specify a file with suffix .gro, instead of {grofile}"
                 )
-            with open(grofile, "r") as fo:
+            with open_file(grofile, "r") as fo:
                 lines = fo.readlines()
             try:
                 self.atom_number = int(lines[1].strip())
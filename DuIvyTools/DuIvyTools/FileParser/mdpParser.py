@@ -12,7 +12,7 @@ base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from utils import log
+from utils import log, open_file, strip_compression_suffix
 
 
 class MDP(log):
@@ -29,11 +29,11 @@ class MDP(log):
                 self.mdpfile = mdpfile
                 if not os.path.exists(mdpfile):
                     self.error(f"No {mdpfile} detected ! check it !")
-                if mdpfile[-4:] != ".mdp":
+                if strip_compression_suffix(mdpfile)[-4:] != ".mdp":
                     self.error(
                         f"you must specify a file with suffix .mdp instead of {mdpfile}"
                     )
-                with open(mdpfile, "r") as fo:
+                with open_file(mdpfile, "r") as fo:
                     content = fo.read()
             else:
                 content = mdpfile
@@ -13,7 +13,7 @@ base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from utils import log
+from utils import log, open_file, strip_compression_suffix
 
 
 class NDX(log):
@@ -28,11 +28,11 @@ class NDX(log):
         if not new_file and ndxfile:
             if not os.path.exists(ndxfile):
                 self.error(f"No {ndxfile} detected! check it!")
-            if ndxfile[-4:] != ".ndx":
+            if strip_compression_suffix(ndxfile)[-4:] != ".ndx":
                 self.error(
                     f"you must specify a file with suffix .ndx, instead of {ndxfile}"
                 )
-            with open(ndxfile, "r") as fo:
+            with open_file(ndxfile, "r") as fo:
                 lines = [line.strip() for line in fo.readlines()]
             for id, line in enumerate(lines):
                 if line.strip() == "":
@@ -143,7 +143,7 @@ class NDX(log):
 
     def save(self, outfile) -> None:
         """dump NDX class into index file"""
-        with open(outfile, "w") as fo:
+        with open_file(outfile, "w") as fo:
             fo.write(str(self))
 
     def __str__(self) -> str:
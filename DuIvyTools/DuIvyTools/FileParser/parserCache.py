@@ -0,0 +1,162 @@
+"""
+parserCache module is part of DuIvyTools for caching the parsed results of xvg and xpm files.
+
+The cache is opt-in: set the environment variable DIT_CACHE_DIR (or the `--cache_dir`
+parameter) to a directory, and DIT_CACHE_SIZE (or `--cache_size`) to the size limit in MB.
+
+Written by DuIvy and provided to you by GPLv3 license.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
+if base not in sys.path:
+    sys.path.insert(0, base)
+
+from utils import log
+
+CACHE_VERSION = 1
+
+
+class ParserCache(log):
+    """ParserCache class stores the parsed arrays and header metadata of files
+    into a cache directory, one sub-directory per (file, parse tag) entry with
+    a `meta.json` and several `.npy` files. Entries are validated by the size,
+    mtime and content hash of the source file, and evicted in LRU order once
+    the cache directory exceeds the size limit."""
+
+    def __init__(
+        self, cache_dir: Union[str, None] = None, size_limit: Union[float, None] = None
+    ) -> None:
+        if cache_dir == None:
+            cache_dir = os.environ.get("DIT_CACHE_DIR", "")
+        if size_limit == None:
+            size_limit = float(os.environ.get("DIT_CACHE_SIZE", 1024))
+        self.cache_dir: str = cache_dir
+        self.size_limit: int = int(size_limit * 1024 * 1024)  # in bytes
+        self.enabled: bool = cache_dir != ""
+
+    def entry_dir(self, filename: str, tag: str) -> str:
+        """get the cache entry directory of a file parsed with tag"""
+        key = f"{os.path.abspath(filename)}|{tag}|{CACHE_VERSION}"
+        name = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, name)
+
+    def content_hash(self, filename: str) -> str:
+        """calculate the hash of file content"""
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(filename, "rb") as fo:
+            for block in iter(lambda: fo.read(1 << 20), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def load(
+        self, filename: str, tag: str
+    ) -> Union[Tuple[Dict, Dict[str, np.ndarray]], None]:
+        """load the cached metadata and memory-mapped arrays of a file
+
+        Args:
+            filename (str): the source file name
+            tag (str): the tag of parse options, like parser and dtype
+
+        Returns:
+            Union[Tuple[Dict, Dict[str, np.ndarray]], None]: metadata and arrays, None for cache miss
+        """
+        if not self.enabled:
+            return None
+        entry = self.entry_dir(filename, tag)
+        meta_file = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_file, "r") as fo:
+                cache = json.load(fo)
+            stat = os.stat(filename)
+            if cache["size"] != stat.st_size:
+                raise ValueError("stale cache")
+            if cache["mtime"] != stat.st_mtime_ns:
+                ## the file was touched, only content changes invalidate the entry
+                if cache["hash"] != self.content_hash(filename):
+                    raise ValueError("stale cache")
+                cache["mtime"] = stat.st_mtime_ns
+                self.write_meta(entry, cache)
+            arrays = {
+                name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="c")
+                for name in cache["arrays"]
+            }
+            os.utime(meta_file)  # mark entry as recently used
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        self.info(f"loading {filename} from cache {entry}")
+        return cache["meta"], arrays
+
+    def store(
+        self, filename: str, tag: str, meta: Dict, arrays: Dict[str, np.ndarray]
+    ) -> None:
+        """store the metadata and arrays of a parsed file into cache
+
+        Args:
+            filename (str): the source file name
+            tag (str): the tag of parse options, like parser and dtype
+            meta (Dict): json serializable metadata
+            arrays (Dict[str, np.ndarray]): arrays to store as .npy files
+        """
+        if not self.enabled:
+            return
+        entry = self.entry_dir(filename, tag)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            stat = os.stat(filename)
+            cache = {
+                "file": os.path.abspath(filename),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": self.content_hash(filename),
+                "arrays": list(arrays.keys()),
+                "meta": meta,
+            }
+            ## write into a temporary directory, then rename for atomicity
+            tmp_entry = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_entry, f"{name}.npy"), array)
+            self.write_meta(tmp_entry, cache)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp_entry, entry)
+        except (OSError, TypeError, ValueError) as ex:
+            self.warn(f"failed to cache {filename} into {self.cache_dir}: {ex}")
+            return
+        self.evict()
+
+    def write_meta(self, entry: str, cache: Dict) -> None:
+        """write the meta.json of a cache entry"""
+        with open(os.path.join(entry, "meta.json"), "w") as fo:
+            json.dump(cache, fo)
+
+    def evict(self) -> None:
+        """remove the least recently used entries until the total size of cache
+        directory is not larger than size_limit"""
+        entries, total = [], 0
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            meta_file = os.path.join(entry, "meta.json")
+            if name.startswith(".") or not os.path.isfile(meta_file):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)
+            )
+            entries.append((os.path.getmtime(meta_file), size, entry))
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= self.size_limit:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -11,7 +11,7 @@ base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from utils import log
+from utils import log, open_file
 
 
 class Atom(object):
@@ -52,7 +52,7 @@ class PDB(log):
 
         if not os.path.exists(pdbfile):
             self.error(f"No {pdbfile} detected ! check it !")
-        with open(pdbfile, "r") as fo:
+        with open_file(pdbfile, "r") as fo:
             lines = [l.strip() for l in fo.readlines()]
         atom_list: list[Atom] = []
         for line in lines:
@@ -7,14 +7,17 @@ Written by DuIvy and provided to you by GPLv3 license.
 import os
 import sys
 import string
-from itertools import chain
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple, Union
+
+import numpy as np
 
 base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from utils import log
+from FileParser.parserCache import ParserCache
+from utils import log, detect_compression, open_file, strip_compression_suffix
 
 
 class XPM(log):
@@ -37,9 +40,9 @@ class XPM(log):
         self.notes: list[str] = []
         self.xaxis: list[float] = []
         self.yaxis: list[float] = []
-        self.datalines: list[str] = []
-        self.dot_matrix: list[list[str]] = []
-        self.value_matrix: list[list[float]] = []
+        self._datalines: Union[list[str], np.ndarray] = []  # decoded lazily
+        self._dot_matrix: Union[list[list[str]], None] = None  # built lazily
+        self.value_matrix: Union[np.ndarray, list[list[float]]] = []
 
         if new_file:
             self.xpmfile = xpmfile
@@ -48,19 +51,94 @@ class XPM(log):
                 self.xpmfile: str = xpmfile
                 if not os.path.exists(xpmfile):
                     self.error(f"No {xpmfile} detected ! check it !")
-                if xpmfile[-4:] != ".xpm":
+                if strip_compression_suffix(xpmfile)[-4:] != ".xpm":
                     self.error(
                         f"you must specify a file with suffix .xpm, instead of {xpmfile}"
                     )
-                with open(xpmfile, "r") as fo:
-                    content = fo.read()
+                cache = ParserCache()
+                cached = cache.load(xpmfile, "xpm-v2")
+                if cached != None:
+                    self.load_cache(*cached)
+                else:
+                    with open_file(xpmfile, "r") as fo:
+                        content = fo.read()
+                    lines = [l.strip() for l in content.strip().split("\n")]
+                    self.parse_xpm(lines)
+                    if cache.enabled:
+                        cache.store(xpmfile, "xpm-v2", *self.dump_cache())
             else:
-                content = xpmfile
-            lines = [l.strip() for l in content.strip().split("\n")]
-            self.parse_xpm(lines)
+                lines = [l.strip() for l in xpmfile.strip().split("\n")]
+                self.parse_xpm(lines)
             if is_file:
                 self.info(f"parsing data from {xpmfile} successfully !")
 
+    @property
+    def datalines(self) -> List[str]:
+        """the rows of pixel chars, decoded from the cached bytes array on the first access"""
+        if isinstance(self._datalines, np.ndarray):
+            self._datalines = [
+                line.decode("latin-1") for line in self._datalines.tolist()
+            ]
+        return self._datalines
+
+    @datalines.setter
+    def datalines(self, datalines: List[str]) -> None:
+        self._datalines = datalines
+
+    @property
+    def dot_matrix(self) -> List[List[str]]:
+        """the chars of each pixel, split from datalines on the first access"""
+        if self._dot_matrix is None:
+            cpp = self.char_per_pixel
+            self._dot_matrix = [
+                [line[i : i + cpp] for i in range(0, self.width * cpp, cpp)]
+                for line in self.datalines
+            ]
+        return self._dot_matrix
+
+    @dot_matrix.setter
+    def dot_matrix(self, dot_matrix: List[List[str]]) -> None:
+        self._dot_matrix = dot_matrix
+
+    def decode_datalines(self) -> np.ndarray:
+        """decode datalines into the indexs of chars. Each dataline is viewed as a
+        fixed-width byte array, and pixels are mapped to indexs through a lookup
+        table (for char_per_pixel <= 2) or by binary search over sorted chars.
+
+        Returns:
+            np.ndarray: the indexs of chars in shape (height, width)
+        """
+        cpp = self.char_per_pixel
+        try:
+            content = "".join(self.datalines).encode("latin-1")
+            chars = [c.encode("latin-1") for c in self.chars]
+        except UnicodeEncodeError:
+            self.error("unable to decode non-ASCII chars of pixels in xpm")
+        if cpp <= 2:
+            dtype = (np.uint8, np.dtype("<u2"))[cpp - 1]
+            pixels = np.frombuffer(content, dtype=dtype)
+            table = np.frombuffer(b"".join(chars), dtype=dtype)
+            lut = np.full(1 << (8 * cpp), -1, dtype=np.int64)
+            ## the first one wins for duplicate chars, as list.index does
+            lut[table[::-1]] = np.arange(len(table))[::-1]
+            indexs = lut[pixels]
+            unknown = indexs < 0
+        else:
+            pixels = np.frombuffer(content, dtype=f"S{cpp}")
+            table = np.array(chars, dtype=f"S{cpp}")
+            order = np.argsort(table, kind="stable")
+            sorted_table = table[order]
+            positions = np.searchsorted(sorted_table, pixels)
+            positions[positions == len(table)] = 0
+            indexs = order[positions]
+            unknown = sorted_table[positions] != pixels
+        if np.any(unknown):
+            pixel = pixels[np.argmax(unknown)]
+            if cpp <= 2:
+                pixel = pixel.tobytes()
+            self.error(f"unknown char {pixel.decode('latin-1')!r} detected in xpm data")
+        return indexs.reshape(self.height, self.width)
+
     def parse_xpm(self, lines: List[str]) -> None:
         """convert xpm content (lines) into XPM class
 
@@ -166,110 +244,244 @@ class XPM(log):
 
         self.yaxis.reverse()  # IMPORTANT! from high to low now
 
-        for dataline in self.datalines:
-            dot_list: List[str] = []
-            value_list: List[float] = []
-            for i in range(0, self.width * self.char_per_pixel, self.char_per_pixel):
-                dot = dataline[i : i + self.char_per_pixel]
-                dot_list.append(dot)
-                if self.type == "Continuous":
-                    value = self.notes[self.chars.index(dot)]
-                else:
-                    # for Discrete, value store the index of chars|notes|colors
-                    value = self.chars.index(dot)
-                value_list.append(value)
-            self.dot_matrix.append(dot_list)
-            self.value_matrix.append(value_list)
-
-        if (
-            len(self.dot_matrix) != self.height
-            or len(self.value_matrix) != self.height
-            or len(self.dot_matrix[0]) != self.width
-            or len(self.value_matrix[0]) != self.width
-        ):
+        indexs = self.decode_datalines()
+        if self.type == "Continuous":
+            self.value_matrix = np.array(self.notes, dtype=np.float64)[indexs]
+        else:
+            # for Discrete, value store the index of chars|notes|colors
+            self.value_matrix = indexs
+        self._dot_matrix = None
+
+        if self.value_matrix.shape != (self.height, self.width):
             self.error("Dimension error while parsing xpm file")
 
-    def __sub__(self, xpm):  # diff_map
-        """values of self - values of xpm correspondingly, return a new result XPM"""
+    def dump_cache(self) -> Tuple[dict, dict]:
+        """dump the parsed header and data of XPM for ParserCache
+
+        Returns:
+            Tuple[dict, dict]: metadata and arrays
+        """
+        meta = {
+            key: value
+            for key, value in self.__dict__.items()
+            if key not in ["xpmfile", "_datalines", "_dot_matrix", "value_matrix"]
+        }
+        ## datalines are as large as the file, keep them out of the json metadata
+        datalines = np.array(
+            [line.encode("latin-1") for line in self.datalines], dtype=np.bytes_
+        )
+        return meta, {
+            "value_matrix": np.asarray(self.value_matrix),
+            "datalines": datalines,
+        }
+
+    def load_cache(self, meta: dict, arrays: dict) -> None:
+        """load the header and data of XPM from ParserCache
+
+        Args:
+            meta (dict): metadata dumped by dump_cache
+            arrays (dict): memory-mapped arrays dumped by dump_cache
+        """
+        self.__dict__.update(meta)
+        ## copy-on-write memory maps, writing would not change the cache
+        self.value_matrix = arrays["value_matrix"]
+        self._datalines = arrays["datalines"]
+        self._dot_matrix = None
+
+    def check_compatible(self, xpm, action: str = "calculate") -> None:
+        """check whether xpm could be used with self in arithmetic
+
+        Args:
+            xpm (XPM): the other xpm
+            action (str, optional): the name of arithmetic for messages. Defaults to "calculate".
+        """
         if self.type != "Continuous" or xpm.type != "Continuous":
-            self.error("Only supported to apply xpm_diff to Continuous type of xpms")
+            self.error(f"Only supported to {action} Continuous type of xpms")
         for key in ["title", "xlabel", "ylabel", "xaxis", "yaxis"]:
             if self.__dict__[key] != xpm.__dict__[key]:
                 self.warn(
-                    f"Detected different {key} in {self.xpmfile} and {xpm.xpmfile}. \nDIT strongly warns you that different type (meanings) of xpms should NOT be used to calculate difference. The results would NOT be reliable !!! "
+                    f"Detected different {key} in {self.xpmfile} and {xpm.xpmfile}. \nDIT strongly warns you that different type (meanings) of xpms should NOT be used to {action}. The results would NOT be reliable !!! "
                 )
         if self.width != xpm.width or self.height != xpm.height:
             self.error(
-                f"The shape of {self.xpmfile} ({self.width}, {self.height}) and {xpm.xpmfile} ({xpm.width}, {xpm.height}) are different, unable to calculate difference."
+                f"The shape of {self.xpmfile} ({self.width}, {self.height}) and {xpm.xpmfile} ({xpm.width}, {xpm.height}) are different, unable to {action}."
             )
 
+    def new_by_values(self, values: np.ndarray):
+        """return a new Continuous XPM with the header of self and values, which
+        are rounded to 6 decimals to bound the number of distinct values"""
         out = XPM("", is_file=False, new_file=True)
         for key, value in self.__dict__.items():
             out.__dict__[key] = value
-        for h in range(self.height):
-            for w in range(self.width):
-                value = self.value_matrix[h][w] - xpm.value_matrix[h][w]
-                value = float(f"{value:.6f}")
-                out.value_matrix[h][w] = value
+        out.value_matrix = np.round(np.asarray(values, dtype=np.float64), 6) + 0.0
         out.refresh_by_value_matrix()
         return out
 
-    def refresh_by_value_matrix(self, is_Continuous: bool = True) -> None:
-        """generate the xpm class content by value_matrix
+    def __add__(self, xpm):
+        """values of self + values of xpm correspondingly, return a new result XPM"""
+        self.check_compatible(xpm, "calculate sum")
+        return self.new_by_values(
+            np.asarray(self.value_matrix) + np.asarray(xpm.value_matrix)
+        )
+
+    def __sub__(self, xpm):  # diff_map
+        """values of self - values of xpm correspondingly, return a new result XPM"""
+        self.check_compatible(xpm, "calculate difference")
+        return self.new_by_values(
+            np.asarray(self.value_matrix) - np.asarray(xpm.value_matrix)
+        )
+
+    def __mul__(self, factor: float):
+        """values of self * factor, return a new result XPM"""
+        if self.type != "Continuous":
+            self.error("Only supported to scale Continuous type of xpms")
+        return self.new_by_values(np.asarray(self.value_matrix) * factor)
+
+    __rmul__ = __mul__
+
+    def mask(self, threshold: float, fill: float = 0.0):
+        """replace values whose absolute values are less than threshold by fill,
+        like hiding the weak correlations of DCCM. Return a new result XPM
+
+        Args:
+            threshold (float): the threshold of absolute values
+            fill (float, optional): the value to replace masked values. Defaults to 0.0.
+        """
+        if self.type != "Continuous":
+            self.error("Only supported to mask Continuous type of xpms")
+        values = np.asarray(self.value_matrix)
+        return self.new_by_values(np.where(np.abs(values) < threshold, fill, values))
+
+    @staticmethod
+    def calc_stats(xpms, method: str = "mean"):
+        """calculate the sum, mean, or std (ddof=1) of values of xpms pixel by pixel
+        in one pass. Values are accumulated by Welford's algorithm, so xpms could be
+        a generator to parse and drop xpm one by one for bounded memory.
+
+        Args:
+            xpms (Iterable[XPM]): xpms of the same shape
+            method (str, optional): sum, mean, or std. Defaults to "mean".
+
+        Returns:
+            XPM: the result XPM with the header of the first xpm
+        """
+        if method not in ["sum", "mean", "std"]:
+            log().error(f"unknown method {method} to calculate statistics of xpms")
+        count, first = 0, None
+        for xpm in xpms:
+            if first == None:
+                first = xpm
+                if xpm.type != "Continuous":
+                    xpm.error("Only supported to calculate Continuous type of xpms")
+                mean = np.zeros((xpm.height, xpm.width), dtype=np.float64)
+                m2 = np.zeros((xpm.height, xpm.width), dtype=np.float64)
+            else:
+                first.check_compatible(xpm, "calculate statistics")
+            count += 1
+            values = np.asarray(xpm.value_matrix, dtype=np.float64)
+            delta = values - mean
+            mean += delta / count
+            m2 += delta * (values - mean)
+        if first == None:
+            log().error("no xpm to calculate statistics")
+        if method == "sum":
+            return first.new_by_values(mean * count)
+        elif method == "mean":
+            return first.new_by_values(mean)
+        if count < 2:
+            first.warn("std of only one xpm is set to 0")
+            return first.new_by_values(np.zeros_like(m2))
+        return first.new_by_values(np.sqrt(m2 / (count - 1)))
+
+    def quantize_value_matrix(
+        self, value_matrix: np.ndarray, nlevels: int, method: str = "linear"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """quantize values into levels, like the `-nlevels` of gmx
+
+        Args:
+            value_matrix (np.ndarray): values to quantize
+            nlevels (int): the number of levels
+            method (str, optional): the spacing of levels, `linear` for equal width levels from min to max, `symmetric` for equal width levels symmetric around zero, `quantile` for levels with equal number of pixels. Defaults to "linear".
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the center value of each level, and the level index of each pixel
+        """
+        values = value_matrix.astype(np.float64)
+        min, max = np.min(values), np.max(values)
+        if method == "linear":
+            edges = np.linspace(min, max, nlevels + 1)
+        elif method == "symmetric":
+            bound = np.max(np.abs([min, max]))
+            edges = np.linspace(-bound, bound, nlevels + 1)
+        elif method == "quantile":
+            edges = np.unique(np.quantile(values, np.linspace(0, 1, nlevels + 1)))
+        else:
+            self.error(f"unknown method {method} to quantize values into levels")
+        if min == max or len(edges) < 2:
+            return np.array([min]), np.zeros(values.shape, dtype=np.int64)
+        codes = np.digitize(values, edges[1:-1])
+        ## keep full precision, narrow ranges of large values would collapse
+        ## into duplicate levels by rounding
+        return (edges[:-1] + edges[1:]) / 2.0, codes
+
+    def refresh_by_value_matrix(
+        self,
+        is_Continuous: bool = True,
+        nlevels: Union[int, None] = None,
+        level_method: str = "linear",
+    ) -> None:
+        """generate the xpm class content by value_matrix. Distinct values are
+        encoded by np.unique, and datalines are built by indexing the table of
+        chars with the codes of pixels. The char_per_pixel grows with the number
+        of distinct values, 1 char represents 80 values. For Continuous xpm,
+        values could be quantized into nlevels levels to bound the size of
+        colors and chars, the value_matrix would be replaced by level values.
 
         Args:
             is_Continuous (bool, optional): set the type of xpm. Defaults to True.
+            nlevels (Union[int, None], optional): the number of levels to quantize values. Defaults to None for no quantization.
+            level_method (str, optional): the spacing of levels: linear, symmetric, quantile. Defaults to "linear".
         """
-        out_value_list = sorted(list(set(chain(*self.value_matrix))))
-        self.notes = out_value_list
-        colors, l = [], len(out_value_list)
-        for i in range(l):
-            c = 16000000 // len(out_value_list) * i
-            colors.append(f'#{hex(c)[-6:].replace("x", "0").upper():0>6}')
+        value_matrix = np.asarray(self.value_matrix)
+        if value_matrix.size == 0:
+            self.error("no data detected in xpm.value_matrix")
+        if value_matrix.shape != (self.height, self.width):
+            self.error(
+                f"shape of xpm.value_matrix {value_matrix.shape} is not equal to xpm height and width ({self.height}, {self.width})"
+            )
+        if is_Continuous and nlevels != None:
+            out_values, codes = self.quantize_value_matrix(
+                value_matrix, nlevels, level_method
+            )
+            self.value_matrix = out_values[codes]
+        else:
+            out_values, codes = np.unique(value_matrix, return_inverse=True)
+        codes = codes.reshape(self.height, self.width)
+        self.notes = out_values.tolist()
+        l = len(self.notes)
+        self.colors = [f"#{16000000 // l * i:06X}" for i in range(l)]
         self.color_num = l
-        self.colors = colors
 
         letters = string.ascii_letters + "0123456789!@#$%^&*()-_=+{}|;"
-        if l <= 0:
-            self.error("no data detected in xpm.value_matrix")
-        elif l > 0 and l <= len(letters):
-            self.char_per_pixel = 1
-            self.chars = [f"{x}" for x in letters][:l]
-        elif l > len(letters) and l <= len(letters) * len(letters):
-            self.char_per_pixel = 2
-            self.chars = [f"{x}{y}" for x in letters for y in letters][:l]
-        elif l > len(letters) * len(letters) and l <= len(letters) * len(letters) * len(
-            letters
-        ):
+        cpp = 1
+        while len(letters) ** cpp < l:
+            cpp += 1
+        if cpp >= 3:
             self.warn(
-                f"so many values ({l}) in xpm.value_matrix, may resulting in large xpm file"
+                f"so many values ({l}) in xpm.value_matrix, may resulting in large xpm file. Try to quantize values by --nlevels"
             )
-            self.char_per_pixel = 3
-            self.chars = [
-                f"{x}{y}{z}" for x in letters for y in letters for z in letters
-            ][:l]
-        else:
-            self.error(
-                f"too many values ({l}) in xpm.value_matrix, only able to construct XPM with {len(letters)*len(letters)*len(letters)} values or less"
-            )
-
-        if len(self.dot_matrix) == 0 or len(self.datalines) == 0:
-            for h in range(self.height):
-                self.dot_matrix.append(["" for _ in range(self.width)])
-                self.datalines.append("")
-        for h in range(self.height):
-            dot_line: str = ""
-            for w in range(self.width):
-                dot = self.chars[out_value_list.index(self.value_matrix[h][w])]
-                self.dot_matrix[h][w] = dot
-                dot_line += dot
-            self.datalines[h] = dot_line
+        self.char_per_pixel = cpp
+        ## chars of codes are the big-endian digits in base of len(letters)
+        powers = len(letters) ** np.arange(cpp - 1, -1, -1)
+        digits = (np.arange(l)[:, None] // powers) % len(letters)
+        table = np.frombuffer(letters.encode(), dtype=np.uint8)[digits]
+        self.chars = [c.decode() for c in table.view(f"S{cpp}").ravel()]
+
+        pixels = table[codes].reshape(self.height, self.width * cpp)
+        self.datalines = [line.tobytes().decode() for line in pixels]
+        self._dot_matrix = None
         if not is_Continuous:  # refresh value_matrix from str to index
-            for h in range(self.height):
-                for w in range(self.width):
-                    self.value_matrix[h][w] = out_value_list.index(
-                        self.value_matrix[h][w]
-                    )
+            self.value_matrix = codes
 
     def save(self, outname: str) -> None:
         """dump XPM into xpm file"""
@@ -298,41 +510,120 @@ class XPM(log):
         for line in self.datalines:
             outstr += f""""{line}",\n"""
         outstr = outstr.strip().strip(",") + "\n"
-        with open(outname, "w") as fo:
+        with open_file(outname, "w") as fo:
             fo.write(outstr)
         self.info(f"Save results into {outname} successfully")
 
 
+def parse_xpm_frames(xpmfile: str, spans: List[Tuple[int, int]]) -> List[XPM]:
+    """parse frames of multi-frames xpm file from the bytes spans [start, stop),
+    used by XPMS and the workers of XPMS.load_frames. Spans are read in the order
+    of offsets, so a compressed file is decompressed in one forward pass"""
+    xpms = {}
+    with open_file(xpmfile, "rb") as fo:
+        for start, stop in sorted(set(spans)):
+            fo.seek(start)
+            xpms[start] = XPM(fo.read(stop - start).decode("utf-8"), is_file=False)
+    return [xpms[start] for start, _ in spans]
+
+
 class XPMS(log):
-    """XPMS class was designed to parse xpm file with multi-frames"""
+    """XPMS class was designed to parse xpm file with multi-frames. Only the byte
+    offsets and titles of frames are indexed by one scan of file, and frames are
+    parsed on demand, so files with thousands of frames could be processed frame
+    by frame in bounded memory."""
 
     def __init__(self, xpmfile: str) -> None:
         self.xpmfile: str = xpmfile
-        self.frames: list[XPM] = []
-
-        with open(xpmfile, "r") as fo:
-            contents = fo.read()
-        contents = contents.split("/* XPM */")
-        contents = [f"/* XPM */\n{c}" for c in contents if c.strip() != ""]
-        for content in contents:
-            xpm = XPM(content, is_file=False)
-            self.frames.append(xpm)
-        self.info(f"parsing multi-frames data from {xpmfile} successfully !")
+        self.offsets: List[int] = []  # byte offsets of frames, and the end of file
+        self.titles: List[str] = []
+
+        if not os.path.exists(xpmfile):
+            self.error(f"No {xpmfile} detected ! check it !")
+        offset = 0
+        with open_file(xpmfile, "rb") as fo:
+            for line in fo:
+                if line.startswith(b"/*"):
+                    item = line.strip()
+                    if item == b"/* XPM */":
+                        self.offsets.append(offset)
+                        self.titles.append("")
+                    elif item.startswith(b"/* title") and len(self.titles) > 0:
+                        self.titles[-1] = item.split(b'"')[1].decode("utf-8")
+                offset += len(line)
+        self.offsets.append(offset)
+        if len(self.titles) == 0:
+            self.error(f"No xpm frame detected in {xpmfile} ! check it !")
+        self.info(f"indexing {len(self)} frames from {xpmfile} successfully !")
 
     def __len__(self) -> int:
         """return number of frames"""
-        return len(self.frames)
+        return len(self.titles)
 
-    def __getitem__(self, index: int) -> XPM:
-        """get XPM of one frame"""
-        return self.frames[index]
+    def __getitem__(self, index: Union[int, slice]) -> Union[XPM, List[XPM]]:
+        """parse and get XPM of one frame by frame index, or a list of frames by slice"""
+        if isinstance(index, slice):
+            return parse_xpm_frames(
+                self.xpmfile, [self.span(i) for i in range(len(self))[index]]
+            )
+        return parse_xpm_frames(self.xpmfile, [self.span(index)])[0]
+
+    def span(self, index: int) -> Tuple[int, int]:
+        """return the bytes span [start, stop) of frame"""
+        if index < -len(self) or index >= len(self):
+            raise IndexError(f"frame index {index} out of range of {len(self)} frames")
+        index = index % len(self)
+        return self.offsets[index], self.offsets[index + 1]
+
+    def __iter__(self) -> Iterator[XPM]:
+        """parse and yield frames one by one by streaming the file sequentially"""
+        with open_file(self.xpmfile, "rb") as fo:
+            fo.seek(self.offsets[0])
+            for index in range(len(self)):
+                content = fo.read(self.offsets[index + 1] - self.offsets[index])
+                yield XPM(content.decode("utf-8"), is_file=False)
+
+    def load_frames(
+        self, indexes: Union[List[int], None] = None, jobs: int = 1
+    ) -> List[XPM]:
+        """parse frames on a process pool with jobs workers
+
+        Args:
+            indexes (Union[List[int], None], optional): the indexes of frames to parse. Defaults to None for all frames.
+            jobs (int, optional): the number of processes. Defaults to 1.
+
+        Returns:
+            List[XPM]: XPM objects of frames in the order of indexes
+        """
+        if indexes == None:
+            indexes = list(range(len(self)))
+        spans = [self.span(index) for index in indexes]
+        jobs = min(jobs, len(spans))
+        if jobs > 1 and detect_compression(self.xpmfile) != None:
+            self.warn(
+                f"{self.xpmfile} is compressed and could only be decompressed "
+                + "sequentially, parallel parsing is for uncompressed files. "
+                + "Parsing frames in one process"
+            )
+            jobs = 1
+        if jobs <= 1:
+            return parse_xpm_frames(self.xpmfile, spans)
+        self.info(f"parsing {len(spans)} xpm frames with {jobs} processes")
+        ## frames are sent to workers in batches to amortize the overhead
+        batch = -(-len(spans) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(parse_xpm_frames, self.xpmfile, spans[i : i + batch])
+                for i in range(0, len(spans), batch)
+            ]
+            return [xpm for future in futures for xpm in future.result()]
 
     def get_time_series(self) -> List[float]:
-        """parsing time infos from xpm titles"""
+        """parsing time infos from xpm titles, without parsing any frame"""
         times: float = []
-        for xpm in self:
-            if xpm.title.startswith("t="):
-                times.append(int(xpm.title[2:-2]))
+        for title in self.titles:
+            if title.startswith("t="):
+                times.append(int(title[2:-2]))
             else:
-                self.error(f"cannot parse time info from xpm title {xpm.title}")
+                self.error(f"cannot parse time info from xpm title {title}")
         return times
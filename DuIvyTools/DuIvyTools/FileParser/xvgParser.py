@@ -4,19 +4,56 @@ xvgParser module is part of DuIvyTools for parsing the xvg file generated by GRO
 Written by DuIvy and provided to you by GPLv3 license.
 """
 
+import io
+import mmap
 import os
+import re
 import sys
 import time
-from typing import List, Tuple, Union
+from itertools import chain, islice
+from typing import BinaryIO, Iterator, List, TextIO, Tuple, Union
 
 import numpy as np
+import pandas as pd
 import scipy.stats as stats
 
 base = os.path.dirname(os.path.realpath(os.path.join(__file__, "..")))
 if base not in sys.path:
     sys.path.insert(0, base)
 
-from utils import log
+from FileParser.parserCache import ParserCache
+from utils import (
+    detect_compression,
+    log,
+    open_file,
+    strip_compression_suffix,
+)
+
+## any non-blank char, for checking empty frames of XVGS
+XVGS_CONTENT_PATTERN = re.compile(rb"\S")
+## the default NA tokens of pandas, only detected in numeric columns. String
+## columns only treat the missing fields of short lines as NA
+NUMERIC_NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
 
 
 class XVG(log):
@@ -27,7 +64,11 @@ class XVG(log):
         xvgfile: Union[str, List[str]],
         is_file: bool = True,
         new_file: bool = False,
+        dtype: type = np.float64,
+        load_data: bool = True,
+        columns: List[int] = None,
     ) -> None:
+        self.xvgfile: str = ""
         self.comments: str = ""
         self.comments_tail: str = ""
         self.title: str = ""
@@ -42,6 +83,9 @@ class XVG(log):
         self.row_num: int = 0
         self.data_heads: List[str] = []
         self.data_columns: List[Union(float, str)] = []
+        self.dtype: type = dtype
+        self.data: np.ndarray = None  # (row_num, len(data_heads)), column-major
+        self.data_offset: int = 0  # byte offset of the first data line
 
         if new_file:
             self.xvgfile = xvgfile
@@ -50,15 +94,22 @@ class XVG(log):
                 self.xvgfile: str = xvgfile
                 if not os.path.exists(xvgfile):
                     self.error(f"No {xvgfile} detected ! check it !")
-                if xvgfile[-4:] != ".xvg":
+                if strip_compression_suffix(xvgfile)[-4:] != ".xvg":
                     self.error(
                         f"you must specify a file with suffix .xvg, instead of {xvgfile}"
                     )
-                with open(xvgfile, "r") as fo:
-                    lines = fo.readlines()
+                cache = ParserCache()
+                cache_tag = f"xvg-{np.dtype(dtype).name}"
+                cached = cache.load(xvgfile, cache_tag) if load_data else None
+                if cached != None:
+                    self.load_cache(*cached)
+                else:
+                    with open_file(xvgfile, "rb") as fo:
+                        self.parse_xvg_stream(fo, load_data, columns)
+                    if cache.enabled and load_data and columns == None:
+                        cache.store(xvgfile, cache_tag, *self.dump_cache())
             else:
-                lines = xvgfile
-            self.parse_xvg(lines)
+                self.parse_xvg(xvgfile)
             if is_file:
                 self.info(f"parsing data from {xvgfile} successfully !")
 
@@ -68,50 +119,299 @@ class XVG(log):
         Args:
             lines (List[str]): xvg file lines
         """
-        ## parse data
-        for line in lines:
-            line = line.strip()
-            if line.startswith("#") or line.startswith("&"):
-                self.comments += line + "\n"
-            elif line.startswith("@"):
-                if " title " in line:
-                    self.title = line.strip('"').split('"')[-1]
-                elif " xaxis " in line and " label " in line:
-                    self.xlabel = line.strip('"').split('"')[-1]
-                elif " yaxis " in line and " label " in line:
-                    self.ylabel = line.strip('"').split('"')[-1]
-                elif line.startswith("@ s") and " legend " in line:
-                    self.legends.append(line.strip('"').split('"')[-1])
-                elif " world xmin " in line:
-                    self.xmin = float(line.split()[-1])
-                elif " world xmax " in line:
-                    self.xmax = float(line.split()[-1])
-                elif " world ymin " in line:
-                    self.ymin = float(line.split()[-1])
-                elif " world ymax " in line:
-                    self.ymax = float(line.split()[-1])
-                else:
-                    pass
+        content = "\n".join(line.rstrip("\n") for line in lines) + "\n"
+        self.parse_xvg_stream(io.BytesIO(content.encode()))
+
+    def parse_xvg_stream(
+        self, fo: BinaryIO, load_data: bool = True, columns: List[int] = None
+    ) -> None:
+        """parse xvg content from a binary stream into XVG class. Header lines
+        are parsed one by one, then all data lines are tokenized in bulk by the
+        C parser of pandas into one 2-D ndarray.
+
+        Args:
+            fo (BinaryIO): xvg content opened in binary mode
+            load_data (bool, optional): whether to load data lines. Defaults to True.
+            columns (List[int], optional): only convert the selected columns, others
+                are decoded from xvg file when accessed. Defaults to all columns.
+        """
+        first_line = self.parse_header(fo)
+        if not load_data:
+            self.set_data_heads()
+            return
+        body = self.pick_header_lines(first_line + fo.read())
+        self.set_data_heads()
+
+        ## convert data
+        heads_num = min(len(self.data_heads), self.column_num)
+        df = self.parse_data_block(body, columns)
+        self.row_num = len(df)
+        if len(df.columns) == self.column_num:
+            self.data = np.asfortranarray(
+                df.iloc[:, :heads_num].to_numpy(dtype=self.dtype)
+            )
+        else:
+            self.data = np.full((self.row_num, heads_num), np.nan, self.dtype, "F")
+            loaded = [c for c in df.columns if c < heads_num]
+            self.data[:, loaded] = df[loaded].to_numpy(dtype=self.dtype)
+        data_columns = [self.data[:, c] for c in range(heads_num)]
+        for c in range(heads_num, self.column_num):
+            data_columns.append(df[c].tolist() if c in df.columns else None)
+        pending = [c for c in range(self.column_num) if c not in df.columns]
+        self.data_columns = XVGColumns(self, data_columns, pending)
+        del df
+
+        ## check infos
+        if self.column_num == 0 or self.row_num == 0:
+            self.error(f"no data line detected in {self.xvgfile}")
+        if len(self.data_heads) < self.column_num:
+            self.warn(
+                f"string column may detected, data_heads {len(self.data_heads)} < column_num {self.column_num}"
+            )
+
+    def parse_header(self, fo: BinaryIO) -> bytes:
+        """parse header lines until the first data line, record the byte offset
+        of data lines into data_offset and the number of columns into column_num
+
+        Args:
+            fo (BinaryIO): xvg content opened in binary mode
+
+        Returns:
+            bytes: the first data line
+        """
+        first_line: bytes = b""
+        offset = fo.tell()
+        for bline in iter(fo.readline, b""):
+            line = bline.decode(errors="replace").strip()
+            if line == "":
+                pass
+            elif line[0] in "#@&":
+                self.parse_header_line(line)
+            else:
+                first_line = bline
+                break
+            offset += len(bline)
+        if not first_line:
+            self.error(f"no data line detected in {self.xvgfile}")
+        self.data_offset = offset
+        self.column_num = len(first_line.split())
+        return first_line
+
+    def pick_header_lines(self, body: bytes, parse: bool = True) -> bytes:
+        """parse the header lines among or after data lines (normally the tail
+        comments), and remove them from data lines
+
+        Args:
+            body (bytes): data lines
+            parse (bool, optional): whether to parse the header lines. Defaults to True.
+
+        Returns:
+            bytes: data lines without header lines
+        """
+        ## find the first header char by memchr, much faster than regex search
+        found = [i for i in (body.find(c) for c in (b"#", b"@", b"&")) if i != -1]
+        if len(found) == 0:
+            return body
+        start = body.rfind(b"\n", 0, min(found)) + 1
+        data_lines: List[bytes] = [body[:start]]
+        for bline in body[start:].splitlines(keepends=True):
+            line = bline.decode(errors="replace").strip()
+            if line != "" and line[0] in "#@&":
+                if parse:
+                    self.parse_header_line(line)
             else:
-                items = line.split()
-                if self.column_num == 0:
-                    self.data_columns = [[] for _ in range(len(items))]
-                    self.column_num = len(items)
-                    self.row_num = 0
-                if len(items) != self.column_num:
+                data_lines.append(bline)
+        return b"".join(data_lines)
+
+    def parse_data_block(self, body: bytes, columns: List[int] = None) -> pd.DataFrame:
+        """tokenize data lines by the C parser of pandas. Columns with data_heads
+        are converted into self.dtype, others are kept as strings.
+
+        Args:
+            body (bytes): data lines without header lines
+            columns (List[int], optional): the columns to convert, the last column
+                is always converted for checking. Defaults to all columns.
+
+        Returns:
+            pd.DataFrame: data of selected columns, labeled by column indexs
+        """
+        heads_num = min(len(self.data_heads), self.column_num)
+        usecols = list(range(self.column_num))
+        if columns != None:
+            usecols = sorted(
+                set(c for c in columns if c in usecols) | {self.column_num - 1}
+            )
+        dtypes = {c: (self.dtype if c < heads_num else str) for c in usecols}
+        na_values = {c: (NUMERIC_NA_VALUES if c < heads_num else [""]) for c in usecols}
+        try:
+            df = pd.read_csv(
+                io.BytesIO(body),
+                sep=r"\s+",
+                header=None,
+                names=list(range(self.column_num)),
+                usecols=usecols,
+                dtype=dtypes,
+                keep_default_na=False,
+                na_values=na_values,
+                engine="c",
+            )
+        except (pd.errors.ParserError, ValueError) as err:
+            self.error(f"unable to parse data lines of {self.xvgfile}: \n{err}")
+        ## lines with less items were filled with NaN by pandas, check it
+        missing = np.flatnonzero(df[self.column_num - 1].isna().to_numpy())
+        if len(missing) != 0:
+            lines = [l for l in body.splitlines() if l.strip() != b""]
+            for row in missing:
+                if len(lines[row].split()) != self.column_num:
                     self.error(
-                        f"the number of columns in {self.xvgfile} is not equal at line {self.row_num}"
+                        f"the number of columns in {self.xvgfile} is not equal at line {row}"
                     )
-                for i in range(len(items)):
-                    self.data_columns[i].append(items[i])
-                self.row_num += 1
+        return df
 
-        ## convert data
-        self.data_heads.append(self.xlabel)
-        self.data_columns[0] = [float(c) for c in self.data_columns[0]]
-        if len(self.legends) == 0 and len(self.data_columns) > 1:
+    def iter_chunks(
+        self,
+        rows: int = 100000,
+        columns: List[int] = None,
+        begin: int = None,
+        end: int = None,
+        dt: int = 1,
+    ) -> Iterator[np.ndarray]:
+        """yield data of selected columns block by block. If XVG was initialized
+        with load_data=False, data lines would be read from xvg file chunk by
+        chunk, which keeps the memory usage constant for huge xvg files.
+
+        Args:
+            rows (int, optional): the number of rows read in each chunk. Defaults to 100000.
+            columns (List[int], optional): the selected column indexs. Defaults to all columns with data_heads.
+            begin (int, optional): the begin index of rows. Defaults to None.
+            end (int, optional): the end index of rows. Defaults to None.
+            dt (int, optional): the index step of rows. Defaults to 1.
+
+        Yields:
+            Iterator[np.ndarray]: data blocks in shape (rows/dt, len(columns))
+        """
+        heads_num = min(len(self.data_heads), self.column_num)
+        if columns is None:
+            columns = list(range(heads_num))
+        self.check_column_index(columns)
+        for column in columns:
+            if column >= heads_num:
+                self.error(f"unable to read string column {column} by chunks")
+        if rows <= 0:
+            self.error("the number of rows for each chunk should be larger than 0")
+        if (begin != None and begin < 0) or (end != None and end < 0) or dt <= 0:
+            self.error(
+                "minus begin, end, or dt is not supported when reading xvg by chunks"
+            )
+        begin = 0 if begin == None else begin
+
+        if self.data is not None:
+            self.load_columns(columns)
+            blocks = (self.data[s : s + rows] for s in range(0, self.row_num, rows))
+        else:
+            blocks = self.read_chunks(rows)
+        start: int = 0
+        for block in blocks:
+            stop = start + len(block)
+            first = max(begin, start)
+            first += (dt - (first - begin) % dt) % dt
+            last = stop if end == None else min(end, stop)
+            if first < last:
+                yield block[first - start : last - start : dt][:, columns]
+            start = stop
+            if end != None and start >= end:
+                break
+
+    def read_chunks(self, rows: int) -> Iterator[np.ndarray]:
+        """read data of columns with data_heads from xvg file chunk by chunk
+
+        Args:
+            rows (int): the number of rows of each chunk
+
+        Yields:
+            Iterator[np.ndarray]: data blocks in shape (rows, len(data_heads))
+        """
+        heads_num = min(len(self.data_heads), self.column_num)
+        with open_file(self.xvgfile, "rb") as fo:
+            fo.seek(self.data_offset)
+            pending: List[bytes] = []
+            eof: bool = False
+            while not eof:
+                lines = list(islice(fo, rows - len(pending)))
+                eof = len(lines) < rows - len(pending)
+                lines_size = sum(len(line) for line in lines)
+                body = self.pick_header_lines(b"".join(lines), parse=False)
+                if len(body) != lines_size or len(pending) != 0:
+                    ## header lines removed, read more lines to fill the chunk
+                    pending += body.splitlines(keepends=True)
+                    if len(pending) < rows and not eof:
+                        continue
+                    body = b"".join(pending)
+                pending = []
+                if body.strip() == b"":
+                    continue
+                df = self.parse_data_block(body)
+                yield df.iloc[:, :heads_num].to_numpy(dtype=self.dtype)
+
+    def load_columns(self, columns: List[int]) -> None:
+        """decode the columns skipped by column selection from xvg file
+
+        Args:
+            columns (List[int]): the column indexs to load
+        """
+        if not isinstance(self.data_columns, XVGColumns):
+            return
+        columns = [c for c in columns if c in self.data_columns.pending]
+        if len(columns) == 0:
+            return
+        with open_file(self.xvgfile, "rb") as fo:
+            fo.seek(self.data_offset)
+            body = self.pick_header_lines(fo.read(), parse=False)
+        df = self.parse_data_block(body, columns)
+        if len(df) != self.row_num:
+            self.error(f"{self.xvgfile} was changed during parsing, check it !")
+        heads_num = self.data.shape[1]
+        for c in columns:
+            if c < heads_num:
+                self.data[:, c] = df[c].to_numpy(dtype=self.dtype)
+            else:
+                self.data_columns.set_loaded(c, df[c].tolist())
+            self.data_columns.pending.discard(c)
+
+    def parse_header_line(self, line: str) -> None:
+        """parse one comment (#, &) or setting (@) line of xvg
+
+        Args:
+            line (str): the stripped header line
+        """
+        if line.startswith("#") or line.startswith("&"):
+            self.comments += line + "\n"
+        elif line.startswith("@"):
+            if " title " in line:
+                self.title = line.strip('"').split('"')[-1]
+            elif " xaxis " in line and " label " in line:
+                self.xlabel = line.strip('"').split('"')[-1]
+            elif " yaxis " in line and " label " in line:
+                self.ylabel = line.strip('"').split('"')[-1]
+            elif line.startswith("@ s") and " legend " in line:
+                self.legends.append(line.strip('"').split('"')[-1])
+            elif " world xmin " in line:
+                self.xmin = float(line.split()[-1])
+            elif " world xmax " in line:
+                self.xmax = float(line.split()[-1])
+            elif " world ymin " in line:
+                self.ymin = float(line.split()[-1])
+            elif " world ymax " in line:
+                self.ymax = float(line.split()[-1])
+            else:
+                pass
+
+    def set_data_heads(self) -> None:
+        """generate data_heads by xlabel, ylabel, legends and column_num.
+        Columns without data_heads would be kept as string columns."""
+        self.data_heads = [self.xlabel]
+        if len(self.legends) == 0 and self.column_num > 1:
             self.data_heads.append(self.ylabel)
-            self.data_columns[1] = [float(c) for c in self.data_columns[1]]
 
         if len(self.legends) > 0 and self.column_num > len(self.legends):
             items = [item.strip() for item in self.ylabel.split(",")]
@@ -129,19 +429,39 @@ class XVG(log):
             else:
                 self.warn("failed to pair ylabel to legends, use legends in xvg file")
             self.data_heads += heads
-            for i in range(len(heads)):
-                self.data_columns[i + 1] = [float(c) for c in self.data_columns[i + 1]]
 
-        ## check infos
-        for c in range(self.column_num):
-            if len(self.data_columns[c]) != self.row_num:
-                self.error(f"length of column {c} is not equal to other columns")
-        if self.column_num == 0 or self.row_num == 0:
-            self.error(f"no data line detected in {self.xvgfile}")
-        if len(self.data_heads) < self.column_num:
-            self.warn(
-                f"string column may detected, data_heads {len(self.data_heads)} < column_num {self.column_num}"
-            )
+    def dump_cache(self) -> Tuple[dict, dict]:
+        """dump the parsed header and data of XVG for ParserCache or for passing
+        XVG between processes
+
+        Returns:
+            Tuple[dict, dict]: metadata and arrays
+        """
+        keys = ["comments", "comments_tail", "title", "xlabel", "ylabel"]
+        keys += ["xmin", "xmax", "ymin", "ymax", "legends", "column_num"]
+        keys += ["row_num", "data_heads", "data_offset"]
+        meta = {key: self.__dict__[key] for key in keys}
+        ## get string columns without decoding the pending columns
+        heads_num = self.data.shape[1]
+        meta["str_columns"] = list.__getitem__(self.data_columns, slice(heads_num, None))
+        meta["pending"] = []
+        if isinstance(self.data_columns, XVGColumns):
+            meta["pending"] = sorted(self.data_columns.pending)
+        return meta, {"data": self.data}
+
+    def load_cache(self, meta: dict, arrays: dict) -> None:
+        """load the header and data of XVG from ParserCache
+
+        Args:
+            meta (dict): metadata dumped by dump_cache
+            arrays (dict): memory-mapped arrays dumped by dump_cache
+        """
+        meta = dict(meta)
+        str_columns, pending = meta.pop("str_columns"), meta.pop("pending", [])
+        self.__dict__.update(meta)
+        self.data = arrays["data"]
+        data_columns = [self.data[:, c] for c in range(self.data.shape[1])]
+        self.data_columns = XVGColumns(self, data_columns + str_columns, pending)
 
     def save(self, outxvg: str, check: bool = True) -> None:
         """dump XVG class to xvg file
@@ -164,6 +484,19 @@ class XVG(log):
             if len(self.data_columns[0]) != 0 and self.row_num == 0:
                 self.row_num = len(self.data_columns[0])
 
+        with open_file(outxvg, "w") as fo:
+            fo.write(self.dump_header())
+            self.dump_rows(fo, self.data_columns[: self.column_num], self.row_num)
+            if self.comments_tail:
+                fo.write(self.comments_tail.strip() + "\n")
+        self.info(f"dump xvg to {outxvg} successfully")
+
+    def dump_header(self) -> str:
+        """dump the comments and settings of XVG class into xvg header string
+
+        Returns:
+            str: the header string of xvg file
+        """
         time_info = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
         outstr: str = f"# This file was created by DuIvyTools at {time_info}\n"
         if self.comments:
@@ -178,23 +511,68 @@ class XVG(log):
         outstr += f"@ legend 0.78, 0.8\n@ legend length {len(self.legends)}\n"
         for i, leg in enumerate(self.legends):
             outstr += f'@ s{i} legend "{leg}"\n'
-        for row in range(self.row_num):
-            for i in range(self.column_num):
-                value = self.data_columns[i][row]
-                if isinstance(value, int):
-                    outstr += f"{value:>6d} "
-                else:
-                    outstr += f"{value:>16.6f} "
-            outstr += "\n"
-        if self.comments_tail:
-            outstr += self.comments_tail.strip() + "\n"
-        with open(outxvg, "w") as fo:
-            fo.write(outstr)
-        self.info(f"dump xvg to {outxvg} successfully")
+        return outstr
+
+    def dump_rows(
+        self, fo: TextIO, columns: List[List], row_num: int, block_rows: int = 10000
+    ) -> None:
+        """dump data rows into opened xvg file. Rows are formatted block by block
+        with one row format string, int values in `%6d`, strings in `%16s`, and
+        others in `%16.6f`.
+
+        Args:
+            fo (TextIO): the opened output file
+            columns (List[List]): data columns to dump
+            row_num (int): the number of rows to dump
+            block_rows (int, optional): the number of rows formatted at once. Defaults to 10000.
+        """
+        formats: List[str] = []
+        for column in columns:
+            if isinstance(column, np.ndarray):
+                formats.append("%16.6f ")
+                continue
+            is_int = [isinstance(value, int) for value in column[:row_num]]
+            is_str = [isinstance(value, str) for value in column[:row_num]]
+            if all(is_str) and len(is_str) != 0:
+                formats.append("%16s ")
+            elif all(is_int) and len(is_int) != 0:
+                formats.append("%6d ")
+            elif not any(is_int) and not any(is_str):
+                formats.append("%16.6f ")
+            else:
+                formats.append(None)  # int and float mixed column
+        if None in formats:
+            for row in range(row_num):
+                outstr: str = ""
+                for column in columns:
+                    value = column[row]
+                    if isinstance(value, int):
+                        outstr += f"{value:>6d} "
+                    elif isinstance(value, str):
+                        outstr += f"{value:>16s} "
+                    else:
+                        outstr += f"{value:>16.6f} "
+                fo.write(outstr + "\n")
+            return
+
+        row_format = "".join(formats) + "\n"
+        for start in range(0, row_num, block_rows):
+            stop = min(start + block_rows, row_num)
+            block = [
+                c[start:stop].tolist() if isinstance(c, np.ndarray) else c[start:stop]
+                for c in columns
+            ]
+            values = tuple(chain.from_iterable(zip(*block)))
+            fo.write((row_format * (stop - start)) % values)
 
     def calc_mvave(
-        self, windowsize: int, confidence: float, column_index: int
-    ) -> Tuple[List]:
+        self,
+        windowsize: int,
+        confidence: float,
+        column_index: int,
+        center: bool = False,
+        method: str = "mean",
+    ) -> Tuple[np.ndarray]:
         """
         calculate the moving average of each column
 
@@ -202,32 +580,103 @@ class XVG(log):
             windowsize: the window size for calculating moving average
             confidence: the confidence to calculate interval
             conlumn_index: the index for the column to calculate
+            center: whether to use centered windows
+            method: "mean" or "median", see calc_rolling
 
         :return:
             mvaves: a list contains moving average
             highs: the high value of interval of moving averages
             lows: the low value of interval of moving averages
         """
+        mvaves, highs, lows = self.calc_rolling(
+            [column_index], windowsize, confidence, center, method
+        )
+        return mvaves[:, 0], highs[:, 0], lows[:, 0]
+
+    def calc_rolling(
+        self,
+        column_indexs: List[int],
+        windowsize: int,
+        confidence: float,
+        center: bool = False,
+        method: str = "mean",
+    ) -> Tuple[np.ndarray]:
+        """calculate the moving averages and confidence intervals of selected
+        columns in one vectorized pass. The window of row i is [i-windowsize, i),
+        or [i-windowsize//2, i-windowsize//2+windowsize) for centered windows,
+        rows without a full window are NaN.
+
+        For "mean" method, the window sums come from cumulative sums and the
+        interval is the normal interval of window mean and std. For "median"
+        method, the window median and the quantiles of (1-confidence)/2 and
+        (1+confidence)/2 are reported.
+
+        Args:
+            column_indexs (List[int]): the selected column indexs
+            windowsize (int): the window size
+            confidence (float): the confidence to calculate interval
+            center (bool, optional): whether to use centered windows. Defaults to False.
+            method (str, optional): "mean" or "median". Defaults to "mean".
 
+        Returns:
+            Tuple[np.ndarray]: mvaves, highs, lows in shape (row_num, len(column_indexs))
+        """
         if windowsize <= 0 or windowsize > int(self.row_num / 2):
             self.error("windowsize value is not proper")
         if confidence <= 0 or confidence >= 1:
             self.error("confidence value is not proper, it should be in (0,1)")
+        for column_index in column_indexs:
+            if column_index < 0 or column_index >= self.column_num:
+                self.error(
+                    "wrong selection of column_index to calculate moving averages"
+                )
+        if method not in ["mean", "median"]:
+            self.error(f"unknown method {method} to calculate moving averages")
+
+        data = np.column_stack(
+            [np.asarray(self.data_columns[c], dtype=np.float64) for c in column_indexs]
+        )
+        row_num, width = data.shape
+        starts = np.arange(row_num) - (windowsize // 2 if center else windowsize)
+        rows = np.flatnonzero((starts >= 0) & (starts + windowsize <= row_num))
+        starts = starts[rows]
+        mvaves = np.full(data.shape, np.nan)
+        highs = np.full(data.shape, np.nan)
+        lows = np.full(data.shape, np.nan)
+        if len(rows) == 0:
+            return mvaves, highs, lows
 
-        if column_index < 0 or column_index >= self.column_num:
-            self.error("wrong selection of column_index to calculate moving averages")
-        column_data = self.data_columns[column_index]
-        mvaves = [np.nan for _ in range(windowsize)]
-        highs = [np.nan for _ in range(windowsize)]
-        lows = [np.nan for _ in range(windowsize)]
-        for i in range(windowsize, self.row_num):
-            window_data = np.array(column_data[i - windowsize : i])
-            ave = np.mean(window_data)
-            std = np.std(window_data)
-            interval = stats.norm.interval(confidence, ave, std)
-            mvaves.append(ave)
-            lows.append(interval[0])
-            highs.append(interval[1])
+        if method == "mean":
+            ## shift data to reduce the cancellation of sum of squares
+            shift = np.where(np.isfinite(data[0]), data[0], 0.0)
+            nans = np.isnan(data)
+            shifted = np.where(nans, 0.0, data - shift)
+            zeros = np.zeros((1, width))
+            sum1 = np.vstack([zeros, np.cumsum(shifted, axis=0)])
+            sum2 = np.vstack([zeros, np.cumsum(shifted**2, axis=0)])
+            nan_num = np.vstack([zeros, np.cumsum(nans, axis=0)])
+            stops = starts + windowsize
+            ave = (sum1[stops] - sum1[starts]) / windowsize
+            square = (sum2[stops] - sum2[starts]) / windowsize
+            var = np.maximum(square - ave**2, 0.0)
+            var[var <= 64 * np.finfo(np.float64).eps * square] = 0.0
+            ave[nan_num[stops] - nan_num[starts] > 0] = np.nan
+            ## std of 0 gives no interval, same as scipy.stats.norm.interval
+            z = stats.norm.ppf((1 + confidence) / 2)
+            half = np.where(var > 0, z * np.sqrt(var), np.nan)
+            mvaves[rows] = ave + shift
+            highs[rows] = mvaves[rows] + half
+            lows[rows] = mvaves[rows] - half
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(data, windowsize, 0)
+            quantiles = [0.5, (1 + confidence) / 2, (1 - confidence) / 2]
+            ## in blocks to limit the memory of partitioning windows
+            block_rows = max(1, 2**22 // (windowsize * width))
+            for b in range(0, len(rows), block_rows):
+                block = windows[starts[b] : starts[b] + len(rows[b : b + block_rows])]
+                results = np.quantile(block, quantiles, axis=-1)
+                for out, result in zip([mvaves, highs, lows], results):
+                    out[rows[b : b + block_rows]] = result
         return mvaves, highs, lows
 
     def calc_ave(
@@ -263,6 +712,143 @@ class XVG(log):
         std = np.std(column[begin:end:dt], ddof=1)
         return legend, ave, std
 
+    def calc_ave_by_chunks(
+        self, begin: int, end: int, dt: int, rows: int = 100000
+    ) -> Tuple[List]:
+        """calculate the averages and std.errs of all columns with data_heads in
+        one pass over data chunks, by merging the mean and sum of squared
+        deviations of each chunk (Welford/Chan algorithm)
+
+        Args:
+            begin (int): the begin index
+            end (int): the end index
+            dt (int): the index step
+            rows (int, optional): the number of rows of each chunk. Defaults to 100000.
+
+        Returns:
+            Tuple[List]: legends, averages, std.errs
+        """
+        if (begin != None and end != None) and (begin >= end):
+            self.error("start index should be less than end index")
+        count: int = 0
+        mean, m2 = 0.0, 0.0
+        for block in self.iter_chunks(rows, None, begin, end, dt):
+            block = block.astype(np.float64, copy=False)
+            block_count = block.shape[0]
+            block_mean = np.mean(block, axis=0)
+            block_m2 = np.sum((block - block_mean) ** 2, axis=0)
+            delta = block_mean - mean
+            total = count + block_count
+            mean = mean + delta * block_count / total
+            m2 = m2 + block_m2 + delta**2 * count * block_count / total
+            count = total
+        if count == 0:
+            self.error(f"no data selected from {self.xvgfile} by begin, end and dt")
+        legends = self.data_heads[: min(len(self.data_heads), self.column_num)]
+        aves = [float(ave) for ave in mean]
+        if count > 1:
+            stds = [float(np.sqrt(v / (count - 1))) for v in m2]
+        else:
+            stds = [np.nan for _ in legends]
+        return legends, aves, stds
+
+    def select_data(self, begin: int, end: int, dt: int) -> np.ndarray:
+        """select rows of all columns with data_heads by begin, end, and dt
+
+        Returns:
+            np.ndarray: selected data in float64, shape (rows, len(data_heads))
+        """
+        if (begin != None and end != None) and (begin >= end):
+            self.error("start index should be less than end index")
+        heads_num = min(len(self.data_heads), self.column_num)
+        data = np.column_stack(
+            [
+                np.asarray(self.data_columns[c][begin:end:dt], dtype=np.float64)
+                for c in range(heads_num)
+            ]
+        )
+        if len(data) < 4:
+            self.error("at least 4 rows of data are needed to estimate std.err")
+        return data
+
+    def calc_ave_by_blocking(self, begin: int, end: int, dt: int) -> Tuple[List]:
+        """calculate the averages and std.errs of all columns with data_heads by
+        block averaging (Flyvbjerg & Petersen, 1989). Data are blocked into
+        halves repeatedly, and the blocking level is selected automatically by
+        the M statistic (Jonsson, 2018) for each column.
+
+        Args:
+            begin (int): the begin index
+            end (int): the end index
+            dt (int): the index step
+
+        Returns:
+            Tuple[List]: legends, averages, std.errs of averages
+        """
+        data = self.select_data(begin, end, dt)
+        aves = np.mean(data, axis=0)
+        variances, gammas, sizes = [], [], []
+        blocks = data
+        while len(blocks) >= 2:
+            deviation = blocks - np.mean(blocks, axis=0)
+            sizes.append(len(blocks))
+            variances.append(np.mean(deviation**2, axis=0))
+            covariance = np.sum(deviation[:-1] * deviation[1:], axis=0)
+            gammas.append(covariance / len(blocks))
+            half = len(blocks) // 2
+            blocks = 0.5 * (blocks[0 : 2 * half : 2] + blocks[1 : 2 * half : 2])
+        variances, gammas = np.array(variances), np.array(gammas)
+        sizes = np.array(sizes)[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            terms = np.nan_to_num(sizes * (gammas / variances) ** 2)
+        ## M[j] = sum of terms from level j to the last level
+        m_stats = np.cumsum(terms[::-1], axis=0)[::-1]
+        quantiles = stats.chi2.ppf(0.99, np.arange(1, len(sizes) + 1))[:, np.newaxis]
+        passed = m_stats < quantiles
+        levels = np.argmax(passed, axis=0)
+        levels[~passed.any(axis=0)] = len(sizes) - 1
+        columns = np.arange(data.shape[1])
+        stderrs = np.sqrt(variances[levels, columns] / sizes[levels, 0])
+        legends = self.data_heads[: data.shape[1]]
+        return legends, aves.tolist(), stderrs.tolist()
+
+    def calc_ave_by_autocorr(
+        self, begin: int, end: int, dt: int, c: float = 5.0
+    ) -> Tuple[List]:
+        """calculate the averages and std.errs of all columns with data_heads by
+        the integrated autocorrelation time. The autocorrelation functions are
+        calculated by FFT, and summed up to the first window M >= c * tau(M)
+        (Sokal's automatic windowing). std.err = sqrt(var * tau / N).
+
+        Args:
+            begin (int): the begin index
+            end (int): the end index
+            dt (int): the index step
+            c (float, optional): the factor of automatic windowing. Defaults to 5.0.
+
+        Returns:
+            Tuple[List]: legends, averages, std.errs of averages
+        """
+        data = self.select_data(begin, end, dt)
+        row_num = len(data)
+        aves = np.mean(data, axis=0)
+        deviation = data - aves
+        size = 1 << (2 * row_num - 1).bit_length()
+        spectrum = np.fft.rfft(deviation, n=size, axis=0)
+        acf = np.fft.irfft(spectrum * np.conj(spectrum), n=size, axis=0)[:row_num]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            acf = acf / acf[0]
+        taus = 2.0 * np.cumsum(acf, axis=0) - 1.0
+        windows = np.arange(row_num)[:, np.newaxis] >= c * taus
+        windows = np.where(
+            windows.any(axis=0), np.argmax(windows, axis=0), row_num - 1
+        )
+        taus = np.maximum(taus[windows, np.arange(data.shape[1])], 1.0)
+        taus = np.where(np.isfinite(taus), taus, 1.0)  # constant columns
+        stderrs = np.sqrt(np.var(data, axis=0) * taus / row_num)
+        legends = self.data_heads[: data.shape[1]]
+        return legends, aves.tolist(), stderrs.tolist()
+
     def check_column_index(self, column_index: Union[int, List]) -> None:
         """check user-input column index in or not in xpm column range
 
@@ -284,34 +870,192 @@ class XVG(log):
                 )
 
 
+class XVGColumns(list):
+    """XVGColumns class is the list of XVG data columns, the columns skipped by
+    column selection are decoded from xvg file on first access"""
+
+    def __init__(self, xvg: XVG, columns: List, pending: List[int]) -> None:
+        super().__init__(columns)
+        self.xvg: XVG = xvg
+        self.pending: set = set(pending)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if self.pending:
+            if isinstance(index, slice):
+                self.xvg.load_columns(list(range(len(self))[index]))
+            else:
+                self.xvg.load_columns([range(len(self))[index]])
+        return super().__getitem__(index)
+
+    def __iter__(self):
+        if self.pending:
+            self.xvg.load_columns(sorted(self.pending))
+        return super().__iter__()
+
+    def set_loaded(self, index: int, column: List) -> None:
+        """set the decoded column without triggering loading"""
+        super().__setitem__(index, column)
+
+
 class XVGS(log):
-    """XVGS class for parsing xvg file with multiframes"""
+    """XVGS class for parsing xvg file with multiframes. Only the byte offsets
+    of frames are scanned at initialization, frames are parsed when accessed."""
+
+    def __init__(self, xvgfile: str, index_file: str = None) -> None:
+        """scan the frames of xvg file, or load the scanned offsets from index_file
 
-    def __init__(self, xvgfile: str) -> None:
+        Args:
+            xvgfile (str): the xvg file with multiframes separated by `&`
+            index_file (str, optional): the file to store offsets of frames. The
+                offsets would be loaded from it if it is up-to-date, otherwise
+                scanned and saved into it. Defaults to None.
+        """
         self.xvgfile: str = xvgfile
-        self.frames: list[XVG] = []
-
-        with open(xvgfile, "r") as fo:
-            lines = fo.readlines()
-        contents: List[List[str]] = [[]]
-        for line in lines:
-            item = line.strip()
-            if item != "&" and item != "":
-                contents[-1].append(line)
-            elif item == "&":
-                contents.append([])
-
-        for content in contents:
-            if len(content) == 0:
-                continue
-            xvg = XVG(content, is_file=False)
-            self.frames.append(xvg)
-        self.info(f"parsing multi-frames data from {xvgfile} successfully !")
+        self.offsets: np.ndarray = None  # (frame_num, 2), begin and end bytes
+        self._warned: bool = False  # warned about indexed access to compressed file
+
+        if not os.path.exists(xvgfile):
+            self.error(f"No {xvgfile} detected ! check it !")
+        if index_file != None and self.load_index(index_file):
+            self.info(f"loading frame index of {xvgfile} from {index_file}")
+            return
+        self.offsets = self.scan_frames()
+        if index_file != None:
+            self.save_index(index_file)
+        self.info(f"indexing {len(self)} frames from {xvgfile} successfully !")
+
+    def scan_frames(self) -> np.ndarray:
+        """scan the byte offsets of non-empty frames separated by `&` lines
+
+        Returns:
+            np.ndarray: begin and end bytes of frames in shape (frame_num, 2)
+        """
+        offsets: List[Tuple[int, int]] = []
+        if detect_compression(self.xvgfile) != None:
+            ## offsets in decompressed stream, scanned line by line
+            with open_file(self.xvgfile, "rb") as fo:
+                begin, offset, has_content = 0, 0, False
+                for bline in fo:
+                    if bline.strip() == b"&":
+                        if has_content:
+                            offsets.append((begin, offset))
+                        begin, has_content = offset + len(bline), False
+                    elif bline.strip() != b"":
+                        has_content = True
+                    offset += len(bline)
+                if has_content:
+                    offsets.append((begin, offset))
+            return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+        with open(self.xvgfile, "rb") as fo:
+            size = os.fstat(fo.fileno()).st_size
+            if size == 0:
+                return np.zeros((0, 2), dtype=np.int64)
+            with mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                begin, pos = 0, mm.find(b"&")
+                while pos != -1:
+                    line_begin = mm.rfind(b"\n", 0, pos) + 1
+                    line_end = mm.find(b"\n", pos)
+                    line_end = size if line_end == -1 else line_end + 1
+                    if mm[line_begin:line_end].strip() == b"&":
+                        offsets.append((begin, line_begin))
+                        begin = line_end
+                    pos = mm.find(b"&", line_end)
+                offsets.append((begin, size))
+                ## remove the frames with only blank lines
+                offsets = [
+                    (b, e) for b, e in offsets if XVGS_CONTENT_PATTERN.search(mm, b, e)
+                ]
+        return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+    def load_index(self, index_file: str) -> bool:
+        """load offsets of frames from index file, the first row of the index
+        stores the size and mtime of xvg file for validation
+
+        Args:
+            index_file (str): the index file
+
+        Returns:
+            bool: whether the index is valid and loaded
+        """
+        if not os.path.exists(index_file):
+            return False
+        try:
+            index = np.load(index_file)
+        except (OSError, ValueError):
+            return False
+        stat = os.stat(self.xvgfile)
+        if index.ndim != 2 or index.shape[1] != 2 or len(index) == 0:
+            return False
+        if index[0, 0] != stat.st_size or index[0, 1] != stat.st_mtime_ns:
+            return False
+        self.offsets = index[1:]
+        return True
+
+    def save_index(self, index_file: str) -> None:
+        """save offsets of frames into index file (.npy)
+
+        Args:
+            index_file (str): the index file
+        """
+        stat = os.stat(self.xvgfile)
+        head = np.array([[stat.st_size, stat.st_mtime_ns]], dtype=np.int64)
+        with open(index_file, "wb") as fo:
+            np.save(fo, np.vstack([head, self.offsets]))
+        self.info(f"save frame index of {self.xvgfile} into {index_file}")
+
+    def parse_frame(self, index: int) -> XVG:
+        """read and parse one frame from xvg file
+
+        Args:
+            index (int): the frame index
+
+        Returns:
+            XVG: the XVG of frame
+        """
+        if detect_compression(self.xvgfile) != None and not self._warned:
+            self.warn(
+                f"{self.xvgfile} is compressed, each indexed frame access decompresses "
+                + "it from the beginning. Iterate over the frames or use a slice to "
+                + "read them in one pass, or decompress the file for random access"
+            )
+            self._warned = True
+        return self.parse_frames([index])[0]
+
+    def parse_frames(self, indexes: List[int]) -> List[XVG]:
+        """read and parse frames from one file handle. Frames are read in the
+        order of offsets so that compressed streams are decompressed only once
+
+        Args:
+            indexes (List[int]): the frame indexes
+
+        Returns:
+            List[XVG]: the XVGs of frames in the order of indexes
+        """
+        frames = {}
+        with open_file(self.xvgfile, "rb") as fo:
+            for index in sorted(set(indexes), key=lambda i: self.offsets[i][0]):
+                begin, end = self.offsets[index]
+                fo.seek(begin)
+                content = fo.read(end - begin).decode()
+                frames[index] = XVG(content.splitlines(), is_file=False)
+        return [frames[index] for index in indexes]
 
     def __len__(self) -> int:
         """return the frame number"""
-        return len(self.frames)
+        return len(self.offsets)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[XVG, List[XVG]]:
+        """get one frame by frame index, or a list of frames by slice"""
+        if isinstance(index, slice):
+            return self.parse_frames(list(range(len(self))[index]))
+        if index < -len(self) or index >= len(self):
+            raise IndexError(f"frame index {index} out of range of {len(self)} frames")
+        return self.parse_frame(index)
 
-    def __getitem__(self, index: int) -> XVG:
-        """get one frame by frame index"""
-        return self.frames[index]
+    def __iter__(self) -> Iterator[XVG]:
+        """stream frames one by one from one file handle"""
+        with open_file(self.xvgfile, "rb") as fo:
+            for begin, end in self.offsets:
+                fo.seek(begin)
+                content = fo.read(end - begin).decode()
+                yield XVG(content.splitlines(), is_file=False)
@@ -385,6 +385,8 @@ class BoxMatplotlib(ParentMatplotlib):
         cmap :str
         colorbar_location:str
         mode :str
+        box_stats :List[Dict]
+        violin_stats :List[Dict]
     """
 
     def __init__(self, **kwargs) -> None:
@@ -417,23 +419,42 @@ class BoxMatplotlib(ParentMatplotlib):
                 )
 
         box_positions = [i + loc for i in range(len(kwargs["data_list"]))]
-        plt.violinplot(
-            kwargs["data_list"],
-            showmeans=False,
-            showmedians=False,
-            showextrema=False,
-            positions=box_positions,
-        )
-        plt.boxplot(
-            kwargs["data_list"],
-            sym=".",
-            meanline=True,
-            showmeans=True,
-            # patch_artist=True,
-            notch=True,
-            widths=0.1,
-            positions=box_positions,
-        )
+        if kwargs.get("box_stats") != None:
+            ## statistics precomputed by quantile sketches
+            plt.gca().violin(
+                kwargs["violin_stats"],
+                showmeans=False,
+                showmedians=False,
+                showextrema=False,
+                positions=box_positions,
+            )
+            plt.gca().bxp(
+                kwargs["box_stats"],
+                flierprops={"marker": "."},
+                meanline=True,
+                showmeans=True,
+                shownotches=True,
+                widths=0.1,
+                positions=box_positions,
+            )
+        else:
+            plt.violinplot(
+                kwargs["data_list"],
+                showmeans=False,
+                showmedians=False,
+                showextrema=False,
+                positions=box_positions,
+            )
+            plt.boxplot(
+                kwargs["data_list"],
+                sym=".",
+                meanline=True,
+                showmeans=True,
+                # patch_artist=True,
+                notch=True,
+                widths=0.1,
+                positions=box_positions,
+            )
         plt.xticks([i + 1 for i in range(len(kwargs["data_list"]))], kwargs["legends"])
 
         if kwargs["xmin"] != None or kwargs["xmax"] != None:
@@ -456,6 +456,8 @@ class BoxPlotly(ParentPlotly):
         alpha :float
         cmap :str
         mode :str
+        box_stats :List[Dict]
+        violin_stats :List[Dict]
     """
 
     def __init__(self, **kwargs) -> None:
@@ -484,17 +486,50 @@ class BoxPlotly(ParentPlotly):
                     )
                 )
 
-        for i, data in enumerate(kwargs["data_list"]):
-            self.figure.add_trace(
-                go.Violin(
-                    x=[i + loc for _ in data],
-                    y=data,
-                    x0=kwargs["legends"][i],
-                    box_visible=True,
-                    meanline_visible=True,
-                    showlegend=False,
+        if kwargs.get("box_stats") != None:
+            ## statistics precomputed by quantile sketches
+            for i, (box, violin) in enumerate(
+                zip(kwargs["box_stats"], kwargs["violin_stats"])
+            ):
+                half_width = violin["vals"] / (np.max(violin["vals"]) or 1.0) * 0.4
+                self.figure.add_trace(
+                    go.Scatter(
+                        x=np.concatenate(
+                            [i + loc - half_width, (i + loc + half_width)[::-1]]
+                        ),
+                        y=np.concatenate([violin["coords"], violin["coords"][::-1]]),
+                        fill="toself",
+                        mode="lines",
+                        showlegend=False,
+                    )
+                )
+                self.figure.add_trace(
+                    go.Box(
+                        x=[i + loc],
+                        q1=[box["q1"]],
+                        median=[box["med"]],
+                        q3=[box["q3"]],
+                        lowerfence=[box["whislo"]],
+                        upperfence=[box["whishi"]],
+                        mean=[box["mean"]],
+                        notchspan=[box["cihi"] - box["med"]],
+                        notched=True,
+                        width=0.1,
+                        showlegend=False,
+                    )
+                )
+        else:
+            for i, data in enumerate(kwargs["data_list"]):
+                self.figure.add_trace(
+                    go.Violin(
+                        x=[i + loc for _ in data],
+                        y=data,
+                        x0=kwargs["legends"][i],
+                        box_visible=True,
+                        meanline_visible=True,
+                        showlegend=False,
+                    )
                 )
-            )
         self.figure.update_xaxes(
             tickvals=[i + 1 for i in range(len(kwargs["data_list"]))],
             ticktext=kwargs["legends"],
@@ -5,10 +5,14 @@ Written by DuIvy and provided to you by GPLv3 license.
 """
 
 import argparse
+import bz2
+import gzip
 import logging
+import lzma
 import sys
 import time
-from typing import List
+from types import ModuleType
+from typing import IO, List, Union
 
 from colorama import Back, Fore, Style
 
@@ -55,6 +59,60 @@ class log(object):
         sys.exit()
 
 
+## compression modules of file suffixes
+COMPRESSIONS = {".gz": gzip, ".bz2": bz2, ".xz": lzma}
+## compression modules of magic bytes at the beginning of files
+COMPRESSION_MAGICS = {b"\x1f\x8b": gzip, b"BZh": bz2, b"\xfd7zXZ\x00": lzma}
+
+
+def detect_compression(filename: str) -> Union[ModuleType, None]:
+    """detect the compression of file by its magic bytes
+
+    Args:
+        filename (str): the file name
+
+    Returns:
+        Union[ModuleType, None]: gzip, bz2, lzma, or None for uncompressed file
+    """
+    with open(filename, "rb") as fo:
+        head = fo.read(6)
+    for magic, module in COMPRESSION_MAGICS.items():
+        if head.startswith(magic):
+            return module
+    return None
+
+
+def strip_compression_suffix(filename: str) -> str:
+    """remove the compression suffix (.gz, .bz2, .xz) of file name"""
+    for suffix in COMPRESSIONS:
+        if filename.endswith(suffix):
+            return filename[: -len(suffix)]
+    return filename
+
+
+def open_file(filename: str, mode: str = "r") -> IO:
+    """open file in text ("r", "w") or binary ("rb", "wb") mode. Compressed
+    files are detected by magic bytes for reading, and output files with suffix
+    .gz, .bz2 or .xz are compressed for writing, both in streaming way.
+
+    Args:
+        filename (str): the file name
+        mode (str, optional): "r", "rb", "w", or "wb". Defaults to "r".
+
+    Returns:
+        IO: the opened file object
+    """
+    if mode.startswith("r"):
+        module = detect_compression(filename)
+    else:
+        module = COMPRESSIONS.get(filename[len(strip_compression_suffix(filename)) :])
+    if module == None:
+        return open(filename, mode)
+    if "b" in mode:
+        return module.open(filename, mode)
+    return module.open(filename, mode + "t")
+
+
 class Parameters(log):
     """A class to deal with and store user-input parameters"""
 
@@ -178,8 +236,76 @@ class Parameters(log):
             default=0.95,
             help="confidence for confidence interval calculation, default to 0.95",
         )
+        parser.add_argument(
+            "--mv_center",
+            action="store_true",
+            help="use centered windows for moving average calculation, instead of the windows before each point",
+        )
+        parser.add_argument(
+            "--mv_method",
+            type=str,
+            default="mean",
+            choices=["mean", "median"],
+            help="the method for moving average calculation: 'mean' with normal confidence intervals, or 'median' with quantile intervals, default to 'mean'",
+        )
+        parser.add_argument(
+            "--bin_method",
+            type=str,
+            default="fixed",
+            choices=["fixed", "quantile", "fd"],
+            help="the binning method for 'xvg_show_distribution': 'fixed' for bins of equal width, 'quantile' for bins of equal counts, 'fd' for the Freedman-Diaconis rule of bin width, default to 'fixed'",
+        )
+        parser.add_argument(
+            "--kde_points",
+            type=int,
+            default=1024,
+            help="the max number of grid points for kernel density estimation of 'xvg_show_distribution', default to 1024",
+        )
+        parser.add_argument(
+            "--nlevels",
+            type=int,
+            default=None,
+            help="the number of levels to quantize values of Continuous xpm for output, like the -nlevels of gmx. Default to None for keeping all distinct values",
+        )
+        parser.add_argument(
+            "--level_method",
+            type=str,
+            default="linear",
+            choices=["linear", "symmetric", "quantile"],
+            help="the spacing of levels for --nlevels: 'linear' from min to max, 'symmetric' around zero, 'quantile' for equal number of pixels in each level. Default to linear",
+        )
+        parser.add_argument(
+            "--mask_threshold",
+            type=float,
+            default=None,
+            help="mask the values whose absolute values are less than the threshold to 0 in output xpm of 'xpm_calc'",
+        )
+        parser.add_argument(
+            "--sketch_size",
+            type=int,
+            default=None,
+            help="the size of quantile sketch for 'xvg_box_compare' to calculate box and violin statistics in one streaming pass with bounded memory, the rank error is about 2/sketch_size. Default to None for using all data",
+        )
+        parser.add_argument(
+            "--max_points",
+            type=int,
+            default=None,
+            help="the max number of points of each line for visualizers of 'xvg_show' and 'xvg_compare', default to twice of the output width in pixels of plot engine, 0 for no downsampling. For 'xvg_show_scatter', the max number of scatters before switching to density mode, default to 100000, 0 for never switching",
+        )
+        parser.add_argument(
+            "--downsample",
+            type=str,
+            default="minmax",
+            choices=["minmax", "lttb"],
+            help="the downsampling method of lines: 'minmax' keeps the minimum and maximum of each pixel, 'lttb' for Largest-Triangle-Three-Buckets, default to 'minmax'",
+        )
         parser.add_argument("--alpha", type=float, help="the alpha of figure items")
-        parser.add_argument("-csv", "--csv", type=str, help="store data into csv file")
+        parser.add_argument(
+            "-csv",
+            "--csv",
+            type=str,
+            help="store data into csv file, or into numpy npz file if the file name ends with .npz",
+        )
         parser.add_argument(
             "-eg",
             "--engine",
@@ -219,14 +345,21 @@ class Parameters(log):
                 "AllAtoms",
                 "pdf",
                 "cdf",
+                "block",
+                "autocorr",
+                "density",
+                "sum",
+                "mean",
+                "std",
+                "diff",
             ],
-            help="additional parameter: 'withoutScatter' will NOT show scatter plot for 'xvg_box_compare'; 'imshow', 'pcolormesh', '3d', 'contour' were used for 'xpm_show' command; 'AllAtoms' were used for 'find_center' command; 'cdf' and 'pdf' are for 'xvg_show_distribution' command;",
+            help="additional parameter: 'withoutScatter' will NOT show scatter plot for 'xvg_box_compare'; 'imshow', 'pcolormesh', '3d', 'contour' were used for 'xpm_show' command; 'AllAtoms' were used for 'find_center' command; 'cdf' and 'pdf' are for 'xvg_show_distribution' command; 'block' and 'autocorr' are for 'xvg_ave' command to estimate std.err of averages by block averaging or autocorrelation time; 'density' is for 'xvg_show_scatter' to rasterize scatters into 2D grid image; 'sum', 'mean', 'std', and 'diff' are for 'xpm_calc' command;",
         )
         parser.add_argument(
             "-al",
             "--additional_list",
             nargs="+",
-            help="additional parameters. Used to set xtitles for 'xvg_ave_bar'",
+            help="additional parameters. Used to set xtitles for 'xvg_ave_bar', and the second set of xpm files for 'diff' mode of 'xpm_calc'",
         )
         parser.add_argument(
             "-ip",
@@ -242,6 +375,50 @@ class Parameters(log):
             default=10,
             help="specify the interpolation fold, default to 10",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="specify the number of processes for parsing multiple input files, or the number of threads for interpolation of 'xpm_show', default to 1",
+        )
+        parser.add_argument(
+            "--cache_dir",
+            type=str,
+            default=None,
+            help="specify a directory to cache parsed xvg and xpm files for faster loading next time, default to the environment variable DIT_CACHE_DIR (no cache if not set)",
+        )
+        parser.add_argument(
+            "--cache_size",
+            type=float,
+            default=None,
+            help="specify the size limit (MB) of cache directory, least recently used files will be removed, default to the environment variable DIT_CACHE_SIZE or 1024",
+        )
+        parser.add_argument(
+            "--align",
+            type=str,
+            default="index",
+            choices=["index", "time", "interp"],
+            help="the method to align rows of 'xvg_combine': 'index' pairs rows by index, 'time' joins rows with the same time within tolerance, 'interp' interpolates data onto the time of the first file or a regular grid, default to 'index'",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.0,
+            help="the max time difference of rows to be joined in 'time' align mode of 'xvg_combine', default to 0",
+        )
+        parser.add_argument(
+            "--resample",
+            type=float,
+            default=None,
+            help="the time step of the regular grid to resample data in 'interp' align mode of 'xvg_combine'",
+        )
+        parser.add_argument(
+            "--chunk_rows",
+            type=int,
+            default=None,
+            help="process xvg files chunk by chunk with N rows per chunk in constant memory, available for 'xvg_ave', 'xvg_show_distribution' and 'xvg_combine'. 'xvg_show_distribution' reads files 2 times ('fixed' bins) or 3 times ('quantile' and 'fd' bins)",
+        )
 
         args = parser.parse_args()
         self.__dict__ = args.__dict__
@@ -304,3 +481,23 @@ class Parameters(log):
             self.error("parameter 'y_precision' should not be a minus")
         if self.z_precision and self.z_precision < 0:
             self.error("parameter 'z_precision' should not be a minus")
+        if self.jobs < 1:
+            self.error("parameter 'jobs' should be a positive integer")
+        if self.cache_size != None and self.cache_size <= 0:
+            self.error("parameter 'cache_size' should be a positive number")
+        if self.kde_points < 2:
+            self.error("parameter 'kde_points' should be an integer larger than 1")
+        if self.nlevels != None and self.nlevels < 2:
+            self.error("parameter 'nlevels' should be an integer larger than 1")
+        if self.mask_threshold != None and self.mask_threshold < 0:
+            self.error("parameter 'mask_threshold' should not be a negative number")
+        if self.sketch_size != None and self.sketch_size < 8:
+            self.error("parameter 'sketch_size' should be an integer not less than 8")
+        if self.max_points != None and self.max_points < 0:
+            self.error("parameter 'max_points' should not be a negative integer")
+        if self.tolerance < 0:
+            self.error("parameter 'tolerance' should not be a minus")
+        if self.resample != None and self.resample <= 0:
+            self.error("parameter 'resample' should be a positive number")
+        if self.chunk_rows != None and self.chunk_rows <= 0:
+            self.error("parameter 'chunk_rows' should be a positive integer")
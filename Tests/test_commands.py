@@ -0,0 +1,340 @@
+## author : charlie
+## date : 20261017
+
+import os
+import shutil
+import sys
+from types import SimpleNamespace
+
+import matplotlib.cbook as cbook
+import numpy as np
+import pytest
+from scipy.stats import gaussian_kde
+
+sys.path.append("../DuIvyTools/DuIvyTools/")
+from Commands.Commands import Command
+from Commands.quantileSketch import QuantileSketch
+from Commands.xpmCommands import xpm_calc, xpm_show
+from Commands.xvgCommands import (
+    xvg_combine,
+    xvg_energy_compute,
+    xvg_rama,
+    xvg_show_distribution,
+    xvg_box_compare,
+    xvg_show_scatter,
+)
+from FileParser.xpmParser import XPM
+from FileParser.xvgParser import XVG
+from utils import Parameters
+
+
+def test_load_xvgs_parallel():
+    xvgfiles = ["xvg_test/gyrate.xvg", "xvg_test/rmsd.xvg", "xvg_test/rama.xvg"]
+    cmd = Command()
+    cmd.parm = SimpleNamespace(jobs=3)
+    xvgs = cmd.load_xvgs(xvgfiles, [[0, 1], [1], [0]])
+    for xvgfile, xvg in zip(xvgfiles, xvgs):
+        origin = XVG(xvgfile)
+        assert xvg.xvgfile == xvgfile
+        assert xvg.data_heads == origin.data_heads
+        assert np.array_equal(xvg.data_columns[1], origin.data_columns[1])
+        assert xvg.data.flags.f_contiguous
+    assert xvgs[2].data_columns[2][:2] == ["VAL-18", "PHE-19"]
+
+
+def test_load_xvgs_errors():
+    cmd = Command()
+    cmd.parm = SimpleNamespace(jobs=2)
+    with pytest.raises(SystemExit):
+        cmd.load_xvgs(["xvg_test/gyrate.xvg", "xvg_test/not_exist.xvg"])
+
+
+def test_calc_distributions():
+    xvg = XVG("xvg_test/gyrate.xvg")
+    datas = [xvg.data_columns[1], xvg.data_columns[2]]
+    cmd = xvg_show_distribution(SimpleNamespace(bin_method="fixed", chunk_rows=500))
+    xdata_list, data_list = cmd.calc_distributions(datas, 50)
+    counts, edges = np.histogram(datas[1], bins=50, range=(np.min(datas), np.max(datas)))
+    assert np.allclose(xdata_list[1], edges[:-1])
+    assert np.allclose(data_list[1], counts * 100.0 / len(datas[1]))
+    cmd.parm.columns = [[1, 2]]
+    chunk_xdata_list, chunk_data_list = cmd.calc_distributions_by_chunks(
+        [XVG("xvg_test/gyrate.xvg", load_data=False)], None, None, 1, 50
+    )
+    assert chunk_xdata_list == xdata_list and chunk_data_list == data_list
+
+    ## chunked and in-memory paths count the same values for Freedman-Diaconis rule
+    cmd.parm.bin_method = "fd"
+    datas = [xvg.data_columns[c] for c in range(1, 5)]
+    xdata_list, data_list = cmd.calc_distributions(datas, 50)
+    cmd.parm.columns = [[1, 2, 3, 4]]
+    chunk_xdata_list, chunk_data_list = cmd.calc_distributions_by_chunks(
+        [XVG("xvg_test/gyrate.xvg", load_data=False)], None, None, 1, 50
+    )
+    assert len(chunk_xdata_list[0]) == len(xdata_list[0])
+    assert np.allclose(chunk_xdata_list, xdata_list)
+
+    cmd.parm.bin_method = "quantile"
+    xdata_list, data_list = cmd.calc_distributions(datas[:1], 4)
+    assert np.allclose(data_list[0], 25.0, atol=0.1)
+
+    ## non-finite values and values out of edges are dropped as np.histogram does
+    edges = np.linspace(0, 1, 5)
+    values = np.array([-0.5, 0.0, 0.3, np.nan, 1.0, 1.5, np.inf])
+    for uniform in [True, False]:
+        counts = cmd.count_bins(values, 0, 1, edges, uniform)
+        assert counts.tolist() == [np.histogram(values, edges)[0].tolist()]
+    cmd.parm.bin_method = "fixed"
+    data = np.array([0.0, 1.0, np.nan, 2.0, np.inf, 3.0])
+    xdata_list, data_list = cmd.calc_distributions([data], 3)
+    assert xdata_list == [[0.0, 1.0, 2.0]] and np.allclose(data_list, [[25, 25, 50]])
+
+
+def test_calc_density():
+    rng = np.random.default_rng(0)
+    data = np.concatenate([rng.normal(0, 1, 3000), rng.normal(5, 0.5, 2000)])
+    kernel = gaussian_kde(data)
+    cmd = xvg_show_distribution(SimpleNamespace(kde_points=512))
+    xdata, pdf = cmd.calc_density(data, "pdf")
+    assert len(xdata) == 512 and xdata[0] == np.min(data)
+    assert np.allclose(pdf, kernel.pdf(xdata), atol=1e-4)
+    xdata, cdf = cmd.calc_density(data, "cdf")
+    for i in [0, 200, 511]:
+        assert np.isclose(cdf[i], kernel.integrate_box_1d(-np.inf, xdata[i]), atol=1e-4)
+
+
+def test_downsample():
+    rng = np.random.default_rng(0)
+    xdata = np.arange(100000) * 0.1
+    ydata = np.cumsum(rng.normal(size=100000))
+    ydata[:10] = np.nan
+    kwargs = {
+        "xdata_list": [xdata, xdata[:100]],
+        "data_list": [ydata, ydata[:100]],
+        "highs": [ydata + 1, ydata[:100] + 1],
+        "lows": [ydata - 1, ydata[:100] - 1],
+    }
+    cmd = Command()
+    cmd.parm = SimpleNamespace(engine="matplotlib", max_points=1000, downsample="minmax")
+    results = cmd.downsample(kwargs)
+    assert len(results["data_list"][0]) <= 1000
+    assert np.nanmax(results["data_list"][0]) == np.nanmax(ydata)
+    assert np.nanmin(results["data_list"][0]) == np.nanmin(ydata)
+    assert np.nanmax(results["highs"][0]) == np.nanmax(ydata) + 1
+    assert results["data_list"][1] is kwargs["data_list"][1]
+    assert kwargs["data_list"][0] is ydata
+
+    cmd.parm.downsample = "lttb"
+    results = cmd.downsample(kwargs)
+    assert len(results["data_list"][0]) == 1000
+    assert results["xdata_list"][0][-1] == xdata[-1]
+    assert np.all(np.diff(results["xdata_list"][0]) > 0)
+    assert len(results["lows"][0]) == 1000
+
+
+def test_energy_compute_triplets(tmp_path, monkeypatch):
+    xvgfiles = [
+        os.path.abspath(f"xvg_test/{name}_energy.xvg") for name in ["prolig", "pro", "lig"]
+    ]
+    monkeypatch.chdir(tmp_path)
+    parm = SimpleNamespace(
+        input=xvgfiles * 2, output="energy.xvg", jobs=2, title=None,
+        xlabel=None, ylabel=None, z_precision=None,
+    )
+    xvg_energy_compute(parm)()
+    expected = XVG(os.path.join(os.path.dirname(xvgfiles[0]), "energy_compute.xvg"))
+    for name in ["energy_1.xvg", "energy_2.xvg"]:
+        xvg = XVG(name)
+        assert xvg.data_heads[:7] == expected.data_heads[:7]
+        assert np.allclose(xvg.data, expected.data, atol=1e-5)
+    xpm = XPM("energy.xpm")
+    assert (xpm.width, xpm.height) == (expected.row_num, 2)
+    assert np.allclose(xpm.value_matrix[0], np.round(expected.data_columns[-1], 1))
+
+
+def test_combine_align(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("a.xvg", "w") as fo:
+        fo.write('@ s0 legend "a"\n' + "".join(f"{t} {t * 2}\n" for t in range(0, 100, 2)))
+    with open("b.xvg", "w") as fo:
+        fo.write('@ s0 legend "b"\n' + "".join(f"{t + 0.5} {t}\n" for t in range(10, 200, 3)))
+    parm = SimpleNamespace(
+        input=["a.xvg", "b.xvg"], columns=[[0, 1], [1]], output=None, legends=None,
+        title=None, xlabel=None, ylabel=None, begin=None, end=None, dt=1,
+        yshrink=1.0, chunk_rows=7, jobs=1, align="time", tolerance=0.5, resample=None,
+    )
+    xvg_combine(parm)()
+    xvg = XVG("dit_xvg_combine.xvg")
+    assert list(xvg.data_columns[0]) == [t for t in range(10, 100, 2) if (t - 10) % 3 != 2]
+    assert np.allclose(np.array(xvg.data_columns[0]) - xvg.data_columns[2], 0.5, atol=0.5)
+
+    parm.output, parm.align, parm.resample = "interp.xvg", "interp", 4.0
+    xvg_combine(parm)()
+    xvg = XVG("interp.xvg")
+    assert list(xvg.data_columns[0]) == list(np.arange(10.5, 98, 4.0))
+    assert np.allclose(xvg.data_columns[1], np.array(xvg.data_columns[0]) * 2)
+    assert np.allclose(xvg.data_columns[2], np.array(xvg.data_columns[0]) - 0.5)
+
+
+def test_rama(tmp_path, capsys):
+    pref_file = "../DuIvyTools/DuIvyTools/data/ramachandran/pref_general"
+    cmd = xvg_rama(SimpleNamespace())
+    grid = cmd.load_rama_pref(pref_file)
+    assert isinstance(grid, np.memmap) and grid.shape == (180, 180)
+    shutil.copy(pref_file + ".data", tmp_path / "pref_general.data")
+    assert np.array_equal(grid, cmd.load_rama_pref(str(tmp_path / "pref_general")))
+    table = np.loadtxt(pref_file + ".data", comments="#")
+    assert grid[(-177 + 179) // 2, (-179 + 179) // 2] == table[1, 2]
+
+    cmd.parm = SimpleNamespace(
+        input=["xvg_test/rama.xvg"], engine="matplotlib", output=str(tmp_path / "rama.png"),
+        noshow=True, xlabel=None, ylabel=None, title=None, x_precision=None, y_precision=None,
+    )
+    cmd()
+    out = capsys.readouterr().out
+    assert "General                    7778                  565" in out
+    assert "GLY                        1799                  226" in out
+
+
+def test_calc_density_grid():
+    rng = np.random.default_rng(0)
+    xdata, ydata = rng.normal(size=20000), rng.uniform(-1, 1, 20000)
+    zdata = xdata + ydata
+    cmd = xvg_show_scatter(SimpleNamespace(xmin=None, xmax=None, ymin=-1.0, ymax=1.0))
+    xcenters, ycenters, grid = cmd.calc_density_grid(xdata, ydata, None, [40, 20])
+    counts, xedges, yedges = np.histogram2d(
+        xdata, ydata, bins=[40, 20], range=[[xdata.min(), xdata.max()], [-1, 1]]
+    )
+    assert np.allclose(xcenters, (xedges[:-1] + xedges[1:]) / 2)
+    assert np.allclose(ycenters, (yedges[:-1] + yedges[1:]) / 2)
+    assert np.array_equal(np.nan_to_num(grid), counts.T)
+    assert np.all(np.isnan(grid[counts.T == 0]))
+
+    _, _, grid = cmd.calc_density_grid(xdata, ydata, zdata, [40, 20])
+    sums, _, _ = np.histogram2d(
+        xdata, ydata, bins=[40, 20], range=[[xdata.min(), xdata.max()], [-1, 1]],
+        weights=zdata,
+    )
+    mask = counts.T > 0
+    assert np.allclose(grid[mask], sums.T[mask] / counts.T[mask])
+
+
+def test_quantile_sketch():
+    rng = np.random.default_rng(0)
+    data = rng.gamma(2.0, 1.0, 150)
+    sketch = QuantileSketch(200)
+    sketch.update(data)
+    expected = cbook.boxplot_stats(data)[0]
+    stats = sketch.box_stats()
+    for key in ["mean", "med", "q1", "q3", "cilo", "cihi", "whislo", "whishi"]:
+        assert np.isclose(stats[key], expected[key])
+    assert np.allclose(stats["fliers"], np.sort(expected["fliers"]))
+
+    data = rng.normal(size=1000000)
+    sketch = QuantileSketch(200)
+    for s in range(0, len(data), 50000):
+        sketch.update(data[s : s + 50000])
+    assert sum(len(items) for items in sketch.levels) <= 3 * 200
+    assert sketch.count == len(data) and np.sum(sketch.items()[1]) == len(data)
+    assert np.isclose(sketch.std, np.std(data, ddof=1))
+    qs = np.linspace(0.01, 0.99, 99)
+    ranks = np.searchsorted(np.sort(data), sketch.quantile(qs)) / len(data)
+    assert np.max(np.abs(ranks - qs)) < 0.02
+    violin = sketch.violin_stats()
+    assert violin["min"] == np.min(data) and violin["max"] == np.max(data)
+    area = np.sum(np.diff(violin["coords"]) * (violin["vals"][1:] + violin["vals"][:-1]))
+    assert np.isclose(area / 2, 1.0, atol=0.01)
+
+
+@pytest.mark.parametrize("engine", ["matplotlib", "plotly", "gnuplot", "plotext"])
+def test_box_compare_sketch(tmp_path, monkeypatch, engine):
+    xvgfiles = [os.path.abspath(f"xvg_test/{name}.xvg") for name in ["gyrate", "rmsd"]]
+    monkeypatch.chdir(tmp_path)
+    argv = ["dit", "xvg_box_compare", "-f", *xvgfiles, "-c", "1,2", "1"]
+    argv += ["--sketch_size", "50", "-eg", engine, "-ns", "-o", "box.png"]
+    monkeypatch.setattr(sys, "argv", argv)
+    if engine == "plotext":
+        with pytest.raises(SystemExit):
+            xvg_box_compare(Parameters())()
+        return
+    xvg_box_compare(Parameters())()
+    if engine == "gnuplot":
+        gpl_files = [f for f in os.listdir() if f.endswith(".gnu")]
+        with open(gpl_files[0]) as fo:
+            assert fo.read().count("EOD") == 6
+
+
+def test_dump_columns(tmp_path):
+    cmd = Command()
+    columns = [np.arange(5) * 0.5, np.arange(3) + 0.25, [np.nan, 1.0]]
+    cmd.dump_columns(["x", "y", "z"], columns, str(tmp_path / "out.csv"), rows=2)
+    with open(tmp_path / "out.csv") as fo:
+        lines = fo.read().splitlines()
+    assert lines[0] == "x,y,z"
+    assert lines[1] == "0.00000000,0.25000000,nan"
+    assert lines[3] == "1.00000000,2.25000000,"
+    assert lines[5] == "2.00000000,,"
+    assert len(lines) == 6
+
+    cmd.dump_columns(["x", "y", "z"], columns, str(tmp_path / "out.npz"))
+    npz = np.load(tmp_path / "out.npz")
+    assert list(npz["heads"]) == ["x", "y", "z"]
+    assert np.array_equal(npz["column_1"], columns[1])
+
+
+def test_xpm_calc(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(3)
+    stacks = []
+    for group in ["a", "b"]:
+        stacks.append(np.round(rng.uniform(-1, 1, (3, 8, 9)), 3))
+        for i, values in enumerate(stacks[-1]):
+            xpm = XPM("", is_file=False, new_file=True)
+            xpm.type, xpm.width, xpm.height = "Continuous", 9, 8
+            xpm.xaxis, xpm.yaxis = list(range(1, 10)), list(range(8, 0, -1))
+            xpm.value_matrix = values
+            xpm.refresh_by_value_matrix()
+            xpm.save(f"{group}{i}.xpm")
+    parm = SimpleNamespace(
+        input=[f"a{i}.xpm" for i in range(3)], additional_list=[f"b{i}.xpm" for i in range(3)],
+        mode="diff", output="diff.xpm", title=None, xlabel=None, ylabel=None,
+        zlabel=None, xshrink=1.0, yshrink=1.0, zshrink=1.0, mask_threshold=0.2,
+    )
+    xpm_calc(parm)()
+    diff = stacks[0].mean(axis=0) - stacks[1].mean(axis=0)
+    xpm = XPM("diff.xpm")
+    assert np.allclose(xpm.value_matrix, np.where(np.abs(diff) < 0.2, 0, diff), atol=1e-6)
+    assert xpm.xaxis == list(range(1, 10)) and xpm.yaxis == list(range(8, 0, -1))
+
+    parm.mode, parm.output, parm.mask_threshold, parm.nlevels = "std", "std.xpm", None, 10
+    xpm_calc(parm)()
+    xpm = XPM("std.xpm")
+    assert xpm.color_num <= 10
+    expected = stacks[0].std(axis=0, ddof=1)
+    assert np.all(np.abs(xpm.value_matrix - expected) <= np.ptp(expected) / 20 + 1e-5)
+
+
+@pytest.mark.parametrize("method", ["nearest", "linear", "cubic", "quintic"])
+def test_xpm_show_interpolation(method):
+    xaxis = np.linspace(0, 3, 40)
+    yaxis = np.linspace(2, -1, 30)  # top to bottom
+    matrix = np.add.outer(yaxis**3, xaxis * yaxis.max()) + np.outer(yaxis, xaxis)
+    cmd = xpm_show(SimpleNamespace(engine="plotly", jobs=3))
+    x_new, y_new, matrix_new = cmd.calc_interpolation(
+        xaxis.tolist(), yaxis.tolist(), matrix.tolist(), method, 4
+    )
+    assert matrix_new.shape == (120, 160) and np.all(np.diff(y_new) > 0)
+    expected = np.add.outer(y_new**3, x_new * yaxis.max()) + np.outer(y_new, x_new)
+    if method == "nearest":
+        assert set(np.unique(matrix_new)) <= set(matrix.ravel())
+    else:
+        tolerance = {"linear": 0.02, "cubic": 1e-8, "quintic": 1e-8}[method]
+        assert np.allclose(matrix_new, expected, atol=tolerance)
+
+    ## grid is capped at the resolution of engine
+    x_new, y_new, matrix_new = cmd.calc_interpolation(
+        xaxis.tolist(), yaxis.tolist(), matrix.tolist(), method, 100
+    )
+    assert matrix_new.shape == (1920, 1920)
+    with pytest.raises(SystemExit):
+        cmd.calc_interpolation(xaxis, yaxis, matrix, "hhh", 2)
@@ -0,0 +1,209 @@
+## author : charlie
+## date : 20261017
+
+import gzip
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append("../DuIvyTools/DuIvyTools/")
+from FileParser.xpmParser import XPM, XPMS
+
+
+def make_xpm(chars, notes, rows, type="Continuous"):
+    cpp = len(chars[0])
+    content = f'/* XPM */\n/* title: "t" */\n/* legend: "v" */\n/* type: "{type}" */\n'
+    content += "static char *gromacs_xpm[] = {\n"
+    content += f'"{len(rows[0]) // cpp} {len(rows)} {len(chars)} {cpp}",\n'
+    for i, (char, note) in enumerate(zip(chars, notes)):
+        content += f'"{char}  c #{i:06X} " /* "{note}" */,\n'
+    content += "/* x-axis: " + " ".join(str(i) for i in range(len(rows[0]) // cpp)) + " */\n"
+    content += "/* y-axis: " + " ".join(str(i) for i in range(len(rows))) + " */\n"
+    content += "".join(f'"{row}",\n' for row in rows)
+    return content
+
+
+@pytest.mark.parametrize("xpmfile", ["xpm_test/dssp.xpm", "xpm_test/gibbs.xpm"])
+def test_xpm_parse(xpmfile):
+    xpm = XPM(xpmfile)
+    cpp = xpm.char_per_pixel
+    assert isinstance(xpm.value_matrix, np.ndarray)
+    assert xpm.value_matrix.shape == (xpm.height, xpm.width)
+    for y in [0, xpm.height // 2, xpm.height - 1]:
+        dots = [xpm.datalines[y][i : i + cpp] for i in range(0, xpm.width * cpp, cpp)]
+        assert xpm.dot_matrix[y] == dots
+        indexs = [xpm.chars.index(dot) for dot in dots]
+        if xpm.type == "Continuous":
+            assert list(xpm.value_matrix[y]) == [xpm.notes[i] for i in indexs]
+        else:
+            assert list(xpm.value_matrix[y]) == indexs
+
+
+def test_xpm_parse_multi_chars():
+    chars = ["aa ", "a#b", "zab", "aa "]
+    rows = ["a#bzab" + "aa ", "zaba#b" + "a#b"]
+    xpm = XPM(make_xpm(chars, [0.5, 1.5, 2.5, 3.5], rows), is_file=False)
+    assert xpm.value_matrix.tolist() == [[1.5, 2.5, 0.5], [2.5, 1.5, 1.5]]
+    assert xpm.dot_matrix[1] == ["zab", "a#b", "a#b"]
+
+    xpm = XPM(make_xpm(["A", "B"], ["x", "y"], ["ABBA"], "Discrete"), is_file=False)
+    assert xpm.value_matrix.tolist() == [[0, 1, 1, 0]]
+
+    with pytest.raises(SystemExit):
+        XPM(make_xpm(["AB", "CD"], [0, 1], ["ABCDAC"]), is_file=False)
+
+
+def test_xpm_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("DIT_CACHE_DIR", str(tmp_path / "cache"))
+    xpmfile = str(tmp_path / "test.xpm")
+    rows = ["ABC" * 100, "CBA" * 100]
+    with open(xpmfile, "w") as fo:
+        fo.write(make_xpm(["A", "B", "C"], [1, 2, 3], rows))
+    xpm = XPM(xpmfile)
+    entries = os.listdir(tmp_path / "cache")
+    assert len(entries) == 1
+    ## datalines are stored as array instead of json metadata
+    with open(tmp_path / "cache" / entries[0] / "meta.json") as fo:
+        assert "ABCABC" not in fo.read()
+    cached = XPM(xpmfile)
+    assert isinstance(cached.value_matrix, np.memmap)
+    assert np.array_equal(cached.value_matrix, xpm.value_matrix)
+    assert cached.datalines == rows
+    assert cached.dot_matrix[1][:3] == ["C", "B", "A"]
+    cached.value_matrix[0][0] = 5
+    assert xpm.value_matrix[0][0] == 1 and XPM(xpmfile).value_matrix[0][0] == 1
+    ## stale entry is invalidated after the file changed
+    with open(xpmfile, "w") as fo:
+        fo.write(make_xpm(["A", "B", "C"], [1, 2, 3], ["CCC", "AAA"]))
+    changed = XPM(xpmfile)
+    assert not isinstance(changed.value_matrix, np.memmap)
+    assert changed.value_matrix.tolist() == [[3, 3, 3], [1, 1, 1]]
+
+
+def test_xpm_refresh_by_value_matrix(tmp_path):
+    xpm = XPM("", is_file=False, new_file=True)
+    xpm.type, xpm.width, xpm.height = "Continuous", 3, 2
+    xpm.xaxis, xpm.yaxis = [1, 2, 3], [2, 1]
+    xpm.value_matrix = [[0.5, -1.0, 0.5], [2.0, -1.0, 0.25]]
+    xpm.refresh_by_value_matrix()
+    assert xpm.notes == [-1.0, 0.25, 0.5, 2.0]
+    assert xpm.chars == ["a", "b", "c", "d"] and xpm.char_per_pixel == 1
+    assert xpm.datalines == ["cac", "dab"]
+    assert xpm.dot_matrix[1] == ["d", "a", "b"]
+
+    xpm.value_matrix = [["H", "E", "E"], ["~", "H", "~"]]
+    xpm.refresh_by_value_matrix(is_Continuous=False)
+    assert xpm.notes == ["E", "H", "~"]
+    assert xpm.value_matrix.tolist() == [[1, 0, 0], [2, 1, 2]]
+
+    rng = np.random.default_rng(0)
+    xpm.type, xpm.width, xpm.height = "Continuous", 800, 700
+    xpm.xaxis, xpm.yaxis = list(range(800)), list(range(700))
+    xpm.value_matrix = rng.permutation(560000).reshape(700, 800) * 0.5
+    xpm.refresh_by_value_matrix()
+    assert xpm.char_per_pixel == 4 and xpm.chars[81] == "aabb"
+    xpm.save(str(tmp_path / "large.xpm"))
+    assert np.array_equal(XPM(str(tmp_path / "large.xpm")).value_matrix, xpm.value_matrix)
+
+
+@pytest.mark.parametrize("method", ["linear", "symmetric", "quantile"])
+def test_xpm_refresh_by_levels(tmp_path, method):
+    rng = np.random.default_rng(1)
+    xpm = XPM("", is_file=False, new_file=True)
+    xpm.type, xpm.width, xpm.height = "Continuous", 300, 200
+    xpm.xaxis, xpm.yaxis = list(range(300)), list(range(200))
+    values = rng.normal(0.2, 1.0, (200, 300))
+    xpm.value_matrix = values
+    xpm.refresh_by_value_matrix(nlevels=16, level_method=method)
+    assert xpm.color_num == len(xpm.notes) <= 16 and xpm.char_per_pixel == 1
+    assert set(np.unique(xpm.value_matrix)) <= set(xpm.notes)
+    if method == "symmetric":
+        assert xpm.notes[0] == pytest.approx(-xpm.notes[-1], rel=1e-5)
+    if method == "quantile":
+        counts = np.unique(xpm.value_matrix, return_counts=True)[1]
+        assert np.all(np.abs(counts - values.size / 16) <= 1)
+    else:
+        ## each pixel falls into the equal width level which covers it
+        width = np.max(np.diff(xpm.notes))
+        assert np.all(np.abs(xpm.value_matrix - values) <= width / 2 + 1e-5)
+    xpm.save(str(tmp_path / "levels.xpm"))
+    saved = XPM(str(tmp_path / "levels.xpm"))
+    assert np.array_equal(saved.value_matrix, xpm.value_matrix)
+
+    xpm.value_matrix = np.full((200, 300), 1.5)
+    xpm.refresh_by_value_matrix(nlevels=16, level_method=method)
+    assert xpm.notes == [1.5]
+
+    ## narrow range compared to its magnitude
+    xpm.value_matrix = 1000.0001 + values * 1e-5
+    xpm.refresh_by_value_matrix(nlevels=16, level_method=method)
+    assert len(set(xpm.notes)) == len(xpm.notes) == xpm.color_num
+    xpm.save(str(tmp_path / "narrow.xpm"))
+    saved = XPM(str(tmp_path / "narrow.xpm"))
+    assert np.array_equal(saved.value_matrix, xpm.value_matrix)
+
+
+def test_xpm_algebra():
+    rng = np.random.default_rng(2)
+    stack = np.round(rng.uniform(-1, 1, (5, 6, 7)), 3)
+    xpms = []
+    for values in stack:
+        xpm = XPM("", is_file=False, new_file=True)
+        xpm.type, xpm.width, xpm.height = "Continuous", 7, 6
+        xpm.xaxis, xpm.yaxis = list(range(7)), list(range(6))
+        xpm.value_matrix = values
+        xpm.refresh_by_value_matrix()
+        xpms.append(xpm)
+    assert np.allclose((xpms[0] - xpms[1]).value_matrix, stack[0] - stack[1])
+    assert np.allclose((xpms[0] + xpms[1]).value_matrix, stack[0] + stack[1])
+    assert np.allclose((2 * xpms[0]).value_matrix, stack[0] * 2)
+    masked = xpms[0].mask(0.5)
+    assert np.array_equal(
+        masked.value_matrix, np.where(np.abs(stack[0]) < 0.5, 0.0, stack[0])
+    )
+    for method, expected in [
+        ("sum", stack.sum(axis=0)),
+        ("mean", stack.mean(axis=0)),
+        ("std", stack.std(axis=0, ddof=1)),
+    ]:
+        out = XPM.calc_stats(iter(xpms), method)
+        assert np.allclose(out.value_matrix, expected, atol=1e-6)
+        assert out.notes == sorted(set(out.value_matrix.ravel().tolist()))
+
+    xpms[1].width, xpms[1].height = 6, 7
+    with pytest.raises(SystemExit):
+        XPM.calc_stats(xpms)
+    xpms[1].type = "Discrete"
+    with pytest.raises(SystemExit):
+        xpms[0] + xpms[1]
+
+
+@pytest.mark.parametrize("suffix", [".xpm", ".xpm.gz"])
+def test_xpms_frames(tmp_path, suffix):
+    rng = np.random.default_rng(4)
+    frames = []
+    for t in range(0, 50, 10):
+        rows = ["".join(rng.choice(["A", "B", "C"], 6)) for _ in range(4)]
+        frames.append(make_xpm(["A", "B", "C"], [1, 2, 3], rows).replace('"t"', f'"t={t}ps"'))
+    xpmfile = str(tmp_path / f"frames{suffix}")
+    with (gzip.open if suffix.endswith(".gz") else open)(xpmfile, "wt") as fo:
+        fo.write("".join(frames))
+    xpms = XPMS(xpmfile)
+    assert len(xpms) == 5
+    assert xpms.get_time_series() == [0, 10, 20, 30, 40]
+    expected = [XPM(frame, is_file=False) for frame in frames]
+    assert [xpm.datalines for xpm in xpms] == [xpm.datalines for xpm in expected]
+    assert np.array_equal(xpms[-1].value_matrix, expected[4].value_matrix)
+    loaded = xpms.load_frames([3, 1], jobs=2)
+    assert [xpm.title for xpm in loaded] == ["t=30ps", "t=10ps"]
+    assert [xpm.title for xpm in xpms.load_frames([4, 0, 4])] == ["t=40ps", "t=0ps", "t=40ps"]
+    assert np.array_equal(loaded[1].value_matrix, expected[1].value_matrix)
+    assert [xpm.title for xpm in xpms[1:4:2]] == ["t=10ps", "t=30ps"]
+    with pytest.raises(IndexError):
+        xpms[5]
+    with pytest.raises(IndexError):
+        xpms[-6]
+    with pytest.raises(IndexError):
+        xpms.load_frames([0, 7])
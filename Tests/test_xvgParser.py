@@ -0,0 +1,229 @@
+## author : charlie
+## date : 20261017
+
+import gzip
+import os
+import sys
+
+import numpy as np
+import pytest
+import scipy.stats as stats
+
+sys.path.append("../DuIvyTools/DuIvyTools/")
+from FileParser.xvgParser import XVG, XVGS
+
+
+def test_xvg_parse():
+    xvg = XVG("xvg_test/gyrate.xvg")
+    assert xvg.title == "Radius of gyration (total and around axes)"
+    assert xvg.xlabel == "Time (ps)"
+    assert xvg.ylabel == "Rg (nm)"
+    assert xvg.legends == ["Rg", "Rg\\sX\\N", "Rg\\sY\\N", "Rg\\sZ\\N"]
+    assert xvg.column_num == 5
+    assert xvg.row_num == 4001
+    assert xvg.data.shape == (4001, 5)
+    assert xvg.data.dtype == np.float64
+    assert list(xvg.data_columns[0]) == [i * 10 for i in range(4001)]
+    assert list(xvg.data_columns[1][:2]) == [3.73837, 3.73357]
+    assert xvg.data_columns[4][-1] == 3.19567
+    ## data_columns are views of data
+    xvg.data_columns[1][0] = 0.0
+    assert xvg.data[0, 1] == 0.0
+
+
+def test_xvg_parse_string_column():
+    xvg = XVG("xvg_test/rama.xvg", dtype=np.float32)
+    assert xvg.data_heads == ["Phi", "Psi"]
+    assert xvg.data.dtype == np.float32
+    assert xvg.data.shape == (xvg.row_num, 2)
+    assert xvg.data_columns[2][:2] == ["VAL-18", "PHE-19"]
+
+
+def test_xvg_parse_tail_comments():
+    xvg = XVG("xvg_test/dssp_sc.xvg")
+    assert xvg.row_num == 4001
+    assert "# Totals" in xvg.comments
+
+
+def test_xvg_parse_lines():
+    lines = ['@    yaxis  label "(nm)"\n', '@ s0 legend "a"\n', "0 1.5\n", "1 2.5\n"]
+    xvg = XVG(lines, is_file=False)
+    assert xvg.data_heads == ["", "a (nm)"]
+    assert list(xvg.data_columns[1]) == [1.5, 2.5]
+
+
+def test_xvg_parse_unequal_columns():
+    lines = ["0 1.5\n", "1\n"]
+    with pytest.raises(SystemExit):
+        XVG(lines, is_file=False)
+
+
+def test_xvg_iter_chunks():
+    xvg = XVG("xvg_test/gyrate.xvg")
+    lazy = XVG("xvg_test/gyrate.xvg", load_data=False)
+    assert lazy.data is None
+    assert lazy.data_heads == xvg.data_heads
+    for data in [xvg, lazy]:
+        blocks = list(data.iter_chunks(rows=300, columns=[0, 2], begin=7, end=3001, dt=4))
+        assert all(block.shape[0] <= 300 for block in blocks)
+        assert np.array_equal(np.vstack(blocks), xvg.data[7:3001:4, [0, 2]])
+
+
+def test_xvg_calc_ave_by_chunks():
+    xvg = XVG("xvg_test/gyrate.xvg")
+    results = [xvg.calc_ave(10, 3000, 3, c) for c in range(xvg.column_num)]
+    legends, aves, stds = [list(r) for r in zip(*results)]
+    lazy = XVG("xvg_test/gyrate.xvg", load_data=False)
+    chunk_legends, chunk_aves, chunk_stds = lazy.calc_ave_by_chunks(10, 3000, 3, rows=128)
+    assert chunk_legends == legends
+    assert np.allclose(chunk_aves, aves)
+    assert np.allclose(chunk_stds, stds)
+
+
+def test_xvg_string_na(tmp_path, monkeypatch):
+    monkeypatch.setenv("DIT_CACHE_DIR", str(tmp_path / "cache"))
+    xvgfile = str(tmp_path / "na.xvg")
+    with open(xvgfile, "w") as fo:
+        fo.write('@ s0 legend "a"\n0 1.5 NA\n1 nan ALA\n2 NA None\n')
+    xvg = XVG(xvgfile)
+    assert xvg.data_columns[2] == ["NA", "ALA", "None"]
+    assert xvg.data_columns[1][0] == 1.5 and np.all(np.isnan(xvg.data_columns[1][1:]))
+    xvg.save(str(tmp_path / "out.xvg"))
+    assert XVG(str(tmp_path / "out.xvg")).data_columns[2] == ["NA", "ALA", "None"]
+    assert XVG(xvgfile).data_columns[2] == ["NA", "ALA", "None"]  # from cache
+    ## short lines are still detected with a trailing string column
+    with open(xvgfile, "w") as fo:
+        fo.write('@ s0 legend "a"\n0 1.5 NA\n1 2.5\n')
+    with pytest.raises(SystemExit):
+        XVG(xvgfile)
+
+
+def test_xvg_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("DIT_CACHE_DIR", str(tmp_path / "cache"))
+    xvgfile = str(tmp_path / "test.xvg")
+    with open(xvgfile, "w") as fo:
+        fo.write('@ s0 legend "a"\n0 1.5 A\n1 2.5 B\n')
+    xvg = XVG(xvgfile)
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    cached = XVG(xvgfile)
+    assert isinstance(cached.data, np.memmap)
+    assert cached.data_heads == xvg.data_heads
+    assert np.array_equal(cached.data, xvg.data)
+    assert cached.data_columns[2] == ["A", "B"]
+    ## stale entry is invalidated after the file changed
+    with open(xvgfile, "w") as fo:
+        fo.write('@ s0 legend "a"\n0 3.5 A\n1 4.5 B\n2 5.5 C\n')
+    changed = XVG(xvgfile)
+    assert not isinstance(changed.data, np.memmap)
+    assert list(changed.data_columns[1]) == [3.5, 4.5, 5.5]
+
+
+def test_xvg_column_projection():
+    xvg = XVG("xvg_test/gyrate.xvg")
+    projected = XVG("xvg_test/gyrate.xvg", columns=[0, 2])
+    assert projected.data_columns.pending == {1, 3}
+    assert np.array_equal(projected.data_columns[2], xvg.data_columns[2])
+    ## skipped columns are decoded on access
+    assert np.array_equal(projected.data_columns[1], xvg.data_columns[1])
+    assert projected.data_columns.pending == {3}
+    assert np.array_equal(np.array(list(projected.data_columns)), xvg.data.T)
+    assert projected.data_columns.pending == set()
+
+    rama = XVG("xvg_test/rama.xvg", columns=[1])
+    assert rama.data_columns.pending == {0}
+    assert rama.data_columns[2][:2] == ["VAL-18", "PHE-19"]
+
+
+def test_xvgs_frames(tmp_path):
+    xvgfile = str(tmp_path / "frames.xvg")
+    with open(xvgfile, "w") as fo:
+        fo.write('@    title "frames"\n0 1.0\n1 2.0\n&\n\n&\n0 3.0\n1 4.0\n&\n0 5.0\n')
+    index_file = str(tmp_path / "frames.idx")
+    xvgs = XVGS(xvgfile, index_file)
+    assert os.path.exists(index_file)
+    assert len(xvgs) == 3
+    assert xvgs[0].title == "frames"
+    assert list(xvgs[1].data_columns[1]) == [3.0, 4.0]
+    assert list(xvgs[-1].data_columns[1]) == [5.0]
+    assert [frame.row_num for frame in xvgs] == [2, 2, 1]
+    assert len(xvgs[1:]) == 2
+    with pytest.raises(IndexError):
+        xvgs[3]
+    assert np.array_equal(XVGS(xvgfile, index_file).offsets, xvgs.offsets)
+
+    with open(xvgfile, "rb") as fo, gzip.open(xvgfile + ".gz", "wb") as fz:
+        fz.write(fo.read())
+    compressed = XVGS(xvgfile + ".gz")
+    assert np.array_equal(compressed.offsets, xvgs.offsets)
+    assert [frame.row_num for frame in compressed] == [2, 2, 1]
+    frames = compressed.parse_frames([2, 0])
+    assert list(frames[0].data_columns[1]) == [5.0]
+    assert frames[1].title == "frames"
+
+
+def test_xvg_save(tmp_path):
+    xvg = XVG("test.xvg", is_file=False, new_file=True)
+    xvg.data_heads = ["frame", "count", "value", "mixed"]
+    xvg.data_columns = [[0, 1], [3, 4], np.array([0.5, 1.25]), [1, 2.5]]
+    xvg.save(str(tmp_path / "test.xvg"))
+    saved = XVG(str(tmp_path / "test.xvg"))
+    assert saved.legends == ["count", "value", "mixed"]
+    assert list(saved.data_columns[2]) == [0.5, 1.25]
+    with open(tmp_path / "test.xvg") as fo:
+        lines = fo.readlines()
+    assert lines[-2] == f"{0:>6d} {3:>6d} {0.5:>16.6f} {1:>6d} \n"
+    assert lines[-1] == f"{1:>6d} {4:>6d} {1.25:>16.6f} {2.5:>16.6f} \n"
+    xvg.save(str(tmp_path / "test.xvg.gz"))
+    with gzip.open(tmp_path / "test.xvg.gz", "rt") as fo:
+        assert fo.readlines()[-2:] == lines[-2:]
+
+
+def test_xvg_compressed(tmp_path):
+    xvg = XVG("xvg_test/dssp_sc.xvg")
+    with open("xvg_test/dssp_sc.xvg", "rb") as fo:
+        content = fo.read()
+    with gzip.open(tmp_path / "dssp_sc.xvg.gz", "wb") as fo:
+        fo.write(content)
+    compressed = XVG(str(tmp_path / "dssp_sc.xvg.gz"))
+    assert compressed.comments == xvg.comments
+    assert np.array_equal(compressed.data, xvg.data)
+    lazy = XVG(str(tmp_path / "dssp_sc.xvg.gz"), load_data=False)
+    assert np.array_equal(np.vstack(list(lazy.iter_chunks(rows=700))), xvg.data)
+
+
+def test_xvg_calc_rolling():
+    xvg = XVG("xvg_test/gyrate.xvg")
+    mvaves, highs, lows = xvg.calc_mvave(40, 0.9, 1)
+    assert np.isnan(mvaves[:40]).all()
+    for i in [40, 1000, 4000]:
+        window = xvg.data_columns[1][i - 40 : i]
+        low, high = stats.norm.interval(0.9, np.mean(window), np.std(window))
+        assert np.isclose(mvaves[i], np.mean(window))
+        assert np.isclose(highs[i], high) and np.isclose(lows[i], low)
+
+    mvaves, highs, lows = xvg.calc_rolling([1, 2], 40, 0.9, True, "median")
+    assert np.isnan(mvaves[:20]).all() and np.isnan(mvaves[-19:]).all()
+    window = xvg.data_columns[2][980:1020]
+    assert mvaves[1000, 1] == np.median(window)
+    assert np.isclose(highs[1000, 1], np.quantile(window, 0.95))
+
+
+def test_xvg_calc_ave_correlated():
+    rng = np.random.default_rng(0)
+    noise = rng.standard_normal(2**16)
+    ar = np.zeros_like(noise)
+    for i in range(1, len(noise)):
+        ar[i] = 0.9 * ar[i - 1] + noise[i]
+    xvg = XVG("test.xvg", is_file=False, new_file=True)
+    xvg.data_heads = ["time", "noise", "ar"]
+    xvg.data_columns = [np.arange(len(noise), dtype=float), noise, ar]
+    xvg.column_num = 3
+    naive = np.std(noise) / np.sqrt(len(noise))
+    ## std.err of AR(1) mean: sqrt(1 / (1 - phi^2) * (1 + phi) / (1 - phi) / N)
+    expected = np.sqrt(1 / 0.19 * 19 / len(ar))
+    for method in [xvg.calc_ave_by_blocking, xvg.calc_ave_by_autocorr]:
+        legends, aves, stderrs = method(0, len(noise), 1)
+        assert legends == ["time", "noise", "ar"]
+        assert np.isclose(aves[2], np.mean(ar))
+        assert np.isclose(stderrs[1], naive, rtol=0.2)
+        assert np.isclose(stderrs[2], expected, rtol=0.2)